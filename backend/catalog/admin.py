@@ -6,7 +6,11 @@ from .models import (
     Discount,
     Product,
     ProductDiscountHistory,
+    ProductMatch,
+    ProductMatchKey,
     WishlistItem,
+    PriceAlert,
+    AlertNotification,
     Report,
     ShoppingCart,
     ShoppingCartItem,
@@ -45,7 +49,7 @@ class DiscountAdmin(admin.ModelAdmin):
         "effective_status",
         "submitted_by",
     )
-    list_filter = ("status", "discount_type", "target_type")
+    list_filter = ("status", "phase", "discount_type", "target_type")
     search_fields = ("name", "description")
     autocomplete_fields = ("brand", "category", "product", "submitted_by")
 
@@ -76,6 +80,22 @@ class WishlistItemAdmin(admin.ModelAdmin):
     autocomplete_fields = ("user", "product")
 
 
+@admin.register(PriceAlert)
+class PriceAlertAdmin(admin.ModelAdmin):
+    list_display = ("user", "product", "kind", "threshold", "is_active", "notified_price")
+    list_filter = ("kind", "is_active")
+    search_fields = ("user__email", "product__name")
+    autocomplete_fields = ("user", "product")
+
+
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    list_display = ("alert", "price", "created_at", "sent_at", "attempts")
+    list_filter = ("sent_at",)
+    raw_id_fields = ("alert", "discount")
+    readonly_fields = ("created_at",)
+
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = (
@@ -90,6 +110,7 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ("status", "product_reason")
     search_fields = ("description", "product__name")
     autocomplete_fields = ("product", "discount", "reported_by")
+    raw_id_fields = ("image",)
 
 
 @admin.register(ShoppingCart)
@@ -105,3 +126,17 @@ class ShoppingCartItemAdmin(admin.ModelAdmin):
     list_display = ("shopping_cart", "product", "quantity", "is_purchased")
     list_filter = ("is_purchased",)
     autocomplete_fields = ("shopping_cart", "product")
+
+
+class ProductMatchKeyInline(admin.TabularInline):
+    model = ProductMatchKey
+    fields = ("product", "brand", "name", "unit", "quantity", "computed_at")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ProductMatch)
+class ProductMatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_at", "updated_at")
+    inlines = (ProductMatchKeyInline,)
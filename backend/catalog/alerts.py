@@ -0,0 +1,186 @@
+"""Price alerts: match recomputed prices against subscriptions, deliver from an outbox.
+
+``refresh_current_prices`` calls ``match_price_alerts`` with the prices it has
+just written. One query on the ``(product, threshold)`` index finds the alerts
+of those products that match (or matched before and may need re-arming); the
+rest is decided in memory, so the cost follows the changed products, not the
+number of users or alerts. Fired alerts become ``AlertNotification`` rows.
+
+``deliver_pending`` sends the outbox in batches through ``PRICE_ALERT_BACKEND``
+(``EmailBackend`` by default: one email per user and batch, over a single
+connection built from Django's ``EMAIL_*`` settings). A failed delivery stays
+in the outbox and is retried until ``PRICE_ALERT_MAX_ATTEMPTS``. Each batch is
+claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent senders
+never deliver the same notification twice; notifications of alerts switched
+off since they fired are not sent.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AlertNotification, PriceAlert, ProductCurrentPrice
+
+
+def _fires(alert: dict, price: Optional[Decimal], discount_id: Optional[int]) -> bool:
+    if price is None:
+        return False
+    if alert["kind"] == PriceAlert.Kind.ANY_DISCOUNT:
+        return discount_id is not None
+    return price <= alert["threshold"]
+
+
+def match_price_alerts(prices: Dict[int, Tuple[Optional[Decimal], Optional[int]]]) -> int:
+    """Queue notifications for alerts fired by ``prices`` ({product id: (effective price, discount id)}).
+
+    An alert fires when it matches and the price is below the one it last
+    notified about; alerts that no longer match are re-armed. Returns the
+    number of notifications queued.
+    """
+    if not prices:
+        return 0
+    current = F("product__current_price__effective_price")
+    matching = (
+        Q(kind=PriceAlert.Kind.TARGET_PRICE, threshold__gte=current)
+        | Q(kind=PriceAlert.Kind.ANY_DISCOUNT, product__current_price__discount__isnull=False)
+    )
+    alerts = PriceAlert.objects.filter(product_id__in=list(prices), is_active=True).filter(
+        matching | Q(notified_price__isnull=False)
+    ).values("id", "product_id", "kind", "threshold", "notified_price")
+
+    notifications, fired, rearm = [], [], []
+    for alert in alerts:
+        price, discount_id = prices[alert["product_id"]]
+        if not _fires(alert, price, discount_id):
+            rearm.append(alert["id"])
+        elif alert["notified_price"] is None or price < alert["notified_price"]:
+            notifications.append(AlertNotification(alert_id=alert["id"], price=price, discount_id=discount_id))
+            fired.append(PriceAlert(pk=alert["id"], notified_price=price))
+    if notifications:
+        AlertNotification.objects.bulk_create(notifications)
+        PriceAlert.objects.bulk_update(fired, ["notified_price"])
+    if rearm:
+        PriceAlert.objects.filter(pk__in=rearm).update(notified_price=None)
+    return len(notifications)
+
+
+def match_current_prices(product_ids) -> int:
+    """``match_price_alerts`` against the stored current prices, e.g. for a new alert.
+
+    Products without a valid price row have theirs computed first
+    (``refresh_current_prices`` matches their alerts as it writes them).
+    """
+    from . import pricing  # pricing imports this module
+
+    product_ids = list(product_ids)
+    now = timezone.now()
+    rows = ProductCurrentPrice.objects.filter(product_id__in=product_ids).filter(
+        Q(valid_until__isnull=True) | Q(valid_until__gt=now)
+    )
+    prices = {
+        product_id: (price, discount_id)
+        for product_id, price, discount_id in rows.values_list("product_id", "effective_price", "discount_id")
+    }
+    queued = match_price_alerts(prices)
+    missing = [product_id for product_id in product_ids if product_id not in prices]
+    if missing:
+        queued_before = AlertNotification.objects.filter(alert__product_id__in=missing).count()
+        pricing.refresh_current_prices(missing, now)
+        queued += AlertNotification.objects.filter(alert__product_id__in=missing).count() - queued_before
+    return queued
+
+
+class EmailBackend:
+    """Delivers each user's notifications of a batch as one email.
+
+    Used as a context manager so a whole batch shares one connection of
+    Django's configured email backend.
+    """
+
+    subject = "Price drop on your wishlist"
+
+    def __init__(self):
+        self.connection = mail.get_connection()
+
+    def __enter__(self):
+        self.connection.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def send(self, user, notifications: List[AlertNotification]) -> None:
+        lines = [f"Hi {user.name or user.email},", "", "Prices you are waiting for have dropped:", ""]
+        for notification in notifications:
+            product = notification.alert.product
+            lines.append(f"- {product.name}: {notification.price} EUR (was {product.price} EUR)")
+        message = mail.EmailMessage(
+            subject=self.subject,
+            body="\n".join(lines),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+            connection=self.connection,
+        )
+        message.send()
+
+
+def get_backend():
+    return import_string(getattr(settings, "PRICE_ALERT_BACKEND", "catalog.alerts.EmailBackend"))()
+
+
+def deliver_pending(batch_size: Optional[int] = None, backend=None, now=None) -> Tuple[int, int]:
+    """Send one batch of the outbox; returns ``(sent, failed)`` notification counts."""
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, "PRICE_ALERT_BATCH_SIZE", 200)
+    max_attempts = getattr(settings, "PRICE_ALERT_MAX_ATTEMPTS", 5)
+    with transaction.atomic():
+        return _deliver_batch(batch_size, max_attempts, backend, now)
+
+
+def _deliver_batch(batch_size: int, max_attempts: int, backend, now) -> Tuple[int, int]:
+    # lock only the outbox rows; other senders skip them instead of waiting
+    claimed = list(
+        AlertNotification.objects.filter(
+            sent_at__isnull=True,
+            attempts__lt=max_attempts,
+            # a subquery, not a join, so the alerts themselves are not locked
+            alert_id__in=PriceAlert.objects.filter(is_active=True).values("pk"),
+        )
+        .order_by("created_at")
+        .select_for_update(skip_locked=True)
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    if not claimed:
+        return 0, 0
+    pending = list(
+        AlertNotification.objects.filter(pk__in=claimed).select_related("alert__user", "alert__product").order_by("created_at")
+    )
+
+    by_user = defaultdict(list)
+    for notification in pending:
+        by_user[notification.alert.user].append(notification)
+    sent = failed = 0
+    with backend or get_backend() as delivery:
+        for user, notifications in by_user.items():
+            try:
+                delivery.send(user, notifications)
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                for notification in notifications:
+                    notification.attempts += 1
+                    notification.last_error = error
+                failed += len(notifications)
+            else:
+                for notification in notifications:
+                    notification.attempts += 1
+                    notification.sent_at = now
+                    notification.last_error = ""
+                sent += len(notifications)
+    AlertNotification.objects.bulk_update(pending, ["attempts", "sent_at", "last_error"])
+    return sent, failed
@@ -0,0 +1,244 @@
+"""Async variants of the hot catalog read endpoints, for the ASGI profile.
+
+With ``CATALOG_ASYNC_VIEWS`` on (the default under ``SERVER_MODE=asgi``),
+``urlpatterns()`` is mounted in front of the regular routes. Each view answers
+JSON ``GET`` requests with the async ORM and the async cache API, so a uvicorn
+worker keeps serving other requests while one waits on the database. Anything
+else (writes, the browsable API, options the async path does not cover) goes to
+the sync DRF view in ``fallback``, run in a thread.
+
+- ``products/`` and ``products/search/``: ``ProductRows``; ``expand=`` and
+  keyset cursors fall back
+- ``brands/``, ``categories/``, ``stores/``: the lists
+- ``user/wishlist/`` and ``shopping-carts/<pk>/``: for the authenticated user;
+  their live discount resolution runs in a thread
+
+Responses are the same as the sync views', down to the response-cache keys and
+ETags, so both variants share cache entries.
+"""
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.urls import path
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+
+from core.renderers import ORJSONRenderer
+from users.helpers.JWTAuthentication import JWTAuthentication
+from . import caching, search
+from .models import ShoppingCart
+from .rows import fast_lists_enabled
+from .views import (
+    BrandViewSet,
+    CategoryViewSet,
+    ProductViewSet,
+    ShoppingCartViewSet,
+    StoreViewSet,
+    WishlistListCreateView,
+)
+
+renderer = ORJSONRenderer()
+
+
+def render(data, status: int = 200) -> HttpResponse:
+    response = HttpResponse(renderer.render(data), status=status, content_type="application/json")
+    response["Vary"] = "Accept"
+    return response
+
+
+class AsyncReadView(ABC, View):
+    """Serve JSON ``GET`` through ``respond``; hand every other request to ``fallback``.
+
+    ``view_class`` is the sync DRF view the endpoint mirrors; its instances
+    (``sync_view``) supply querysets, filtering, pagination and serializers.
+    Public endpoints listed with a ``cache_name`` go through the response cache.
+    """
+
+    view_class = None
+    actions = None
+    fallback = None
+    requires_auth = False
+    cache_name = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.user = None
+
+    @classmethod
+    def as_endpoint(cls, **initkwargs):
+        if cls.actions:
+            fallback = cls.view_class.as_view(cls.actions)
+        else:
+            fallback = cls.view_class.as_view()
+        return csrf_exempt(cls.as_view(fallback=fallback, **initkwargs))
+
+    def handles(self, request) -> bool:
+        return (
+            request.method == "GET"
+            and "text/html" not in request.headers.get("Accept", "")
+            and request.GET.get("format", "json") == "json"
+        )
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not self.handles(request):
+            return await sync_to_async(self.call_fallback)(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    def call_fallback(self, request, *args, **kwargs):
+        response = self.fallback(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            authenticated = await JWTAuthentication().aauthenticate(request)
+            self.user = authenticated[0] if authenticated else None
+            if self.requires_auth and self.user is None:
+                raise NotAuthenticated()
+            drf_request = Request(request, authenticators=())
+            drf_request.user = self.user or AnonymousUser()
+            if self.cache_name and self.view_class.cache_dependencies:
+                return await caching.aserve(
+                    request, self.cache_name, self.view_class.cache_dependencies,
+                    lambda: self.respond(drf_request, **kwargs),
+                )
+            return await self.respond(drf_request, **kwargs)
+        except APIException as exc:
+            return self.error(exc)
+
+    def error(self, exc: APIException) -> HttpResponse:
+        status = exc.status_code
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            # JWTAuthentication sends no WWW-Authenticate header, so DRF answers 403
+            status = 403
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return render(data, status)
+
+    def sync_view(self, request, action=None, **kwargs):
+        view = self.view_class(request=request, args=(), kwargs=kwargs, format_kwarg=None)
+        if action:
+            view.action = action
+        return view
+
+    @abstractmethod
+    async def respond(self, request, **kwargs) -> HttpResponse:
+        """The JSON response to a ``GET`` the async path handles."""
+
+
+class ModelListView(AsyncReadView):
+    """A plain (unpaginated) list of the viewset's queryset."""
+
+    actions = {"get": "list", "post": "create"}
+
+    async def respond(self, request, **kwargs):
+        view = self.sync_view(request, "list")
+        objects = [obj async for obj in view.filter_queryset(view.get_queryset())]
+        return render(view.get_serializer(objects, many=True).data)
+
+
+class BrandListView(ModelListView):
+    view_class = BrandViewSet
+    cache_name = "brand-list"
+
+
+class CategoryListView(ModelListView):
+    view_class = CategoryViewSet
+    cache_name = "category-list"
+
+
+class StoreListView(ModelListView):
+    view_class = StoreViewSet
+    cache_name = "store-list"
+
+
+class ProductListView(AsyncReadView):
+    view_class = ProductViewSet
+    actions = {"get": "list", "post": "create"}
+    cache_name = "product-list"
+
+    def handles(self, request):
+        params = request.GET
+        return (
+            super().handles(request)
+            and fast_lists_enabled()
+            and "expand" not in params
+            and "cursor" not in params
+            and params.get("pagination") != "keyset"
+        )
+
+    async def respond(self, request, **kwargs):
+        view = self.sync_view(request, "list")
+        rows = view.get_rows()
+        queryset = rows.values(view.filter_queryset(view.get_queryset()))
+        page = await view.paginator.apaginate_queryset(queryset, request)
+        return render(view.paginator.get_paginated_response(await rows.abuild(page)).data)
+
+
+class ProductSearchView(AsyncReadView):
+    view_class = ProductViewSet
+    actions = {"get": "search"}
+
+    def handles(self, request):
+        return super().handles(request) and fast_lists_enabled() and "expand" not in request.GET
+
+    async def respond(self, request, **kwargs):
+        view = self.sync_view(request, "search")
+        arguments, error = view.search_arguments(request.query_params)
+        if error is not None:
+            return render(error.data, error.status_code)
+        paginated = arguments.pop("paginated")
+        matches = await sync_to_async(search.search_products)(**arguments)
+
+        page = view.paginate_queryset(matches) if paginated else matches
+        rows = view.get_rows()
+        queryset = rows.values(view.get_queryset().filter(pk__in=dict(page)))
+        products = {row["id"]: row async for row in queryset}
+        ordered = [products[pk] for pk, _ in page if pk in products]
+        data = view.scored(page, [row["id"] for row in ordered], await rows.abuild(ordered))
+        if paginated:
+            data = view.get_paginated_response(data).data
+        return render(data)
+
+
+class WishlistView(AsyncReadView):
+    view_class = WishlistListCreateView
+    requires_auth = True
+
+    async def respond(self, request, **kwargs):
+        view = self.sync_view(request)
+        items = [item async for item in view.get_queryset()]
+        # products with an expired price row are resolved live, which is sync
+        data = await sync_to_async(lambda: view.get_serializer(items, many=True).data)()
+        return render(data)
+
+
+class ShoppingCartView(AsyncReadView):
+    view_class = ShoppingCartViewSet
+    actions = {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}
+    requires_auth = True
+
+    async def respond(self, request, pk=None, **kwargs):
+        view = self.sync_view(request, "retrieve", pk=pk)
+        cart = await view.get_queryset().filter(pk=pk).afirst()
+        if cart is None:
+            raise NotFound(f"No {ShoppingCart._meta.object_name} matches the given query.")
+        # item prices come from the live discount resolver, which is sync
+        data = await sync_to_async(lambda: view.get_serializer(cart).data)()
+        return render(data)
+
+
+def urlpatterns():
+    return [
+        path("products/", ProductListView.as_endpoint(), name="product-list-async"),
+        path("products/search/", ProductSearchView.as_endpoint(), name="product-search-async"),
+        path("brands/", BrandListView.as_endpoint(), name="brand-list-async"),
+        path("categories/", CategoryListView.as_endpoint(), name="category-list-async"),
+        path("stores/", StoreListView.as_endpoint(), name="store-list-async"),
+        path("user/wishlist/", WishlistView.as_endpoint(), name="wishlist-async"),
+        path("shopping-carts/<int:pk>/", ShoppingCartView.as_endpoint(), name="shopping-carts-detail-async"),
+    ]
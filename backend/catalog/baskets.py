@@ -0,0 +1,200 @@
+"""Cheapest-chain basket optimization for shopping carts.
+
+A cart's items come from whichever chain the user picked. Each item can be
+bought as the product itself or as any product matched with it in another
+chain (``catalog.matching``). ``PriceMatrix`` loads every candidate in one
+query and keeps one column per chain (brand): for each item, the cost of
+buying its quantity there (the cheapest candidate at that chain), or
+``UNAVAILABLE``. From the matrix:
+
+- ``chain_totals``: what the cart costs at each chain and which items it lacks
+- ``best_split``: the cheapest way to buy the cart visiting at most ``k``
+  chains, each item bought at the cheapest of them
+
+A split first covers as many items as possible, then costs the least. There
+are few chains, so every combination of up to ``k`` of them is evaluated:
+a combination's column is the element-wise ``min`` of its chains' columns,
+built from the column of the combination one chain smaller.
+
+``optimize_cart`` caches results under the cart's contents and the versions
+of the prices and matches they were computed from (``catalog.caching``).
+"""
+import hashlib
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import caching
+from .models import Product
+from .pricing import CENT, annotate_effective_prices
+
+UNAVAILABLE = Decimal("Infinity")
+CACHE_KEY = "catalog:basket:{}"
+# what a result depends on besides the cart's contents
+DEPENDENCIES = ("product", "discount", "productmatch")
+
+# (product id, quantity, match cluster id) of an item to buy
+Item = Tuple[int, int, Optional[int]]
+
+
+@dataclass
+class PriceMatrix:
+    items: List[Item]
+    chains: List[int]
+    chain_names: Dict[int, str]
+    # own[i]: the item's product row; columns[c][i]: cost of item i at chain c
+    own: List[dict]
+    columns: List[List[Decimal]] = field(default_factory=list)
+    # picks[c][i]: the candidate row that cost stands for
+    picks: List[List[Optional[dict]]] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, items: Sequence[Item]) -> "PriceMatrix":
+        items = list(items)
+        product_ids = [product_id for product_id, _, _ in items]
+        clusters = {cluster for _, _, cluster in items if cluster is not None}
+        rows = annotate_effective_prices(
+            Product.objects.filter(Q(pk__in=product_ids) | Q(match_key__cluster_id__in=clusters))
+        ).values("id", "name", "brand_id", "brand__name", "stale_since", "effective_price", "match_key__cluster_id")
+
+        by_id, by_cluster = {}, {}
+        for row in rows:
+            by_id[row["id"]] = row
+            if row["match_key__cluster_id"] is not None:
+                by_cluster.setdefault(row["match_key__cluster_id"], []).append(row)
+        sold = [
+            row for row in by_id.values()
+            if row["brand_id"] is not None and row["effective_price"] is not None and row["stale_since"] is None
+        ]
+        chain_names = {row["brand_id"]: row["brand__name"] for row in sold}
+        chains = sorted(chain_names, key=lambda brand: (chain_names[brand], brand))
+        index = {brand: c for c, brand in enumerate(chains)}
+
+        matrix = cls(items=items, chains=chains, chain_names=chain_names, own=[by_id[pid] for pid in product_ids])
+        matrix.columns = [[UNAVAILABLE] * len(items) for _ in chains]
+        matrix.picks = [[None] * len(items) for _ in chains]
+        sellable = {row["id"] for row in sold}
+        for i, (product_id, quantity, cluster) in enumerate(items):
+            candidates = by_cluster.get(cluster, []) if cluster is not None else [by_id[product_id]]
+            # cheapest first; on a tie keep the product the user picked
+            for row in sorted(candidates, key=lambda r: (r["effective_price"] or 0, r["id"] != product_id, r["id"])):
+                if row["id"] not in sellable:
+                    continue
+                c = index[row["brand_id"]]
+                if matrix.picks[c][i] is None:
+                    matrix.picks[c][i] = row
+                    matrix.columns[c][i] = row["effective_price"] * quantity
+        return matrix
+
+    def current_costs(self) -> List[Optional[Decimal]]:
+        """Cost of each item as it is in the cart (None when its product is not sold)."""
+        return [
+            row["effective_price"] * quantity if row["effective_price"] is not None else None
+            for row, (_, quantity, _) in zip(self.own, self.items)
+        ]
+
+    def chain_totals(self) -> List[dict]:
+        """The whole cart at each chain: complete chains first, then the cheapest."""
+        totals = []
+        for c, brand in enumerate(self.chains):
+            column = self.columns[c]
+            missing = [self.items[i][0] for i, cost in enumerate(column) if cost == UNAVAILABLE]
+            totals.append({
+                "brand": brand,
+                "brand_name": self.chain_names[brand],
+                "total": sum((cost for cost in column if cost != UNAVAILABLE), Decimal("0")).quantize(CENT),
+                "items": len(column) - len(missing),
+                "missing": missing,
+            })
+        totals.sort(key=lambda row: (len(row["missing"]), row["total"], row["brand_name"]))
+        return totals
+
+    def best_split(self, k: int) -> Tuple[Tuple[int, ...], List[Decimal]]:
+        """Chain indexes of the best split over at most ``k`` chains and its per-item costs."""
+        best_score, best = None, ((), [UNAVAILABLE] * len(self.items))
+        merged: Dict[Tuple[int, ...], List[Decimal]] = {(): best[1]}
+        for size in range(1, min(k, len(self.chains)) + 1):
+            for combo in combinations(range(len(self.chains)), size):
+                column = list(map(min, merged[combo[:-1]], self.columns[combo[-1]]))
+                if size < k:
+                    merged[combo] = column
+                available = [cost for cost in column if cost != UNAVAILABLE]
+                score = (-len(available), sum(available, Decimal("0")), size)
+                if best_score is None or score < best_score:
+                    best_score, best = score, (combo, column)
+            # combinations one chain smaller are no longer extended
+            merged = {combo: column for combo, column in merged.items() if len(combo) == size}
+        return best
+
+    def split(self, k: int) -> dict:
+        combo, column = self.best_split(k)
+        current = self.current_costs()
+        lines, total, before = [], Decimal("0"), Decimal("0")
+        for i, (product_id, quantity, _) in enumerate(self.items):
+            cost = column[i]
+            if cost == UNAVAILABLE:
+                lines.append({"product": product_id, "quantity": quantity, "buy": None})
+                continue
+            # the first chain of the combination that reaches the minimum
+            c = next(c for c in combo if self.columns[c][i] == cost)
+            pick = self.picks[c][i]
+            lines.append({
+                "product": product_id,
+                "quantity": quantity,
+                "buy": pick["id"],
+                "name": pick["name"],
+                "brand": pick["brand_id"],
+                "brand_name": pick["brand__name"],
+                "price": pick["effective_price"].quantize(CENT),
+                "total": cost.quantize(CENT),
+                "substituted": pick["id"] != product_id,
+            })
+            total += cost
+            before += current[i] if current[i] is not None else cost
+        return {
+            "brands": [self.chains[c] for c in combo],
+            "total": total.quantize(CENT),
+            "saving": (before - total).quantize(CENT),
+            "missing": [line["product"] for line in lines if line["buy"] is None],
+            "items": lines,
+        }
+
+
+def max_chains() -> int:
+    return getattr(settings, "CART_OPTIMIZE_MAX_CHAINS", 3)
+
+
+def optimize(items: Sequence[Item], k: int) -> dict:
+    """Per-chain totals and the best split over at most ``k`` chains of ``items``."""
+    matrix = PriceMatrix.load(items)
+    current = [cost for cost in matrix.current_costs() if cost is not None]
+    return {
+        "k": k,
+        "current_total": sum(current, Decimal("0")).quantize(CENT),
+        "chains": matrix.chain_totals(),
+        "split": matrix.split(k),
+    }
+
+
+def optimize_cart(cart, k: int) -> dict:
+    """``optimize`` the items of ``cart`` not yet purchased, cached per cart contents and price version."""
+    items = list(
+        cart.items.filter(is_purchased=False)
+        .order_by("product_id")
+        .values_list("product_id", "quantity", "product__match_key__cluster")
+    )
+    if not caching.enabled():
+        return {"cart": cart.pk, **optimize(items, k)}
+    current = caching.versions(DEPENDENCIES)
+    parts = [str(cart.pk), str(k), repr(items), repr(sorted(current.items()))]
+    key = CACHE_KEY.format(hashlib.sha1("|".join(parts).encode()).hexdigest())
+    result = cache.get(key)
+    if result is None:
+        result = {"cart": cart.pk, **optimize(items, k)}
+        cache.set(key, result, getattr(settings, "CATALOG_CACHE_TIMEOUT", 300))
+    return result
@@ -0,0 +1,403 @@
+"""Endpoint benchmarks: synthetic catalog data plus per-endpoint query, time and memory measurements.
+
+``seed`` fills the (throwaway) database with brands, stores, categories, tens of
+thousands of products and discounts of every target type, plus users with
+wishlists, carts, submissions and reports. ``run`` requests every endpoint in
+``endpoints`` through the test client with a real JWT and records:
+
+- ``queries``: SQL statements issued by the request
+- ``bytes``: size of the response body
+- ``ms``: best wall time over ``repeat`` untraced runs
+- ``peak_kb``: peak Python memory allocated while serving the request
+
+``compare`` checks results against a stored baseline. Only what does not
+depend on the machine fails: query counts must not grow and responses may
+grow by at most ``tolerance``. Timings are reported by ``format_table``
+relative to a reference endpoint of the same run, next to the same ratio in
+the baseline, but never fail it. ``merge_baseline`` records new endpoints and
+those whose queries or size changed, and leaves the other entries alone.
+
+``serialization_paths`` compares, without HTTP, the ways one product list page
+can be built and rendered: ``ProductListSerializer`` with DRF's JSON renderer,
+the serializer with the orjson renderer, and ``values()`` rows with orjson.
+"""
+import datetime
+import io
+import random
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+import jwt
+from PIL import Image
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.renderers import ORJSONRenderer
+
+from users.helpers.JWTAuthentication import SECRET
+from users.models import User
+from .models import (
+    Brand,
+    Category,
+    Discount,
+    Product,
+    Report,
+    ShoppingCart,
+    ShoppingCartItem,
+    Store,
+    WishlistItem,
+)
+from . import images, pricing, search
+from .rows import ProductRows
+from .serializers import ProductListSerializer
+
+WORDS = [
+    "pienas", "sviestas", "suris", "duona", "kefyras", "jogurtas", "varske", "kava", "arbata", "sultys",
+    "obuoliai", "bananai", "pomidorai", "agurkai", "bulves", "vistiena", "kiauliena", "desra", "kumpis", "ryziai",
+    "makaronai", "miltai", "cukrus", "druska", "aliejus", "sokoladas", "sausainiai", "traskuciai", "vanduo", "alus",
+]
+SIZES = ["200 g", "500 g", "1 kg", "0.5 l", "1 l", "1.5 l", "6 vnt", "10 vnt"]
+
+
+@dataclass
+class Endpoint:
+    name: str
+    path: str
+    method: str = "get"
+    role: Optional[str] = None
+    data: Optional[dict] = None
+
+
+@dataclass
+class Result:
+    name: str
+    status: int
+    queries: int
+    ms: float
+    peak_kb: float
+    samples: List[float] = field(default_factory=list)
+    bytes: int = 0
+
+    def as_dict(self) -> dict:
+        return {"queries": self.queries, "bytes": self.bytes, "ms": round(self.ms, 2), "peak_kb": round(self.peak_kb, 1)}
+
+
+def seed(products: int = 20000, brands: int = 6, stores_per_brand: int = 8, categories: int = 40, rng_seed: int = 1) -> dict:
+    """Create the benchmark dataset; returns the objects the endpoints refer to."""
+    rng = random.Random(rng_seed)
+    now = timezone.now()
+
+    brand_objs = Brand.objects.bulk_create([Brand(name=f"Brand {i}") for i in range(brands)])
+    Store.objects.bulk_create([
+        Store(brand=brand, nickname=f"#{j}", address_line1=f"Gatve {j}", city="Vilnius", postal_code=f"{i:02d}{j:03d}")
+        for i, brand in enumerate(brand_objs)
+        for j in range(stores_per_brand)
+    ])
+    store_objs = list(Store.objects.select_related("brand"))
+    category_objs = Category.objects.bulk_create([Category(name=f"Category {i}") for i in range(categories)])
+
+    rows = []
+    for i in range(products):
+        # catalog imports have no store; a share of user-submitted products do
+        store = rng.choice(store_objs) if i % 10 == 0 else None
+        brand = store.brand if store else rng.choice(brand_objs)
+        rows.append(Product(
+            brand=brand,
+            store=store,
+            external_id=str(i),
+            category=rng.choice(category_objs),
+            name=f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.choice(SIZES)}",
+            price=Decimal(rng.randint(29, 4999)) / 100,
+            photo_url=f"https://example.com/img/{i}.jpg",
+            description="",
+        ))
+    Product.objects.bulk_create(rows, batch_size=2000)
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+
+    user = User.objects.create_user(email="bench-user@example.com", password="bench-pass-1", name="Bench User")
+    moderator = User.objects.create_user(
+        email="bench-mod@example.com", password="bench-pass-1", name="Bench Moderator", role="moderator"
+    )
+
+    statuses = [Discount.DiscountStatus.APPROVED] * 6 + [Discount.DiscountStatus.IN_REVIEW] * 3 + [Discount.DiscountStatus.DENIED]
+    discounts = []
+
+    def discount(i, **kwargs):
+        starts = now + datetime.timedelta(days=rng.randint(-10, 2))
+        discounts.append(Discount(
+            name=f"Discount {i}",
+            discount_type=Discount.PERCENTAGE if i % 2 else Discount.FIXED,
+            value=Decimal(rng.randint(5, 30)) if i % 2 else Decimal("0.20"),
+            starts_at=starts,
+            ends_at=starts + datetime.timedelta(days=rng.randint(1, 14)),
+            status=rng.choice(statuses),
+            submitted_by=user if i % 3 == 0 else None,
+            **kwargs,
+        ))
+
+    for i, product_id in enumerate(rng.sample(product_ids, max(1, products // 10))):
+        discount(i, target_type=Discount.TARGET_PRODUCT, product_id=product_id)
+    for i, category in enumerate(category_objs):
+        scope = {"store": rng.choice(store_objs)} if i % 2 else {"brand": rng.choice(brand_objs)}
+        discount(i, target_type=Discount.TARGET_CATEGORY, category=category, **scope)
+    for i, brand in enumerate(brand_objs):
+        discount(i, target_type=Discount.TARGET_BRAND, brand=brand)
+    for i, store in enumerate(store_objs[::4]):
+        discount(i, target_type=Discount.TARGET_STORE, store=store, brand=store.brand)
+    for item in discounts:
+        item.phase = item.phase_at(now)
+    Discount.objects.bulk_create(discounts, batch_size=2000)
+
+    search.index_products(product_ids)
+    pricing.refresh_current_prices(product_ids, now=now)
+
+    sample = rng.sample(product_ids, 60)
+    WishlistItem.objects.bulk_create([WishlistItem(user=user, product_id=pk) for pk in sample[:20]])
+    cart = ShoppingCart.objects.create(user=user, name="Weekly")
+    ShoppingCartItem.objects.bulk_create([
+        ShoppingCartItem(shopping_cart=cart, product_id=pk, quantity=rng.randint(1, 3)) for pk in sample[20:50]
+    ])
+    user_discount = Discount.objects.filter(submitted_by=user).first()
+    # a noisy 160x120 photo: ~60 KB of PNG that does not compress away
+    photo = io.BytesIO()
+    Image.frombytes("RGB", (160, 120), rng.randbytes(160 * 120 * 3)).save(photo, "PNG")
+    image = images.store_image(photo.getvalue())
+    Report.objects.bulk_create(
+        [Report(product_id=pk, product_reason=Report.PRODUCT_REASON_PRICE, description="Wrong price", reported_by=user) for pk in sample[50:]]
+        + [Report(discount=user_discount, image=image, description="Expired", reported_by=user) for _ in range(10)]
+    )
+
+    return {
+        "user": user,
+        "moderator": moderator,
+        "brand": brand_objs[0],
+        "category": category_objs[0],
+        "store": store_objs[0],
+        "product_id": sample[20],
+        "discount": user_discount,
+        "cart": cart,
+        "products": products,
+    }
+
+
+def endpoints(data: dict) -> List[Endpoint]:
+    """Every router and path endpoint of ``catalog.urls`` and ``users.urls`` worth timing."""
+    product, cart = data["product_id"], data["cart"].pk
+    deep_page = max(1, data["products"] // 30 // 2)
+
+    def url(name, **kwargs):
+        return reverse(name, kwargs=kwargs or None)
+
+    return [
+        Endpoint("brands-list", url("catalog:brand-list")),
+        Endpoint("brands-detail", url("catalog:brand-detail", pk=data["brand"].pk)),
+        Endpoint("categories-list", url("catalog:category-list")),
+        Endpoint("categories-detail", url("catalog:category-detail", pk=data["category"].pk)),
+        Endpoint("stores-list", url("catalog:store-list")),
+        Endpoint("stores-detail", url("catalog:store-detail", pk=data["store"].pk)),
+        Endpoint("products-list", url("catalog:product-list")),
+        Endpoint("products-list-by-effective-price", url("catalog:product-list") + "?ordering=effective_price&on_sale=true"),
+        Endpoint("products-list-deep-page", url("catalog:product-list") + f"?ordering=name&page={deep_page}"),
+        Endpoint("products-list-sparse", url("catalog:product-list") + "?fields=id,name,effective_price"),
+        Endpoint("products-list-keyset", url("catalog:product-list") + "?pagination=keyset&ordering=price"),
+        Endpoint("products-detail", url("catalog:product-detail", pk=product)),
+        Endpoint("products-search", url("catalog:product-search") + "?q=pienas%20sviestas&limit=20"),
+        Endpoint("products-price-history", url("catalog:product-price-history", pk=product)),
+        Endpoint("discounts-list", "/api/catalog/discounts/?effective_status=IN_ACTION"),
+        Endpoint("discounts-detail", f"/api/catalog/discounts/{data['discount'].pk}/"),
+        Endpoint("product-discount-history-list", url("catalog:product-discount-history-list")),
+        Endpoint("shopping-carts-list", url("catalog:shopping-carts-list"), role="user"),
+        Endpoint("shopping-carts-detail", url("catalog:shopping-carts-detail", pk=cart), role="user"),
+        Endpoint(
+            "shopping-carts-add-item", url("catalog:shopping-carts-add-item", pk=cart), method="post", role="user",
+            data={"product": product, "increment": True},
+        ),
+        Endpoint(
+            "shopping-carts-add-item-delta", url("catalog:shopping-carts-add-item", pk=cart) + "?response=delta",
+            method="post", role="user", data={"product": product, "increment": True},
+        ),
+        Endpoint("user-discounts", url("catalog:user-discount-list-create"), role="user"),
+        Endpoint("wishlist", url("catalog:wishlist-list-create"), role="user"),
+        Endpoint("reports-moderation", url("catalog:report-list"), role="moderator"),
+        Endpoint("discounts-moderation", "/api/catalog/discounts/moderation/", role="moderator"),
+        Endpoint("users-user", "/api/user", role="user"),
+        Endpoint("users-list", url("list-users"), role="moderator"),
+        Endpoint(
+            "users-login", "/api/login", method="post",
+            data={"email": "bench-user@example.com", "password": "bench-pass-1"},
+        ),
+    ]
+
+
+def token_for(user: User) -> str:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {"id": user.id, "exp": now + datetime.timedelta(hours=4), "iat": now, "role": user.role, "type": "access"}
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+def measure(client: APIClient, endpoint: Endpoint, repeat: int = 3) -> Result:
+    call = getattr(client, endpoint.method)
+
+    def request():
+        return call(endpoint.path, endpoint.data, format="json") if endpoint.data else call(endpoint.path)
+
+    request()  # warm caches and lazy imports
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        request()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(
+        name=endpoint.name,
+        status=response.status_code,
+        queries=len(queries),
+        ms=min(samples) if samples else 0.0,
+        peak_kb=peak / 1024,
+        samples=samples,
+        bytes=len(response.content),
+    )
+
+
+def profile(name: str, call: Callable[[], object], repeat: int = 3) -> Result:
+    """Best time over ``repeat`` runs of ``call`` plus the queries and peak memory of one more."""
+    call()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            output = call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(
+        name=name, status=200, queries=len(queries), ms=min(samples), peak_kb=peak / 1024, samples=samples,
+        bytes=len(output) if isinstance(output, bytes) else 0,
+    )
+
+
+def serialization_paths(page_size: int = 100, repeat: int = 3) -> List[Result]:
+    """Build and render the first product list page through each path, queries included."""
+    from .views import ProductViewSet
+
+    request = Request(APIRequestFactory().get(reverse("catalog:product-list")))
+    view = ProductViewSet(request=request, action="list", format_kwarg=None, kwargs={})
+    queryset = view.get_queryset().order_by("name", "id")
+    rows = ProductRows(request)
+
+    def serialized():
+        return ProductListSerializer(queryset[:page_size], many=True, context={"request": request}).data
+
+    def from_rows():
+        return rows.build(rows.values(queryset)[:page_size])
+
+    paths = {
+        "serializer+json": lambda: JSONRenderer().render(serialized()),
+        "serializer+orjson": lambda: ORJSONRenderer().render(serialized()),
+        "rows+orjson": lambda: ORJSONRenderer().render(from_rows()),
+    }
+    return [profile(f"products-page-{name}", call, repeat) for name, call in paths.items()]
+
+
+def run(data: dict, repeat: int = 3, only: Optional[List[str]] = None, cache: bool = False) -> List[Result]:
+    """Measure the endpoints; the response cache is off unless ``cache`` so query counts stay meaningful."""
+    with override_settings(CATALOG_CACHE_ENABLED=cache):
+        return _run(data, repeat, only)
+
+
+def _run(data: dict, repeat: int, only: Optional[List[str]]) -> List[Result]:
+    clients = {None: APIClient()}
+    for role in ("user", "moderator"):
+        client = APIClient()
+        token = token_for(data[role])
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        client.cookies["jwt"] = token  # UserView reads the cookie itself
+        clients[role] = client
+    results = []
+    for endpoint in endpoints(data):
+        if only and endpoint.name not in only:
+            continue
+        results.append(measure(clients[endpoint.role], endpoint, repeat=repeat))
+    return results
+
+
+def compare(results: List[Result], baseline: Dict[str, dict], tolerance: float = 0.1) -> List[str]:
+    """Return a description of every regression against ``baseline``: failed requests,
+    more queries, or a response more than ``tolerance`` larger. Timings never fail."""
+    problems = []
+    for result in results:
+        if result.status >= 400:
+            problems.append(f"{result.name}: HTTP {result.status}")
+        expected = baseline.get(result.name)
+        if not expected:
+            continue
+        if result.queries > expected["queries"]:
+            problems.append(f"{result.name}: {result.queries} queries (baseline {expected['queries']})")
+        if "bytes" in expected and result.bytes > expected["bytes"] * (1 + tolerance):
+            problems.append(f"{result.name}: {result.bytes} bytes (baseline {expected['bytes']})")
+    return problems
+
+
+def merge_baseline(results: List[Result], baseline: Dict[str, dict], tolerance: float = 0.1) -> Dict[str, dict]:
+    """``baseline`` with the endpoints of ``results`` that are new or changed recorded.
+
+    An endpoint changed when its query count did or its size moved by more than
+    ``tolerance``; an entry that differs only in timings is kept as it is.
+    """
+    merged = dict(baseline)
+    for result in results:
+        stored = merged.get(result.name)
+        if stored and stored["queries"] == result.queries:
+            if "bytes" not in stored:
+                merged[result.name] = {**stored, "bytes": result.bytes}
+                continue
+            if abs(result.bytes - stored["bytes"]) <= stored["bytes"] * tolerance:
+                continue
+        merged[result.name] = result.as_dict()
+    return merged
+
+
+def format_table(results: List[Result], baseline: Optional[Dict[str, dict]] = None, reference: Optional[str] = None) -> str:
+    """One row per result; ``x ref`` is its time over the ``reference`` endpoint's, in this run and in the baseline."""
+    baseline = baseline or {}
+    ref_ms = next((r.ms for r in results if r.name == reference), None)
+    base_ref_ms = baseline.get(reference, {}).get("ms")
+    lines = [
+        f"{'endpoint':<36}{'status':>7}{'queries':>9}{'KiB':>9}{'ms':>10}{'median':>10}{'x ref':>8}{'peak KiB':>11}"
+        f"{'baseline q/KiB/x ref':>22}"
+    ]
+    for r in results:
+        base = baseline.get(r.name)
+        median = statistics.median(r.samples) if r.samples else r.ms
+        ratio = f"{r.ms / ref_ms:.1f}" if ref_ms else "-"
+        if base:
+            size = f"{base['bytes'] / 1024:.1f}" if "bytes" in base else "-"
+            base_ratio = f"{base['ms'] / base_ref_ms:.1f}" if base_ref_ms else "-"
+            ref = f"{base['queries']}/{size}/{base_ratio}"
+        else:
+            ref = "-"
+        lines.append(
+            f"{r.name:<36}{r.status:>7}{r.queries:>9}{r.bytes / 1024:>9.1f}{r.ms:>10.1f}{median:>10.1f}{ratio:>8}"
+            f"{r.peak_kb:>11.0f}{ref:>22}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,185 @@
+"""Response cache for the public read-only catalog endpoints.
+
+Cache keys combine the request path and query parameters with a version
+counter per model the response depends on. Writes never delete entries; they
+bump the versions (``bump``) from model signals, the importer and the price
+refresh, so every older key simply stops being used. The ETag is derived from
+the key, so a client revalidating an unchanged page gets a 304 without the
+response being rebuilt or even read from the cache.
+
+The backend is the ``default`` cache: local memory unless ``REDIS_URL`` is set.
+Version counters must be shared by every worker for a write in one of them to
+invalidate the others' responses, so ``CATALOG_CACHE_ENABLED`` defaults to on
+only with Redis. Cached responses vary on ``Accept``.
+``aserve`` is the same cache for the async views (``catalog.async_views``); both
+derive identical keys, so the sync and async variants share entries.
+"""
+import hashlib
+import time
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+VERSION_KEY = "catalog:version:{}"
+METRIC_KEY = "catalog:cache:{}:{}"
+RESPONSE_KEY = "catalog:response:{}"
+
+
+def enabled() -> bool:
+    return getattr(settings, "CATALOG_CACHE_ENABLED", True)
+
+
+def versions(names: Iterable[str]) -> Dict[str, int]:
+    """Current version of each model name, in one cache round trip."""
+    keys = {name: VERSION_KEY.format(name) for name in names}
+    found = cache.get_many(keys.values())
+    result = {}
+    for name, key in keys.items():
+        if key not in found:
+            # start from the clock so an evicted counter never reuses an old version
+            cache.add(key, time.time_ns())
+            found[key] = cache.get(key)
+        result[name] = found[key]
+    return result
+
+
+async def aversions(names: Iterable[str]) -> Dict[str, int]:
+    keys = {name: VERSION_KEY.format(name) for name in names}
+    found = await cache.aget_many(keys.values())
+    result = {}
+    for name, key in keys.items():
+        if key not in found:
+            await cache.aadd(key, time.time_ns())
+            found[key] = await cache.aget(key)
+        result[name] = found[key]
+    return result
+
+
+def response_key(path: str, fmt: str, params, current: Dict[str, int]) -> str:
+    parts = [path, fmt, repr(sorted(params)), repr(sorted(current.items()))]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def bump(*names: str) -> None:
+    """Invalidate every cached response depending on any of ``names``."""
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def record(name: str, outcome: str) -> None:
+    key = METRIC_KEY.format(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+async def arecord(name: str, outcome: str) -> None:
+    key = METRIC_KEY.format(name, outcome)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, timeout=None)
+
+
+def _tag(response: HttpResponse, etag: str, outcome: Optional[str] = None) -> HttpResponse:
+    response["ETag"] = etag
+    if outcome:
+        response["X-Cache"] = outcome
+    # the key includes the renderer format
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def metrics(names: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    """Hit/miss/not-modified counters per cached endpoint."""
+    outcomes = ("hit", "miss", "not_modified")
+    keys = {(name, outcome): METRIC_KEY.format(name, outcome) for name in names for outcome in outcomes}
+    found = cache.get_many(keys.values())
+    return {name: {outcome: found.get(keys[(name, outcome)], 0) for outcome in outcomes} for name in names}
+
+
+class CachedReadMixin:
+    """Cache ``list`` and ``retrieve`` of a public viewset.
+
+    ``cache_dependencies`` names the models the response is built from; a
+    change to any of them bumps its version and so changes the key.
+    """
+
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
+
+    def cache_name(self) -> str:
+        return f"{self.basename}-{self.action}"
+
+    def cache_key(self, request) -> str:
+        current = versions(self.cache_dependencies)
+        return response_key(request.path, request.accepted_renderer.format, request.query_params.lists(), current)
+
+    def cached(self, request, view, *args, **kwargs):
+        if not enabled():
+            return view(request, *args, **kwargs)
+        name = self.cache_name()
+        key = self.cache_key(request)
+        etag = f'"{key}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            record(name, "not_modified")
+            return _tag(HttpResponseNotModified(), etag)
+
+        entry = cache.get(RESPONSE_KEY.format(key))
+        if entry is not None:
+            record(name, "hit")
+            content, content_type = entry
+            return _tag(HttpResponse(content, content_type=content_type), etag, "HIT")
+
+        record(name, "miss")
+        response = view(request, *args, **kwargs)
+        response._catalog_cache_key = key
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(response, "_catalog_cache_key", None)
+        if key and response.status_code == 200:
+            response.render()
+            timeout = getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+            cache.set(RESPONSE_KEY.format(key), (response.content, response["Content-Type"]), timeout)
+            _tag(response, f'"{key}"', "MISS")
+        return response
+
+
+async def aserve(request, name: str, dependencies: Iterable[str], build) -> HttpResponse:
+    """``CachedReadMixin.cached`` for async views; ``build`` is awaited on a miss."""
+    if not enabled():
+        return await build()
+    key = response_key(request.path, "json", request.GET.lists(), await aversions(dependencies))
+    etag = f'"{key}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        await arecord(name, "not_modified")
+        return _tag(HttpResponseNotModified(), etag)
+
+    entry = await cache.aget(RESPONSE_KEY.format(key))
+    if entry is not None:
+        await arecord(name, "hit")
+        content, content_type = entry
+        return _tag(HttpResponse(content, content_type=content_type), etag, "HIT")
+
+    await arecord(name, "miss")
+    response = await build()
+    if response.status_code == 200:
+        timeout = getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+        await cache.aset(RESPONSE_KEY.format(key), (response.content, response["Content-Type"]), timeout)
+        _tag(response, etag, "MISS")
+    return response
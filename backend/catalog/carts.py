@@ -0,0 +1,163 @@
+"""Shopping cart mutations, one SQL statement each.
+
+``add`` is an upsert computed by the database: ``INSERT ... ON DUPLICATE KEY
+UPDATE`` on MySQL, ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite and
+PostgreSQL, with ``quantity = quantity + new`` when incrementing. ``update``
+is a single ``UPDATE`` and ``remove`` a single ``DELETE``. No quantity is
+read into Python and written back, so two quick taps on the same item both
+count. The upsert selects its row from the product table, which doubles as
+the check that the product exists.
+
+``apply`` runs a list of operations in one transaction: either all of them
+apply or none do. ``delta`` and ``totals`` describe just the changed items
+and the cart's sums, for clients that do not need the whole cart back. Both
+price items with a live ``DiscountResolver``, like the full cart
+(``ShoppingCartSerializer``), so the sums always agree with the items shown.
+"""
+from contextlib import nullcontext
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import Product, ShoppingCart, ShoppingCartItem
+from .pricing import CENT, DiscountResolver
+
+ADD, UPDATE, REMOVE = "add", "update", "remove"
+
+
+@dataclass
+class Operation:
+    op: str
+    product: int
+    quantity: Optional[int] = None
+    increment: bool = False
+    is_purchased: Optional[bool] = None
+
+
+def _upsert_sql(increment: bool) -> str:
+    """One statement inserting the item, or updating its quantity, only if the product exists.
+
+    The row comes from a SELECT on the product, so a missing product inserts
+    nothing (rowcount 0) instead of relying on the foreign key check.
+    """
+    qn = connection.ops.quote_name
+    table = qn(ShoppingCartItem._meta.db_table)
+    quantity = qn("quantity")
+    insert = (
+        f"INSERT INTO {table} ({qn('shopping_cart_id')}, {qn('product_id')}, {quantity}, {qn('is_purchased')}) "
+        f"SELECT %s, {qn('id')}, %s, %s FROM {qn(Product._meta.db_table)} WHERE {qn('id')} = %s"
+    )
+    value = f"{table}.{quantity} + %s" if increment else "%s"
+    if connection.vendor == "mysql":
+        return f"{insert} ON DUPLICATE KEY UPDATE {quantity} = {value}"
+    return f"{insert} ON CONFLICT ({qn('shopping_cart_id')}, {qn('product_id')}) DO UPDATE SET {quantity} = {value}"
+
+
+def add(cart_id: int, product_id: int, quantity: int = 1, increment: bool = False) -> None:
+    """Put ``quantity`` of a product in the cart, or add it to the quantity already there.
+
+    Raises ``Product.DoesNotExist`` when there is no such product.
+    """
+    quantity = max(quantity, 1)
+    if connection.vendor == "mysql" or connection.features.supports_update_conflicts_with_target:
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(increment), [cart_id, quantity, False, product_id, quantity])
+            found = cursor.rowcount
+    else:
+        found = _update_or_create(cart_id, product_id, quantity, increment)
+    if not found:
+        raise Product.DoesNotExist(f"Product {product_id} does not exist.")
+
+
+def _update_or_create(cart_id: int, product_id: int, quantity: int, increment: bool) -> bool:
+    """``add`` for backends without an upsert: update first, insert when the item is new."""
+    items = ShoppingCartItem.objects.filter(shopping_cart_id=cart_id, product_id=product_id)
+    new_quantity = F("quantity") + quantity if increment else quantity
+    if items.update(quantity=new_quantity):
+        return True
+    if not Product.objects.filter(pk=product_id).exists():
+        return False
+    try:
+        with transaction.atomic():
+            ShoppingCartItem.objects.create(shopping_cart_id=cart_id, product_id=product_id, quantity=quantity)
+    except IntegrityError:
+        # inserted concurrently since the update
+        items.update(quantity=new_quantity)
+    return True
+
+
+def update(cart_id: int, product_id: int, quantity: Optional[int] = None, is_purchased: Optional[bool] = None) -> None:
+    """Set an item's quantity and/or purchased flag; ``ShoppingCartItem.DoesNotExist`` if it is not in the cart."""
+    items = ShoppingCartItem.objects.filter(shopping_cart_id=cart_id, product_id=product_id)
+    fields = {}
+    if quantity is not None:
+        fields["quantity"] = max(quantity, 1)
+    if is_purchased is not None:
+        fields["is_purchased"] = is_purchased
+    found = items.update(**fields) if fields else items.exists()
+    if not found:
+        raise ShoppingCartItem.DoesNotExist(f"Product {product_id} is not in cart {cart_id}.")
+
+
+def remove(cart_id: int, product_id: int) -> None:
+    ShoppingCartItem.objects.filter(shopping_cart_id=cart_id, product_id=product_id).delete()
+
+
+def apply(cart: ShoppingCart, operations: List[Operation]) -> None:
+    """Apply ``operations`` in order, all or nothing.
+
+    Raises ``Product.DoesNotExist`` when an added product does not exist and
+    ``ShoppingCartItem.DoesNotExist`` when an updated item is not in the cart;
+    the operations before it are rolled back.
+    """
+    # a single statement is atomic by itself
+    with transaction.atomic() if len(operations) > 1 else nullcontext():
+        for operation in operations:
+            if operation.op == ADD:
+                add(cart.pk, operation.product, operation.quantity or 1, operation.increment)
+            elif operation.op == UPDATE:
+                update(cart.pk, operation.product, operation.quantity, operation.is_purchased)
+            else:
+                remove(cart.pk, operation.product)
+
+
+def totals(cart: ShoppingCart, items: Optional[List[ShoppingCartItem]] = None, resolver: Optional[DiscountResolver] = None) -> dict:
+    """Item count, units (total quantity) and cost of the cart at current prices (and of what is left to buy).
+
+    ``items`` (with their products) and ``resolver`` are loaded when not given.
+    """
+    if items is None:
+        items = list(cart.items.select_related("product"))
+    if resolver is None:
+        resolver = DiscountResolver([item.product for item in items])
+    total = remaining = Decimal("0")
+    for item in items:
+        discount, discounted = resolver.resolve(item.product)
+        cost = (discounted if discount else item.product.price or Decimal("0")) * item.quantity
+        total += cost
+        if not item.is_purchased:
+            remaining += cost
+    return {
+        "items": len(items),
+        "units": sum(item.quantity for item in items),
+        "total": total.quantize(CENT),
+        "remaining": remaining.quantize(CENT),
+    }
+
+
+def delta(cart: ShoppingCart, product_ids: Iterable[int], serializer_class, context: dict) -> dict:
+    """The cart's items for ``product_ids`` (serialized), the ones no longer in it, and its totals."""
+    product_ids = set(product_ids)
+    items = list(cart.items.select_related("product__brand").order_by("id"))
+    resolver = DiscountResolver([item.product for item in items])
+    changed = [item for item in items if item.product_id in product_ids]
+    context = {**context, "discount_resolver": resolver}
+    return {
+        "id": cart.pk,
+        "items": serializer_class(changed, many=True, context=context).data,
+        "removed": sorted(product_ids - {item.product_id for item in changed}),
+        "totals": totals(cart, items, resolver),
+    }
@@ -0,0 +1,245 @@
+"""Parsing and normalization of retailer product feeds.
+
+Nothing here touches Django models or settings, so these functions can run in
+worker processes started with either ``fork`` or ``spawn``.
+"""
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, List, Optional
+
+CENT = Decimal("0.01")
+
+READ_SIZE = 64 * 1024
+
+
+def iter_feed(path: str) -> Iterator[dict]:
+    """Yield feed items one by one without loading the whole file."""
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    yield from _iter_json_array(path)
+
+
+def _iter_json_array(path: str) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        started = False
+        while True:
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buf += chunk
+            pos = _skip(buf, 0)
+            if not started:
+                if pos >= len(buf):
+                    if eof:
+                        return
+                    continue
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array of products")
+                pos = _skip(buf, pos + 1)
+                started = True
+            while pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break
+                if end >= len(buf) and not eof:
+                    # a value touching the end of the buffer may be truncated
+                    break
+                yield item
+                pos = _skip(buf, end)
+            buf = buf[pos:]
+            if eof:
+                if buf.strip():
+                    raise ValueError(f"{path}: unexpected end of JSON array")
+                return
+
+
+def _skip(buf: str, pos: int) -> int:
+    """Advance past whitespace and item separators."""
+    while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+        pos += 1
+    return pos
+
+
+def parse_offer_date(value, tz: datetime.tzinfo, is_end: bool = False) -> Optional[datetime.datetime]:
+    """Parse offer dates like '2025/10/20' or '2025-10-20'; end dates run to end-of-day."""
+    if not value or isinstance(value, (int, float)):
+        return None
+    s = str(value).strip()
+    dt = None
+    for fmt in ("%Y/%m/%d", "%Y-%m-%d"):
+        try:
+            dt = datetime.datetime.strptime(s, fmt)
+            break
+        except ValueError:
+            continue
+    if not dt:
+        return None
+    if is_end:
+        dt = dt.replace(hour=23, minute=59, second=59)
+    return dt.replace(tzinfo=tz)
+
+
+def _decimal(value) -> Optional[Decimal]:
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def normalize_item(item: dict, now: datetime.datetime, default_offer_days: int = 7):
+    """Turn a raw feed item into a flat record, or return the reason it is skipped.
+
+    Returns ``(record, None)`` or ``(None, reason)``. Offer dates are read in the
+    timezone of ``now``. Records are plain dicts so they can cross process boundaries.
+    """
+    if not item.get("id"):
+        return None, "no id"
+    if not item.get("category"):
+        return None, "no category"
+    price = _decimal(item.get("price"))
+    if not price:
+        return None, "no price"
+
+    record = {
+        "external_id": str(item["id"]),
+        "name": item.get("name") or "",
+        "category": item["category"],
+        "price": price,
+        "photo_url": item.get("photo_url") or "",
+        "description": item.get("description"),
+        "discount_value": None,
+        "starts_at": None,
+        "ends_at": None,
+        "window_defaulted": False,
+    }
+    # Allow both keys: 'discount_price' and 'discounted_price'
+    discounted = _decimal(item.get("discount_price", item.get("discounted_price")))
+    if discounted is not None and price - discounted > 0:
+        starts_at = parse_offer_date(item.get("offer_start_date"), now.tzinfo)
+        ends_at = parse_offer_date(item.get("offer_end_date"), now.tzinfo, is_end=True)
+        defaulted = starts_at is None or ends_at is None or ends_at <= starts_at
+        starts_at = starts_at or now
+        if ends_at is None or ends_at <= starts_at:
+            ends_at = starts_at + datetime.timedelta(days=default_offer_days)
+        record.update(
+            discount_value=price - discounted, starts_at=starts_at, ends_at=ends_at, window_defaulted=defaulted
+        )
+    record["content_hash"] = content_hash(record, item)
+    return record, None
+
+
+def content_hash(record: dict, item: dict) -> str:
+    """Hash of everything the importer writes for a product.
+
+    Offer dates are hashed as given in the feed (not the defaulted window), so a
+    feed without dates hashes the same from one run to the next.
+    """
+    parts = [
+        record["name"],
+        str(record["price"]),
+        record["photo_url"],
+        record["description"] or "",
+        record["category"],
+        str(record["discount_value"] or ""),
+        str(item.get("offer_start_date") or ""),
+        str(item.get("offer_end_date") or ""),
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ParsedFeed:
+    """A feed normalized by a worker process.
+
+    The records are not returned through the pool: ``parse_feed`` spools them
+    to a temporary file in pickled batches, and ``batches`` reads them back one
+    batch at a time, so neither process holds the whole feed in memory.
+    """
+
+    path: str
+    brand: str
+    spool: Optional[str] = None
+    records: int = 0
+    skipped: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+
+    def batches(self) -> Iterator[List[dict]]:
+        """Yield the spooled record batches, then remove the spool file."""
+        if self.spool is None:
+            return
+        try:
+            with open(self.spool, "rb") as f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        return
+        finally:
+            self.discard()
+
+    def iter_records(self) -> Iterator[dict]:
+        for batch in self.batches():
+            yield from batch
+
+    def discard(self) -> None:
+        if self.spool is not None:
+            try:
+                os.remove(self.spool)
+            except FileNotFoundError:
+                pass
+            self.spool = None
+
+
+def parse_feed(
+    path: str,
+    brand: str,
+    now: datetime.datetime,
+    default_offer_days: int = 7,
+    batch_size: int = 1000,
+    spool_dir: Optional[str] = None,
+) -> ParsedFeed:
+    """Parse and normalize a whole feed into a spool file; the unit of work of the parallel importer."""
+    started = time.monotonic()
+    parsed = ParsedFeed(path=path, brand=brand)
+    fd, parsed.spool = tempfile.mkstemp(prefix="feed-", suffix=".spool", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            batch = []
+            for item in iter_feed(path):
+                record, reason = normalize_item(item, now, default_offer_days)
+                if record is None:
+                    parsed.skipped[reason] += 1
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    parsed.records += len(batch)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                parsed.records += len(batch)
+    except BaseException:
+        parsed.discard()
+        raise
+    parsed.seconds = time.monotonic() - started
+    return parsed
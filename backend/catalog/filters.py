@@ -1,12 +1,120 @@
 import django_filters
-from .models import Product
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import Discount, Product, Report
 
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
+    # Price after discounts and absolute (EUR) / relative (%) saving, annotated by
+    # pricing.annotate_effective_prices, the same expressions the ordering uses
+    min_effective_price = django_filters.NumberFilter(field_name="effective_price", lookup_expr='gte')
+    max_effective_price = django_filters.NumberFilter(field_name="effective_price", lookup_expr='lte')
+    min_saving = django_filters.NumberFilter(field_name="saving", lookup_expr='gte')
+    min_saving_percent = django_filters.NumberFilter(field_name="saving_percent", lookup_expr='gte')
+    on_sale = django_filters.BooleanFilter(method="filter_on_sale")
     brand = django_filters.CharFilter(field_name='brand__name', lookup_expr='iexact')
     category = django_filters.CharFilter(field_name='category__name', lookup_expr='iexact')
     
     class Meta:
         model = Product
-        fields = ['min_price', 'max_price', 'brand', 'category']
+        fields = [
+            'min_price',
+            'max_price',
+            'min_effective_price',
+            'max_effective_price',
+            'min_saving',
+            'min_saving_percent',
+            'on_sale',
+            'brand',
+            'category',
+        ]
+
+    def filter_on_sale(self, queryset, name, value):
+        # a current price past its valid_until is waiting for the worker and may no longer be discounted
+        on_sale = Q(current_price__discount__isnull=False) & (
+            Q(current_price__valid_until__isnull=True) | Q(current_price__valid_until__gt=timezone.now())
+        )
+        return queryset.filter(on_sale) if value else queryset.exclude(on_sale)
+
+
+class DiscountFilter(django_filters.FilterSet):
+    # IN_ACTION etc. as shown by Discount.effective_status, answered from the (status, phase) index
+    EFFECTIVE_STATUSES = {
+        "IN_REVIEW": {"status": Discount.DiscountStatus.IN_REVIEW},
+        "DENIED": {"status": Discount.DiscountStatus.DENIED},
+        "APPROVED": {"status": Discount.DiscountStatus.APPROVED, "phase": Discount.Phase.SCHEDULED},
+        "IN_ACTION": {"status": Discount.DiscountStatus.APPROVED, "phase": Discount.Phase.ACTIVE},
+        "ENDED": {"status": Discount.DiscountStatus.APPROVED, "phase": Discount.Phase.ENDED},
+    }
+
+    effective_status = django_filters.ChoiceFilter(
+        choices=[(key, key) for key in EFFECTIVE_STATUSES], method="filter_effective_status"
+    )
+
+    class Meta:
+        model = Discount
+        fields = ['status', 'phase', 'target_type', 'effective_status']
+
+    def filter_effective_status(self, queryset, name, value):
+        return queryset.filter(**self.EFFECTIVE_STATUSES[value])
+
+
+class ModerationQueueFilter(django_filters.FilterSet):
+    """Shared moderation queue filters; subclasses map store/brand to their own relations."""
+    created_after = django_filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="gte")
+    created_before = django_filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="lte")
+    min_age_hours = django_filters.NumberFilter(method="filter_min_age")
+    max_age_hours = django_filters.NumberFilter(method="filter_max_age")
+    store = django_filters.NumberFilter(method="filter_store")
+    brand = django_filters.NumberFilter(method="filter_brand")
+
+    store_paths = ()
+    brand_paths = ()
+
+    def filter_min_age(self, queryset, name, value):
+        return queryset.filter(created_at__lte=timezone.now() - timedelta(hours=float(value)))
+
+    def filter_max_age(self, queryset, name, value):
+        return queryset.filter(created_at__gte=timezone.now() - timedelta(hours=float(value)))
+
+    def filter_store(self, queryset, name, value):
+        return queryset.filter(self._any(self.store_paths, value))
+
+    def filter_brand(self, queryset, name, value):
+        return queryset.filter(self._any(self.brand_paths, value))
+
+    @staticmethod
+    def _any(paths, value):
+        condition = Q()
+        for path in paths:
+            condition |= Q(**{path: value})
+        return condition
+
+
+class DiscountModerationFilter(ModerationQueueFilter):
+    submitter = django_filters.NumberFilter(field_name="submitted_by")
+
+    store_paths = ("store_id", "product__store_id")
+    brand_paths = ("brand_id", "store__brand_id", "product__brand_id")
+
+    class Meta:
+        model = Discount
+        fields = ['status', 'target_type', 'submitter', 'store', 'brand']
+
+
+class ReportModerationFilter(ModerationQueueFilter):
+    submitter = django_filters.NumberFilter(field_name="reported_by")
+
+    store_paths = ("product__store_id", "discount__store_id", "discount__product__store_id")
+    brand_paths = (
+        "product__brand_id",
+        "discount__brand_id",
+        "discount__store__brand_id",
+        "discount__product__brand_id",
+    )
+
+    class Meta:
+        model = Report
+        fields = ['status', 'submitter', 'store', 'brand']
@@ -0,0 +1,166 @@
+"""Content-addressed image store.
+
+Images (report uploads, mirrored product photos) are checked with Pillow and
+written under ``MEDIA_ROOT`` by the SHA-256 of their bytes, so the same image
+stored twice is kept once. A fixed-size ``IMAGE_THUMBNAIL_SIZE`` square
+thumbnail (``IMAGE_THUMBNAIL_FORMAT``: WEBP, the default, or JPEG) is written next to it.
+``ImageBlob`` rows record what is stored; ``serve_image`` streams either
+variant with long-lived cache headers, since a given address never changes.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import mimetypes
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from PIL import Image, UnidentifiedImageError
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+THUMBNAIL_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+@dataclass
+class StoredImage:
+    sha256: str
+    file: str
+    thumbnail: str
+    content_type: str
+    size: int
+    width: int
+    height: int
+
+
+def decode_base64(value: str) -> bytes:
+    """Decode a base64 string or ``data:image/...;base64,`` URL."""
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    try:
+        return base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImage("Image is not valid base64.")
+
+
+def blob_path(sha256: str, folder: str = "blobs") -> str:
+    return f"{folder}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def _write(name: str, data: bytes) -> str:
+    if default_storage.exists(name):
+        return name
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        # a concurrent writer stored the same content first
+        default_storage.delete(saved)
+    return name
+
+
+def _thumbnail(image: Image.Image) -> Image.Image:
+    """Downscale ``image`` into the middle of a white square of the thumbnail size."""
+    size = getattr(settings, "IMAGE_THUMBNAIL_SIZE", 320)
+    scaled = image.convert("RGBA")
+    scaled.thumbnail((size, size))
+    canvas = Image.new("RGB", (size, size), "white")
+    canvas.paste(scaled, ((size - scaled.width) // 2, (size - scaled.height) // 2), scaled)
+    return canvas
+
+
+def write_image(data: bytes) -> StoredImage:
+    """Validate ``data`` and write it and its thumbnail to the storage (idempotent)."""
+    max_bytes = getattr(settings, "IMAGE_MAX_BYTES", 5 * 1024 * 1024)
+    if len(data) > max_bytes:
+        raise InvalidImage(f"Image is larger than {max_bytes // 1024} KiB.")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            kind = image.format
+            width, height = image.size
+            thumb = _thumbnail(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("File is not a supported image.")
+    if kind not in CONTENT_TYPES:
+        raise InvalidImage("Only JPEG, PNG, GIF and WebP images are accepted.")
+
+    thumb_format = getattr(settings, "IMAGE_THUMBNAIL_FORMAT", "WEBP").upper()
+    buffer = io.BytesIO()
+    thumb.save(buffer, thumb_format, quality=80)
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    thumb_name = f"{blob_path(sha256, 'thumbs')}.{THUMBNAIL_EXTENSIONS[thumb_format]}"
+    return StoredImage(
+        sha256=sha256,
+        file=_write(blob_path(sha256), data),
+        thumbnail=_write(thumb_name, buffer.getvalue()),
+        content_type=CONTENT_TYPES[kind],
+        size=len(data),
+        width=width,
+        height=height,
+    )
+
+
+def store_image(data: bytes):
+    """Return the ``ImageBlob`` for ``data``, storing it first if it is new."""
+    from .models import ImageBlob
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = ImageBlob.objects.filter(sha256=sha256).first()
+    if existing is not None:
+        return existing
+    stored = write_image(data)
+    blob, _ = ImageBlob.objects.get_or_create(sha256=stored.sha256, defaults=vars(stored))
+    return blob
+
+
+def image_url(sha256: str, request=None, variant: str = "original") -> str:
+    url = reverse("catalog:image-thumbnail" if variant == "thumbnail" else "catalog:image", args=[sha256])
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def photo_url(url: str, photo_id, photo_source: str, request=None, variant: str = "original") -> str:
+    """The local copy of a product photo if ``url`` has been mirrored, else ``url``."""
+    if photo_id and photo_source == url:
+        return image_url(photo_id, request, variant)
+    return url
+
+
+def product_photo_url(product, request=None, variant: str = "original") -> str:
+    return photo_url(product.photo_url, product.photo_id, product.photo_source, request, variant)
+
+
+@require_safe
+def serve_image(request, sha256: str, variant: str = "original"):
+    """Stream an image (or its thumbnail) from the storage."""
+    from .models import ImageBlob
+
+    # a deleted blob must not keep revalidating as 304
+    blob = ImageBlob.objects.filter(sha256=sha256).first()
+    if blob is None:
+        raise Http404("Unknown image")
+    etag = f'"{sha256}-{variant}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        if variant == "thumbnail":
+            name = blob.thumbnail.name
+            content_type = mimetypes.guess_type(name)[0] or "image/jpeg"
+        else:
+            name, content_type = blob.file.name, blob.content_type
+        try:
+            handle = default_storage.open(name, "rb")
+        except FileNotFoundError:
+            raise Http404("Image file is missing")
+        response = FileResponse(handle, content_type=content_type)
+    response["ETag"] = etag
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,371 @@
+"""Bulk importer for retailer product feeds.
+
+Feeds are parsed and normalized by ``catalog.feeds`` (streamed in-process for a
+single feed, or in a process pool for a manifest of feeds) and written here in
+chunks with ``bulk_create(update_conflicts=True)`` on ``(brand, external_id)``.
+Writing happens in a single process; each chunk runs in its own transaction and
+refreshes the search index and cached prices of the products it touched.
+"""
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .feeds import iter_feed, normalize_item, parse_feed
+from .models import Brand, Category, Discount, Product
+from . import caching, pricing, search
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    missing: int = 0
+    discounts: int = 0
+    skipped: Counter = field(default_factory=Counter)
+    parse_seconds: Optional[float] = None
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self, label: str) -> str:
+        skipped = sum(self.skipped.values())
+        reasons = ", ".join(f"{reason}: {n}" for reason, n in self.skipped.most_common())
+        rate = self.rows / self.elapsed if self.elapsed else 0
+        text = (
+            f"{label}: {self.rows} rows, {self.created} created, {self.updated} updated, "
+            f"{skipped} skipped, {self.discounts} discounts in {self.elapsed:.1f}s ({rate:.0f} rows/s)"
+        )
+        if self.unchanged or self.missing:
+            text = f"{text}, {self.unchanged} unchanged, {self.missing} missing"
+        if self.parse_seconds is not None:
+            text = f"{text}, parsed in {self.parse_seconds:.1f}s"
+        return f"{text} [{reasons}]" if reasons else text
+
+
+class FeedWriter:
+    """Bulk-upserts normalized records of one brand in chunked transactions."""
+
+    PRODUCT_FIELDS = [
+        "name",
+        "category",
+        "price",
+        "photo_url",
+        "description",
+        "store",
+        "content_hash",
+        "stale_since",
+        "updated_at",
+    ]
+    DISCOUNT_FIELDS = ["name", "value", "starts_at", "ends_at", "status", "phase", "brand", "updated_at"]
+
+    def __init__(
+        self,
+        brand: Brand,
+        chunk_size: int = 1000,
+        stats: Optional[ImportStats] = None,
+        delta: bool = False,
+        default_offer_days: int = 7,
+    ):
+        self.brand = brand
+        self.chunk_size = chunk_size
+        self.stats = stats or ImportStats()
+        self.delta = delta
+        self.default_offer_days = default_offer_days
+        self.seen: Set[str] = set()
+        self.categories: Dict[str, int] = dict(Category.objects.values_list("name", "id"))
+
+    def write(self, records: Iterable[dict]) -> ImportStats:
+        chunk: List[dict] = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(chunk)
+        self.stats.finished = time.monotonic()
+        return self.stats
+
+    def write_chunk(self, records: List[dict]) -> List[int]:
+        """Upsert one chunk; returns the ids of the products written."""
+        by_external_id = {}
+        for record in records:
+            if record["external_id"] in by_external_id:
+                self.stats.skipped["duplicate id"] += 1
+            by_external_id[record["external_id"]] = record
+        self.seen.update(by_external_id)
+        if not by_external_id:
+            return []
+
+        with transaction.atomic():
+            existing = {
+                external_id: (pk, content_hash, stale_since)
+                for external_id, pk, content_hash, stale_since in Product.objects.filter(
+                    brand=self.brand, external_id__in=by_external_id
+                ).values_list("external_id", "id", "content_hash", "stale_since")
+            }
+            records = list(by_external_id.values())
+            if self.delta:
+                unchanged = [r for r in records if self._unchanged(r, existing.get(r["external_id"]))]
+                if unchanged:
+                    self._renew_defaulted_windows([existing[r["external_id"]][0] for r in unchanged if r["window_defaulted"]])
+                    skip = {r["external_id"] for r in unchanged}
+                    records = [r for r in records if r["external_id"] not in skip]
+                    self.stats.unchanged += len(unchanged)
+            if not records:
+                return []
+
+            category_ids = self._category_ids({r["category"] for r in records})
+            Product.objects.bulk_create(
+                [self._product(r, category_ids) for r in records],
+                update_conflicts=True,
+                unique_fields=["brand", "external_id"],
+                update_fields=self.PRODUCT_FIELDS,
+            )
+            ids = dict(
+                Product.objects.filter(brand=self.brand, external_id__in=[r["external_id"] for r in records])
+                .values_list("external_id", "id")
+            )
+            self._write_discounts(records, ids)
+
+        product_ids = list(ids.values())
+        self.after_write(product_ids)
+        updated = sum(1 for r in records if r["external_id"] in existing)
+        self.stats.rows += len(records)
+        self.stats.created += len(records) - updated
+        self.stats.updated += updated
+        return product_ids
+
+    @staticmethod
+    def _unchanged(record: dict, current) -> bool:
+        if current is None:
+            return False
+        _, content_hash, stale_since = current
+        return content_hash == record["content_hash"] and stale_since is None
+
+    def _renew_defaulted_windows(self, product_ids: List[int]) -> None:
+        """Unchanged products whose feed gives no offer dates keep their discount alive.
+
+        Their discount window was defaulted to ``default_offer_days``; extend it
+        only when it is about to run out so most runs leave the rows untouched.
+        The update bypasses signals, so the renewed products' current prices,
+        discount history and cached discounts are refreshed here.
+        """
+        if not product_ids:
+            return
+        now = timezone.now()
+        expiring = Discount.objects.filter(
+            product_id__in=product_ids,
+            target_type=Discount.TARGET_PRODUCT,
+            submitted_by__isnull=True,
+            ends_at__lt=now + timedelta(days=1),
+        )
+        renewed = list(expiring.values_list("product_id", flat=True).distinct())
+        if not renewed:
+            return
+        expiring.update(
+            ends_at=now + timedelta(days=self.default_offer_days),
+            phase=Case(When(starts_at__gt=now, then=Value(Discount.Phase.SCHEDULED)), default=Value(Discount.Phase.ACTIVE)),
+            updated_at=now,
+        )
+        pricing.refresh_current_prices(renewed, now)
+        caching.bump("discount")
+
+    def after_write(self, product_ids: List[int]) -> None:
+        """Bulk writes bypass model signals, so refresh derived data explicitly."""
+        search.index_products(product_ids)
+        pricing.refresh_current_prices(product_ids)
+        caching.bump("product", "category", "discount")
+
+    def _category_ids(self, names) -> Dict[str, int]:
+        missing = [name for name in names if name not in self.categories]
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+            for name in missing:
+                if name not in self.categories:
+                    # case-insensitive collations match an existing category spelled differently
+                    self.categories[name] = Category.objects.get(name__iexact=name).id
+        return self.categories
+
+    def _product(self, record: dict, category_ids: Dict[str, int]) -> Product:
+        return Product(
+            brand=self.brand,
+            store=None,
+            external_id=record["external_id"],
+            name=record["name"],
+            category_id=category_ids[record["category"]],
+            price=record["price"],
+            photo_url=record["photo_url"],
+            description=record["description"],
+            content_hash=record["content_hash"],
+            stale_since=None,
+        )
+
+    def _write_discounts(self, records: List[dict], ids: Dict[str, int]) -> None:
+        discounted = [r for r in records if r["discount_value"]]
+        if not discounted:
+            return
+        product_ids = [ids[r["external_id"]] for r in discounted]
+        existing = {}
+        for discount in Discount.objects.filter(
+            product_id__in=product_ids,
+            target_type=Discount.TARGET_PRODUCT,
+            submitted_by__isnull=True,
+        ).order_by("-id"):
+            existing[discount.product_id] = discount
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for record in discounted:
+            product_id = ids[record["external_id"]]
+            discount = existing.get(product_id) or Discount(
+                product_id=product_id,
+                discount_type=Discount.FIXED,
+                target_type=Discount.TARGET_PRODUCT,
+            )
+            discount.name = f"{record['name']} Discount"
+            discount.value = record["discount_value"]
+            discount.starts_at = record["starts_at"]
+            discount.ends_at = record["ends_at"]
+            discount.status = Discount.DiscountStatus.APPROVED
+            discount.phase = discount.phase_at(now)
+            discount.brand = self.brand
+            discount.updated_at = now
+            (to_update if discount.pk else to_create).append(discount)
+        Discount.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        Discount.objects.bulk_update(to_update, self.DISCOUNT_FIELDS, batch_size=self.chunk_size)
+        self.stats.discounts += len(discounted)
+
+
+def handle_missing(brand: Brand, seen: Set[str], mark_stale: bool = False, end_discounts: bool = False) -> int:
+    """Deal with ``brand`` products that were absent from its feed(s).
+
+    ``mark_stale`` sets ``stale_since``; ``end_discounts`` ends their imported
+    discounts now. Both run as chunked bulk updates. Returns how many products
+    were missing.
+    """
+    if not (mark_stale or end_discounts):
+        return 0
+    missing = [
+        pk
+        for pk, external_id in Product.objects.filter(brand=brand, external_id__isnull=False, stale_since__isnull=True)
+        .values_list("id", "external_id")
+        .iterator()
+        if external_id not in seen
+    ]
+    now = timezone.now()
+    for start in range(0, len(missing), 1000):
+        chunk = missing[start:start + 1000]
+        with transaction.atomic():
+            if mark_stale:
+                Product.objects.filter(pk__in=chunk).update(stale_since=now, updated_at=now)
+            if end_discounts:
+                Discount.objects.filter(
+                    product_id__in=chunk,
+                    target_type=Discount.TARGET_PRODUCT,
+                    submitted_by__isnull=True,
+                    ends_at__gt=now,
+                ).update(ends_at=now, phase=Discount.Phase.ENDED, updated_at=now)
+        if end_discounts:
+            pricing.refresh_current_prices(chunk)
+    if missing:
+        caching.bump("product", "discount")
+    return len(missing)
+
+
+def import_feed(
+    path: str,
+    brand_name: str,
+    chunk_size: int = 1000,
+    default_offer_days: int = 7,
+    delta: bool = False,
+    mark_stale: bool = False,
+    end_discounts: bool = False,
+) -> ImportStats:
+    """Stream ``path`` into the catalog under ``brand_name``."""
+    brand, _ = Brand.objects.get_or_create(name=brand_name)
+    writer = FeedWriter(brand, chunk_size=chunk_size, delta=delta, default_offer_days=default_offer_days)
+    now = timezone.localtime()
+
+    def records():
+        for item in iter_feed(path):
+            record, reason = normalize_item(item, now, default_offer_days)
+            if record is None:
+                writer.stats.skipped[reason] += 1
+                continue
+            yield record
+
+    stats = writer.write(records())
+    stats.missing = handle_missing(brand, writer.seen, mark_stale, end_discounts)
+    stats.finished = time.monotonic()
+    return stats
+
+
+def import_feeds(
+    feeds: Sequence[Tuple[str, str]],
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    default_offer_days: int = 7,
+    delta: bool = False,
+    mark_stale: bool = False,
+    end_discounts: bool = False,
+    on_feed_done: Optional[Callable[[str, str, ImportStats], None]] = None,
+) -> List[Tuple[str, str, ImportStats]]:
+    """Import many ``(path, brand name)`` feeds.
+
+    Feeds are parsed and normalized in a pool of ``workers`` processes, which
+    spool the records to temporary files; this process streams them back and
+    writes them one feed at a time as they complete, so the database sees a
+    single writer and no process holds a whole feed. ``on_feed_done`` is called after each feed.
+    Missing products are handled per brand once all of its feeds are written.
+    """
+    now = timezone.localtime()
+    results = []
+    seen: Dict[Brand, Set[str]] = defaultdict(set)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(parse_feed, path, brand, now, default_offer_days, batch_size=chunk_size)
+            for path, brand in feeds
+        ]
+        try:
+            for future in as_completed(futures):
+                parsed = future.result()
+                brand, _ = Brand.objects.get_or_create(name=parsed.brand)
+                stats = ImportStats(skipped=parsed.skipped, parse_seconds=parsed.seconds)
+                writer = FeedWriter(
+                    brand, chunk_size=chunk_size, stats=stats, delta=delta, default_offer_days=default_offer_days
+                )
+                # streamed back from the worker's spool file, one chunk at a time
+                writer.write(parsed.iter_records())
+                seen[brand].update(writer.seen)
+                results.append((parsed.path, parsed.brand, stats))
+                if on_feed_done:
+                    on_feed_done(parsed.path, parsed.brand, stats)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            _discard_spools(futures)
+            raise
+    for brand, external_ids in seen.items():
+        handle_missing(brand, external_ids, mark_stale, end_discounts)
+    return results
+
+
+def _discard_spools(futures) -> None:
+    """Remove the spool files of parsed feeds that were not written."""
+    for future in futures:
+        if not future.cancelled() and future.done() and future.exception() is None:
+            future.result().discard()
@@ -0,0 +1,56 @@
+"""Discount lifecycle: scheduled -> active -> ended.
+
+``Discount.phase`` is set on save and persisted so listings can filter and
+paginate on it in SQL. Rows written in bulk or crossing a time boundary are
+moved along by ``advance_discounts``, run periodically by the
+``run_discount_lifecycle`` worker. Each transition batch sends
+``phase_changed`` so price caches can refresh themselves.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Discount
+
+# Sent with ``now`` and ``changed`` ({phase: [discount ids]}) after a batch of transitions.
+phase_changed = Signal()
+
+STATUSES = list(Discount.DiscountStatus.values)
+
+
+def phase_windows(now) -> Dict[str, Q]:
+    """Window condition of each phase, written as ranges on the lifecycle index."""
+    return {
+        Discount.Phase.SCHEDULED: Q(starts_at__gt=now),
+        Discount.Phase.ACTIVE: Q(starts_at__lte=now, ends_at__gt=now),
+        Discount.Phase.ENDED: Q(starts_at__lt=now, ends_at__lte=now),
+    }
+
+
+def advance_discounts(now=None) -> Dict[str, list]:
+    """Persist the phase of every discount whose window moved on; returns the changed ids per phase."""
+    now = now or timezone.now()
+    changed = {}
+    with transaction.atomic():
+        for phase, window in phase_windows(now).items():
+            rows = Discount.objects.filter(window, status__in=STATUSES).exclude(phase=phase)
+            ids = list(rows.values_list("id", flat=True))
+            if ids:
+                Discount.objects.filter(pk__in=ids).update(phase=phase)
+                changed[phase] = ids
+    if changed:
+        phase_changed.send(sender=Discount, now=now, changed=changed)
+    return changed
+
+
+def next_boundary(now=None) -> Optional[datetime]:
+    """When the next approved discount starts or ends, if any."""
+    now = now or timezone.now()
+    approved = Discount.objects.filter(status=Discount.DiscountStatus.APPROVED)
+    starts = approved.filter(starts_at__gt=now).order_by("starts_at").values_list("starts_at", flat=True).first()
+    ends = approved.filter(ends_at__gt=now).order_by("ends_at").values_list("ends_at", flat=True).first()
+    return min((t for t in (starts, ends) if t is not None), default=None)
@@ -0,0 +1,104 @@
+"""Concurrent HTTP load against running servers, to compare deployments.
+
+``run_load`` keeps ``concurrency`` clients (threads, each with its own
+keep-alive session) requesting ``paths`` round-robin for a fixed time or a fixed
+number of requests, and records every latency. Used by the ``load_test``
+command to put the WSGI and ASGI profiles side by side.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import count
+from typing import List, Optional, Sequence
+
+import requests
+
+# the catalog reads the async views cover
+DEFAULT_PATHS = (
+    "/api/catalog/products/?page_size=50",
+    "/api/catalog/products/?page=2&ordering=-saving_percent",
+    "/api/catalog/products/?fields=id,name,price,effective_price",
+    "/api/catalog/products/search/?q=pienas",
+    "/api/catalog/brands/",
+    "/api/catalog/categories/",
+    "/api/catalog/stores/",
+)
+
+
+@dataclass
+class LoadResult:
+    target: str
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Latency in milliseconds below which ``p`` percent of the requests finished."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index] * 1000
+
+
+def run_load(
+    target: str,
+    base_url: str,
+    paths: Sequence[str] = DEFAULT_PATHS,
+    concurrency: int = 16,
+    duration: Optional[float] = 10.0,
+    total: Optional[int] = None,
+    token: Optional[str] = None,
+    timeout: float = 30.0,
+) -> LoadResult:
+    """Load ``base_url`` until ``duration`` seconds pass or ``total`` requests are sent."""
+    result = LoadResult(target)
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    base_url = base_url.rstrip("/")
+    issued = count()
+    lock = threading.Lock()
+    deadline = None
+
+    def client():
+        session = requests.Session()
+        session.headers.update(headers)
+        latencies, errors = [], 0
+        while True:
+            number = next(issued)
+            if total is not None and number >= total:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + paths[number % len(paths)], timeout=timeout)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+        session.close()
+        with lock:
+            result.latencies.extend(latencies)
+            result.errors += errors
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    started = time.monotonic()
+    if total is None:
+        deadline = started + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from catalog import benchmark
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(benchmark.__file__), 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with a synthetic catalog and measure query count, '
+        'response size, wall time and peak memory of every API endpoint against a stored baseline. '
+        'More queries or larger responses fail the run; timings are only reported'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000, help='Synthetic products to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per endpoint (the best one counts)')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Record new endpoints and those whose query count or response size changed in the baseline',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.1,
+            help='Allowed relative growth of response size over the baseline (query counts must not grow)',
+        )
+        parser.add_argument(
+            '--reference', default='categories-detail',
+            help='Endpoint whose time the others are reported relative to (always run)',
+        )
+        parser.add_argument('--only', nargs='*', help='Endpoint names to run')
+        parser.add_argument('--with-cache', action='store_true', help='Measure with the response cache enabled')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+        parser.add_argument(
+            '--serialization', action='store_true',
+            help='Also compare serializer and values() rows, DRF JSON and orjson on a product list page',
+        )
+
+    def handle(self, *args, **options):
+        if options['with_cache'] and options['update_baseline']:
+            raise CommandError('The baseline is recorded without the response cache; drop --with-cache')
+        # DEBUG off like production (restored on teardown); CaptureQueriesContext records queries regardless
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        # seeded report images go to a throwaway media directory as well
+        media = tempfile.TemporaryDirectory()
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        try:
+            started = time.monotonic()
+            data = benchmark.seed(products=options['products'])
+            self.stdout.write(f'Seeded {options["products"]} products in {time.monotonic() - started:.1f}s')
+            only = options['only'] and [*options['only'], options['reference']]
+            results = benchmark.run(data, repeat=options['repeat'], only=only, cache=options['with_cache'])
+            if options['serialization']:
+                results += benchmark.serialization_paths(repeat=options['repeat'])
+        finally:
+            media_settings.disable()
+            media.cleanup()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline'], encoding='utf-8') as fh:
+                baseline = json.load(fh).get('endpoints', {})
+        self.stdout.write(benchmark.format_table(results, baseline, reference=options['reference']))
+
+        if options['update_baseline']:
+            merged = benchmark.merge_baseline(results, baseline, tolerance=options['tolerance'])
+            with open(options['baseline'], 'w', encoding='utf-8') as fh:
+                json.dump(
+                    {'products': options['products'], 'vendor': connection.vendor, 'endpoints': merged},
+                    fh, indent=2, sort_keys=True,
+                )
+                fh.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        problems = benchmark.compare(results, baseline, tolerance=options['tolerance'])
+        if problems:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
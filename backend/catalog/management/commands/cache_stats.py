@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from catalog import caching
+from catalog.views import BrandViewSet, CategoryViewSet, ProductViewSet, StoreViewSet
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the catalog response cache (shared only with the Redis backend)'
+
+    def handle(self, *args, **options):
+        names = [
+            f'{viewset.queryset.model._meta.model_name}-{action}'
+            for viewset in (BrandViewSet, CategoryViewSet, StoreViewSet, ProductViewSet)
+            for action in ('list', 'retrieve')
+        ]
+        for name, counts in caching.metrics(names).items():
+            served = counts['hit'] + counts['not_modified']
+            total = served + counts['miss']
+            ratio = f'{100 * served / total:.0f}%' if total else '-'
+            self.stdout.write(
+                f"{name:<20} hits {counts['hit']:>8}  304s {counts['not_modified']:>8}  "
+                f"misses {counts['miss']:>8}  served from cache {ratio}"
+            )
@@ -1,103 +1,98 @@
-from django.core.management.base import BaseCommand
 import json
-from catalog.models import Product, Category, Brand, Discount, Store
-from decimal import Decimal, InvalidOperation
-from django.utils import timezone
-import datetime
+import os
+import time
 
-class Command(BaseCommand):
-    help = 'Import products from a JSON file'
-
-    def add_arguments(self, parser):
-        parser.add_argument('json_file', type=str, help='The JSON file to import')
-        parser.add_argument('brand_name', type=str, help='The brand name for the products')
+from django.core.management.base import BaseCommand, CommandError
 
-    def handle(self, *args, **options):
-        json_file_path = options['json_file']
-        brand_name = options['brand_name']
+from catalog.importer import import_feed, import_feeds
 
-        brand, _ = Brand.objects.get_or_create(name=brand_name)
 
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+class Command(BaseCommand):
+    help = (
+        'Import products from a JSON (array) or NDJSON feed file, or from many feeds listed in a manifest. '
+        'A manifest is a JSON list of {"file": ..., "brand": ...} objects; relative paths are resolved '
+        'against the manifest directory.'
+    )
 
-        # helper to parse offer date strings like '2025/10/20' or '2025-10-20'
-        def _parse_offer_date(date_str, is_end=False):
-            if not date_str:
-                return None
-            if isinstance(date_str, (int, float)):
-                # Unexpected numeric value
-                return None
-            s = str(date_str).strip()
-            dt = None
-            for fmt in ("%Y/%m/%d", "%Y-%m-%d"):
-                try:
-                    dt = datetime.datetime.strptime(s, fmt)
-                    break
-                except ValueError:
-                    continue
-            if not dt:
-                return None
-            # If end datetime, set to end-of-day
-            if is_end:
-                dt = dt.replace(hour=23, minute=59, second=59)
-            # Make timezone-aware in current timezone if naive
-            if timezone.is_naive(dt):
-                dt = timezone.make_aware(dt, timezone.get_current_timezone())
-            return dt
+    def add_arguments(self, parser):
+        parser.add_argument('json_file', type=str, nargs='?', help='The JSON file to import')
+        parser.add_argument('brand_name', type=str, nargs='?', help='The brand name for the products')
+        parser.add_argument('--manifest', type=str, help='JSON manifest of feeds to import in parallel')
+        parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Products written per transaction')
+        parser.add_argument(
+            '--default-offer-days',
+            type=int,
+            default=7,
+            help='Discount length when the feed gives no (valid) offer end date',
+        )
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            help='Skip products whose feed content is unchanged since the last import',
+        )
+        parser.add_argument(
+            '--mark-missing-stale',
+            action='store_true',
+            help='Mark products of the brand that are missing from the feed as stale',
+        )
+        parser.add_argument(
+            '--end-missing-discounts',
+            action='store_true',
+            help='End the imported discounts of products missing from the feed',
+        )
 
-        for item in data:
-            if not item.get('category'):
-                self.stdout.write(self.style.WARNING(f"Skipping product with no category: {item.get('name', 'Unknown name')}"))
-                continue
+    def handle(self, *args, **options):
+        if options['manifest']:
+            self._import_manifest(options)
+            return
+        if not options['json_file'] or not options['brand_name']:
+            raise CommandError('Provide json_file and brand_name, or --manifest.')
+        stats = import_feed(
+            options['json_file'],
+            options['brand_name'],
+            chunk_size=options['chunk_size'],
+            **self._import_options(options),
+        )
+        self.stdout.write(self.style.SUCCESS(stats.summary(options['brand_name'])))
 
-            if not item.get('price'):
-                self.stdout.write(self.style.WARNING(f"Skipping product with no price: {item.get('name', 'Unknown name')}"))
-                continue
+    def _import_options(self, options):
+        return {
+            'default_offer_days': options['default_offer_days'],
+            'delta': options['delta'],
+            'mark_stale': options['mark_missing_stale'],
+            'end_discounts': options['end_missing_discounts'],
+        }
 
-            category, _ = Category.objects.get_or_create(name=item['category'])
+    def _import_manifest(self, options):
+        feeds = self._read_manifest(options['manifest'])
+        started = time.monotonic()
 
-            product, created = Product.objects.update_or_create(
-                external_id=item.get('id'),
-                brand=brand,
-                defaults={
-                    'name': item['name'],
-                    'category': category,
-                    'price': item['price'],
-                    'photo_url': item['photo_url'],
-                    'store': None,
-                    'description': item.get('description', None),
-                }
-            )
+        def report(path, brand, stats):
+            self.stdout.write(self.style.SUCCESS(stats.summary(f'{brand} ({os.path.basename(path)})')))
 
-            # Allow both keys: 'discount_price' and 'discounted_price'
-            discounted_val = item.get('discount_price', item.get('discounted_price'))
-            if discounted_val is not None:
-                try:
-                    price_decimal = Decimal(str(item['price']))
-                    discounted_decimal = Decimal(str(discounted_val))
-                    discount_value = price_decimal - discounted_decimal
-                except (InvalidOperation, TypeError):
-                    self.stdout.write(self.style.WARNING(f"Could not calculate discount for product {product.name} due to invalid price/discount value."))
-                    discount_value = Decimal('0')
+        results = import_feeds(
+            feeds,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            on_feed_done=report,
+            **self._import_options(options),
+        )
+        rows = sum(stats.rows for _, _, stats in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(results)} feeds, {rows} rows in {time.monotonic() - started:.1f}s'
+        ))
 
-                if discount_value > 0:
-                    discount, _ = Discount.objects.update_or_create(
-                        name=f"{product.name} Discount",
-                        product=product,
-                        defaults={
-                            'discount_type': Discount.FIXED,
-                            'value': discount_value,
-                            'target_type': Discount.TARGET_PRODUCT,
-                            # Parse optional offer dates like "2025/10/20" or "2025-10-20"
-                            'starts_at': _parse_offer_date(item.get('offer_start_date'), is_end=False),
-                            'ends_at': _parse_offer_date(item.get('offer_end_date'), is_end=True),
-                            'status': Discount.DiscountStatus.APPROVED,
-                            'brand': brand,
-                        }
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'Successfully created/updated product "{product.name}" with discount'))
-                else:
-                    self.stdout.write(self.style.SUCCESS(f'Successfully created/updated product "{product.name}"'))
-            else:
-                self.stdout.write(self.style.SUCCESS(f'Successfully created/updated product "{product.name}"'))
+    def _read_manifest(self, manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read manifest: {exc}')
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        feeds = []
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get('file') or not entry.get('brand'):
+                raise CommandError(f'Manifest entries need "file" and "brand": {entry!r}')
+            feeds.append((os.path.join(base_dir, entry['file']), entry['brand']))
+        return feeds
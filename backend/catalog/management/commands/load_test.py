@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent requests to one or more running servers (e.g. the WSGI and ASGI '
+        'profiles) and report throughput and latency percentiles for each'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help='Server to load, e.g. wsgi=http://localhost:8003 (repeatable)',
+        )
+        parser.add_argument('paths', nargs='*', help='Paths to request round-robin (default: the catalog reads)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run against each target')
+        parser.add_argument('--requests', type=int, help='Send this many requests instead of running for --duration')
+        parser.add_argument('--token', help='JWT access token sent as a Bearer header')
+
+    def handle(self, *args, **options):
+        targets = []
+        for value in options['target']:
+            name, sep, url = value.partition('=')
+            if not sep or not url:
+                raise CommandError(f'--target must look like NAME=URL, got {value!r}')
+            targets.append((name, url))
+        paths = options['paths'] or loadtest.DEFAULT_PATHS
+
+        self.stdout.write(f'{"target":<12} {"requests":>9} {"errors":>7} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for name, url in targets:
+            result = loadtest.run_load(
+                name, url, paths,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                total=options['requests'],
+                token=options['token'],
+            )
+            line = (
+                f'{name:<12} {result.requests:>9} {result.errors:>7} {result.rps:>9.1f} '
+                f'{result.percentile(50):>8.1f} {result.percentile(95):>8.1f} {result.percentile(99):>8.1f}'
+            )
+            self.stdout.write(self.style.ERROR(line) if result.errors else line)
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import matching
+
+
+class Command(BaseCommand):
+    help = 'Match the same item across chains into ProductMatch clusters (only products changed since the last run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Drop all matches and rebuild them from scratch')
+        parser.add_argument('--threshold', type=float, help='Minimum name score, 0-100 (default CATALOG_MATCH_THRESHOLD)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = matching.match_products(full=options['full'], threshold=options['threshold'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Keyed {result.products} products in {result.blocks} blocks, {result.links} links, '
+            f'{result.clusters} clusters in total ({elapsed:.1f}s)'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import photos
+
+
+class Command(BaseCommand):
+    help = 'Download remote product photos into the local image store and generate their thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for each photo')
+        parser.add_argument('--limit', type=int, help='Mirror at most this many products')
+        parser.add_argument('--force', action='store_true', help='Download photos that are already mirrored again')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = photos.mirror_product_photos(
+            workers=options['workers'],
+            timeout=options['timeout'],
+            limit=options['limit'],
+            force=options['force'],
+        )
+        for url, error in sorted(result.failed.items()):
+            self.stderr.write(f'{url}: {error}')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Mirrored {result.urls - len(result.failed)}/{result.urls} photos '
+            f'for {result.products} products in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram search index from the Product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Products indexed per transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = search.rebuild_index(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products in {elapsed:.1f}s'))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import pricing
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute cached current prices that are missing or whose validity window has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every product, not only stale ones')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products recomputed per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['all']:
+            ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+            count = pricing.refresh_current_prices(ids, chunk_size=options['chunk_size'])
+        else:
+            count = pricing.refresh_stale_prices(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} product prices in {elapsed:.1f}s'))
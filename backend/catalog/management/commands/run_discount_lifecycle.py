@@ -0,0 +1,51 @@
+import sched
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import lifecycle, pricing
+
+
+class Command(BaseCommand):
+    help = 'Advance discounts through scheduled -> active -> ended and refresh the price caches they affect or that expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60, help='Longest wait between runs, in seconds')
+        parser.add_argument('--once', action='store_true', help='Run a single pass and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.tick()
+            return
+
+        interval = max(1, options['interval'])
+        scheduler = sched.scheduler(time.monotonic, time.sleep)
+
+        def run():
+            now = self.tick()
+            # wake up at the next start/end instead of waiting out the full interval
+            delay = interval
+            boundary = lifecycle.next_boundary(now)
+            if boundary is not None:
+                delay = min(interval, max(1, (boundary - now).total_seconds()))
+            scheduler.enter(delay, 0, run)
+
+        scheduler.enter(0, 0, run)
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
+
+    def tick(self):
+        now = timezone.now()
+        changed = lifecycle.advance_discounts(now)
+        if changed:
+            counts = ', '.join(f'{len(ids)} {phase}' for phase, ids in changed.items())
+            self.stdout.write(self.style.SUCCESS(f'{now:%Y-%m-%d %H:%M:%S}: {counts}'))
+        else:
+            # prices expired by large discount edits (pricing.refresh_on_commit)
+            refreshed = pricing.refresh_stale_prices(now)
+            if refreshed:
+                self.stdout.write(self.style.SUCCESS(f'{now:%Y-%m-%d %H:%M:%S}: {refreshed} prices refreshed'))
+        return now
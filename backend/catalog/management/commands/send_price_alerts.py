@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog import alerts
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued price alert notifications in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Notifications per batch (default PRICE_ALERT_BATCH_SIZE)')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.drain(options['batch_size'])
+                if options['once']:
+                    return
+                time.sleep(max(1, options['interval']))
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
+
+    def drain(self, batch_size):
+        batch_size = batch_size or settings.PRICE_ALERT_BATCH_SIZE
+        while True:
+            try:
+                sent, failed = alerts.deliver_pending(batch_size=batch_size)
+            except OSError as exc:
+                # delivery backend unreachable; the outbox is kept for the next run
+                self.stderr.write(f'Delivery failed: {exc}')
+                return
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} notifications, {failed} failed')
+            # a short batch means the outbox is drained; failures wait for the next run
+            if sent + failed < batch_size:
+                return
@@ -0,0 +1,287 @@
+"""Cross-chain product matching.
+
+Each chain imports its own ``Product`` rows, so the same yoghurt at Rimi,
+Maxima and IKI are unrelated products. ``match_products`` links them:
+
+1. every product gets a ``ProductMatchKey``: its name normalized and stripped
+   of the pack size, and the pack size parsed into a total in grams,
+   millilitres or pieces (``parse_size``)
+2. products are only compared within a block of the same category, pack
+   size and the other numbers in the name (fat %, strength: "pienas 2,5 %"
+   never meets "pienas 3,5 %"), so a run never scores the catalog against itself
+3. within a block, names are scored with RapidFuzz's ``token_sort_ratio``,
+   which, unlike a token set, counts the words only one name has ("jogurtas"
+   is not "jogurtas su braškėmis"), and products of different brands are
+   clustered by complete linkage: every pair in a ``ProductMatch`` scores at
+   least ``CATALOG_MATCH_THRESHOLD``, so no chain of similar names joins two
+   different items
+
+Runs are incremental: only products changed since their key was computed are
+re-keyed, detached and scored against their block. Their previous block is
+re-examined as well, since the products they leave behind may now pair
+differently; existing clusters of unchanged products are kept and extended.
+``full=True`` rebuilds everything. ``compare_offers`` reads a cluster's
+current prices.
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Subquery
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+
+from . import caching
+from .models import Product, ProductMatch, ProductMatchKey
+from .pricing import annotate_effective_prices
+from .search import normalize
+
+# "500 g", "1,5 l", "4x100g", "6 vnt": an optional multipack count, a number and a unit
+SIZE_PATTERN = re.compile(
+    r"(?:(\d+)\s*[x×]\s*)?(\d+(?:[.,]\d+)?)\s*(kg|g|mg|ml|cl|l|vnt|pcs)(?![a-ząčęėįšųūž])",
+    re.IGNORECASE,
+)
+UNITS = {
+    "kg": ("g", Decimal(1000)),
+    "g": ("g", Decimal(1)),
+    "mg": ("g", Decimal("0.001")),
+    "l": ("ml", Decimal(1000)),
+    "cl": ("ml", Decimal(10)),
+    "ml": ("ml", Decimal(1)),
+    "vnt": ("pcs", Decimal(1)),
+    "pcs": ("pcs", Decimal(1)),
+}
+QUANTITY_STEP = Decimal("0.001")
+
+
+def parse_size(name: str) -> Tuple[str, Optional[Decimal], Optional[Tuple[int, int]]]:
+    """Return ``(unit, total quantity, (start, end) of the size in name)``.
+
+    The last size mentioned wins (names end with the pack size); the unit is
+    ``g``, ``ml`` or ``pcs``. Without a size: ``("", None, None)``.
+    """
+    found = None
+    for found in SIZE_PATTERN.finditer(name or ""):
+        pass
+    if found is None:
+        return "", None, None
+    count, amount, unit = found.groups()
+    try:
+        quantity = Decimal(amount.replace(",", "."))
+    except InvalidOperation:
+        return "", None, None
+    base, factor = UNITS[unit.lower()]
+    quantity *= factor * int(count or 1)
+    return base, quantity.quantize(QUANTITY_STEP), found.span()
+
+
+def match_key(product_id: int, name: str, category_id: int, brand_id: Optional[int], now) -> ProductMatchKey:
+    unit, quantity, span = parse_size(name)
+    if span:
+        name = name[:span[0]] + " " + name[span[1]:]
+    return ProductMatchKey(
+        product_id=product_id,
+        name=normalize(name)[:255],
+        category_id=category_id,
+        brand_id=brand_id,
+        unit=unit,
+        quantity=quantity,
+        cluster=None,
+        computed_at=now,
+    )
+
+
+def block_of(category_id: int, unit: str, quantity: Optional[Decimal], name: str) -> tuple:
+    """The block a key is compared in: category, pack size and the numbers left in its name."""
+    return category_id, unit, quantity, tuple(token for token in name.split() if token.isdigit())
+
+
+@dataclass
+class MatchResult:
+    products: int = 0
+    blocks: int = 0
+    links: int = 0
+    clusters: int = 0
+
+
+def stale_keys():
+    """Products whose match key is missing or older than the product."""
+    return Product.objects.filter(Q(match_key__isnull=True) | Q(updated_at__gt=F("match_key__computed_at")))
+
+
+def match_products(full: bool = False, threshold: Optional[float] = None, chunk_size: int = 1000) -> MatchResult:
+    """Re-key changed products and re-cluster the blocks they fall into and leave."""
+    if threshold is None:
+        threshold = getattr(settings, "CATALOG_MATCH_THRESHOLD", 85)
+    now = timezone.now()
+    result = MatchResult()
+    with transaction.atomic():
+        if full:
+            ProductMatch.objects.all().delete()
+            ProductMatchKey.objects.all().delete()
+        changed = list(stale_keys().values_list("id", "name", "category_id", "brand_id"))
+        keys = [match_key(*row, now) for row in changed]
+        changed_ids = [key.product_id for key in keys]
+
+        # where the changed products were before: those blocks and clusters are re-examined
+        blocks = {block_of(key.category_id, key.unit, key.quantity, key.name) for key in keys}
+        left_clusters = set()
+        for start in range(0, len(changed_ids), chunk_size):
+            previous = ProductMatchKey.objects.filter(product_id__in=changed_ids[start:start + chunk_size])
+            for category_id, unit, quantity, name, cluster_id in previous.values_list(
+                "category_id", "unit", "quantity", "name", "cluster_id"
+            ):
+                blocks.add(block_of(category_id, unit, quantity, name))
+                if cluster_id is not None:
+                    left_clusters.add(cluster_id)
+
+        for start in range(0, len(keys), chunk_size):
+            ProductMatchKey.objects.bulk_create(
+                keys[start:start + chunk_size],
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=["name", "category", "brand", "unit", "quantity", "cluster", "computed_at"],
+            )
+        result.products = len(keys)
+
+        categories = sorted({block[0] for block in blocks})
+        members = defaultdict(list)
+        for start in range(0, len(categories), chunk_size):
+            rows = ProductMatchKey.objects.filter(category_id__in=categories[start:start + chunk_size]).values_list(
+                "product_id", "name", "brand_id", "cluster_id", "category_id", "unit", "quantity"
+            )
+            for product_id, name, brand_id, cluster_id, category_id, unit, quantity in rows:
+                block = block_of(category_id, unit, quantity, name)
+                if block in blocks:
+                    members[block].append((product_id, name, brand_id, cluster_id))
+        result.blocks = len(members)
+
+        # products that may gain links: the changed ones and the members of clusters they left
+        open_ids = set(changed_ids)
+        open_ids.update(row[0] for block in members.values() for row in block if row[3] in left_clusters)
+        assignments: Dict[int, Optional[int]] = {}
+        for block in members.values():
+            links, clusters = _cluster_block(block, open_ids, threshold)
+            result.links += links
+            for group in clusters:
+                assignments.update(_assign(group, block))
+        _save(assignments, block_members=members)
+        # clusters left with fewer than two products
+        ProductMatch.objects.annotate(size=Count("members")).filter(size__lt=2).delete()
+        result.clusters = ProductMatch.objects.count()
+    if result.products:
+        caching.bump("productmatch")
+    return result
+
+
+def _cluster_block(block, open_ids, threshold) -> Tuple[int, List[List[int]]]:
+    """Extend the block's clusters with the links of its ``open_ids`` products, by complete linkage.
+
+    Existing clusters start as groups and every other product alone. Links of
+    open products are taken best first; a link merges its two groups only if
+    every pair across them is of different brands and scores at least
+    ``threshold``.
+    """
+    names = [row[1] for row in block]
+    brands = [row[2] for row in block]
+    groups: Dict[int, List[int]] = {}
+    group_of: Dict[int, int] = {}
+    by_cluster = {}
+    for i, (_, _, _, cluster_id) in enumerate(block):
+        root = by_cluster.setdefault(cluster_id, i) if cluster_id is not None else i
+        groups.setdefault(root, []).append(i)
+        group_of[i] = root
+
+    scores: Dict[Tuple[int, int], float] = {}
+    choices = dict(enumerate(names))
+    for i, (product_id, _, _, _) in enumerate(block):
+        if product_id not in open_ids:
+            continue
+        for _, score, j in process.extract(names[i], choices, scorer=fuzz.token_sort_ratio, score_cutoff=threshold, limit=None):
+            if j != i:
+                scores[min(i, j), max(i, j)] = score
+
+    def linked(i: int, j: int) -> bool:
+        # a chain does not list the same item twice
+        if brands[i] is not None and brands[i] == brands[j]:
+            return False
+        pair = (min(i, j), max(i, j))
+        if pair not in scores:
+            scores[pair] = fuzz.token_sort_ratio(names[i], names[j])
+        return scores[pair] >= threshold
+
+    links = 0
+    for pair in sorted(list(scores), key=lambda pair: (-scores[pair], pair)):
+        a, b = group_of[pair[0]], group_of[pair[1]]
+        if a == b or not all(linked(i, j) for i in groups[a] for j in groups[b]):
+            continue
+        for i in groups[b]:
+            group_of[i] = a
+        groups[a].extend(groups.pop(b))
+        links += 1
+    return links, [[block[i][0] for i in group] for group in groups.values()]
+
+
+def _assign(group: List[int], block) -> Dict[int, Optional[int]]:
+    """Cluster id (existing, negative for a new one, or None) for every product of ``group``."""
+    rows = {row[0]: row for row in block}
+    brands = {rows[pk][2] for pk in group}
+    if len(group) < 2 or len(brands) < 2:
+        return {pk: None for pk in group}
+    existing = [rows[pk][3] for pk in group if rows[pk][3] is not None]
+    cluster_id = min(existing) if existing else -min(group)
+    return {pk: cluster_id for pk in group}
+
+
+def _create_matches(count: int) -> List[int]:
+    """Ids of ``count`` new ``ProductMatch`` rows."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return [match.pk for match in ProductMatch.objects.bulk_create([ProductMatch() for _ in range(count)])]
+    # MySQL returns no ids from a bulk insert, and "the newest rows" may be another run's
+    return [ProductMatch.objects.create().pk for _ in range(count)]
+
+
+def _save(assignments: Dict[int, Optional[int]], block_members) -> None:
+    current = {row[0]: row[3] for block in block_members.values() for row in block}
+    # groups without a cluster yet are keyed by -(smallest product id)
+    new = sorted({cluster for cluster in assignments.values() if cluster is not None and cluster < 0})
+    ids = dict(zip(new, _create_matches(len(new))))
+
+    moves = defaultdict(list)
+    for product_id, cluster in assignments.items():
+        cluster = ids.get(cluster, cluster)
+        if current.get(product_id) != cluster:
+            moves[cluster].append(product_id)
+    for cluster, product_ids in moves.items():
+        ProductMatchKey.objects.filter(product_id__in=product_ids).update(cluster_id=cluster)
+
+
+def compare_offers(product_id: int) -> List[dict]:
+    """The product and every product matched with it, cheapest first, in one query.
+
+    Rows carry the effective price and, when the pack size is known, the price
+    per kilogram, litre or piece. Empty when the product does not exist.
+    """
+    cluster = ProductMatchKey.objects.filter(product_id=product_id, cluster__isnull=False).values("cluster_id")
+    rows = (
+        annotate_effective_prices(Product.objects.filter(Q(pk=product_id) | Q(match_key__cluster_id=Subquery(cluster))))
+        .order_by(F("effective_price").asc(nulls_last=True), "pk")
+        .values(
+            "id", "name", "brand", "brand__name", "store", "price", "effective_price", "saving",
+            "match_key__cluster_id", "match_key__unit", "match_key__quantity",
+        )
+    )
+    offers = []
+    for row in rows:
+        unit, quantity, price = row.pop("match_key__unit"), row.pop("match_key__quantity"), row["effective_price"]
+        per = {"g": 1000, "ml": 1000, "pcs": 1}.get(unit)
+        row["unit_price"] = (price * per / quantity).quantize(Decimal("0.01")) if per and quantity and price is not None else None
+        row["unit"] = {"g": "kg", "ml": "l", "pcs": "pcs"}.get(unit)
+        row["brand_name"] = row.pop("brand__name")
+        row["match"] = row.pop("match_key__cluster_id")
+        offers.append(row)
+    return offers
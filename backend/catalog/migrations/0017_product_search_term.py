@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:58
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# catalog.search as of this migration; later changes to it must not alter history
+def normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    cleaned = "".join(ch if ch.isalnum() else " " for ch in stripped.lower())
+    return " ".join(cleaned.split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"_{word}_"
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def build_index(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    ProductSearchTerm = apps.get_model("catalog", "ProductSearchTerm")
+    terms = []
+    for pk, name in Product.objects.values_list("id", "name").iterator():
+        terms.extend(ProductSearchTerm(product_id=pk, gram=g) for g in trigrams(name))
+        if len(terms) >= 5000:
+            ProductSearchTerm.objects.bulk_create(terms)
+            terms = []
+    ProductSearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_discount_add_store_and_target'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='catalog.product')),
+            ],
+            options={
+                'unique_together': {('gram', 'product')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
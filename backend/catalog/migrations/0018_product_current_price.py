@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_product_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCurrentPrice',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_price', serialize=False, to='catalog.product')),
+                ('effective_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, help_text='Next moment the price may change (winning discount ends or another one starts).', null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('discount', models.ForeignKey(blank=True, help_text='Winning discount, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.discount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['effective_price'], name='catalog_pro_effecti_0e3fb1_idx'), models.Index(fields=['valid_until'], name='catalog_pro_valid_u_683b99_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_product_current_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', help_text='Hash of the imported feed fields; lets delta imports skip unchanged rows.', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stale_since',
+            field=models.DateTimeField(blank=True, help_text="Set when the product disappeared from its brand's feed.", null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:08
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_product_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productdiscounthistory',
+            name='applied_price',
+            field=models.DecimalField(decimal_places=2, help_text='Snapshot of the discounted product price while the discount applied.', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))]),
+        ),
+        migrations.AddIndex(
+            model_name='productdiscounthistory',
+            index=models.Index(fields=['product', 'removed_at', 'applied_at'], name='history_product_window_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_phases(apps, schema_editor):
+    Discount = apps.get_model("catalog", "Discount")
+    now = timezone.now()
+    Discount.objects.filter(starts_at__lte=now, ends_at__gt=now).update(phase="active")
+    Discount.objects.filter(ends_at__lte=now).update(phase="ended")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0020_discount_history_window_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discount',
+            name='phase',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('ended', 'Ended')], default='scheduled', help_text='Position in the time window; set on save and advanced by the lifecycle worker.', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['status', 'starts_at', 'ends_at'], name='discount_lifecycle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['status', 'phase'], name='discount_phase_idx'),
+        ),
+        migrations.RunPython(set_phases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:31
+
+import base64
+import binascii
+import hashlib
+import io
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image, UnidentifiedImageError
+
+
+# catalog.images as of this migration; later changes to it must not alter history
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+THUMBNAIL_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def decode_base64(value):
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    try:
+        return base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImage("Image is not valid base64.")
+
+
+def blob_path(sha256, folder="blobs"):
+    return f"{folder}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def write(name, data):
+    if default_storage.exists(name):
+        return name
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        default_storage.delete(saved)
+    return name
+
+
+def thumbnail(image):
+    size = getattr(settings, "IMAGE_THUMBNAIL_SIZE", 320)
+    scaled = image.convert("RGBA")
+    scaled.thumbnail((size, size))
+    canvas = Image.new("RGB", (size, size), "white")
+    canvas.paste(scaled, ((size - scaled.width) // 2, (size - scaled.height) // 2), scaled)
+    return canvas
+
+
+def read_image(data):
+    """Open and validate ``data``; returns its format, size and thumbnail."""
+    max_bytes = getattr(settings, "IMAGE_MAX_BYTES", 5 * 1024 * 1024)
+    if len(data) > max_bytes:
+        raise InvalidImage(f"Image is larger than {max_bytes // 1024} KiB.")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            kind = image.format
+            width, height = image.size
+            thumb = thumbnail(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("File is not a supported image.")
+    if kind not in CONTENT_TYPES:
+        raise InvalidImage("Only JPEG, PNG, GIF and WebP images are accepted.")
+    return kind, width, height, thumb
+
+
+def write_image(data):
+    """Validate ``data`` and write it and its thumbnail; returns the ``ImageBlob`` fields."""
+    kind, width, height, thumb = read_image(data)
+    thumb_format = getattr(settings, "IMAGE_THUMBNAIL_FORMAT", "JPEG").upper()
+    buffer = io.BytesIO()
+    thumb.save(buffer, thumb_format, quality=80)
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    thumb_name = f"{blob_path(sha256, 'thumbs')}.{THUMBNAIL_EXTENSIONS[thumb_format]}"
+    return {
+        "sha256": sha256,
+        "file": write(blob_path(sha256), data),
+        "thumbnail": write(thumb_name, buffer.getvalue()),
+        "content_type": CONTENT_TYPES[kind],
+        "size": len(data),
+        "width": width,
+        "height": height,
+    }
+
+
+def stored_images(Report):
+    rows = Report.objects.exclude(discount_image_base64="").values_list("pk", "discount_image_base64")
+    return rows.iterator(chunk_size=200)
+
+
+def check_images(apps, schema_editor):
+    """Refuse to migrate while a stored image cannot be decoded: the column holding it is dropped."""
+    invalid = []
+    for pk, value in stored_images(apps.get_model("catalog", "Report")):
+        try:
+            read_image(decode_base64(value))
+        except InvalidImage:
+            invalid.append(pk)
+    if invalid:
+        raise InvalidImage(
+            f"Reports {', '.join(map(str, invalid))} have a discount image that cannot be decoded. "
+            "Fix or clear their discount_image_base64 before migrating."
+        )
+
+
+def move_images(apps, schema_editor):
+    """Decode every stored base64 image into the blob store (``check_images`` has validated them)."""
+    ImageBlob = apps.get_model("catalog", "ImageBlob")
+    Report = apps.get_model("catalog", "Report")
+    for pk, value in stored_images(Report):
+        stored = write_image(decode_base64(value))
+        ImageBlob.objects.get_or_create(sha256=stored["sha256"], defaults=stored)
+        Report.objects.filter(pk=pk).update(image_id=stored["sha256"])
+
+
+def restore_images(apps, schema_editor):
+    Report = apps.get_model("catalog", "Report")
+    for report in Report.objects.filter(image__isnull=False).select_related("image").iterator(chunk_size=200):
+        with default_storage.open(report.image.file.name, "rb") as fh:
+            encoded = base64.b64encode(fh.read()).decode()
+        Report.objects.filter(pk=report.pk).update(discount_image_base64=encoded)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0023_moderation_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_images, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(max_length=200, upload_to='')),
+                ('thumbnail', models.FileField(max_length=200, upload_to='')),
+                ('content_type', models.CharField(max_length=32)),
+                ('size', models.PositiveIntegerField()),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='catalog.imageblob'),
+        ),
+        migrations.RunPython(move_images, restore_images),
+        migrations.RemoveField(
+            model_name='report',
+            name='discount_image_base64',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0024_report_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='photo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='catalog.imageblob'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='photo_source',
+            field=models.URLField(blank=True, help_text='The photo_url that photo was mirrored from; a changed photo_url is mirrored again.'),
+        ),
+    ]
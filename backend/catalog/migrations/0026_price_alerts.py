@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:58
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0025_product_photo_mirror'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('target_price', 'Target price'), ('any_discount', 'Any discount')], default='target_price', max_length=20)),
+                ('threshold', models.DecimalField(blank=True, decimal_places=2, help_text='Target price (target_price alerts only).', max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('is_active', models.BooleanField(default=True)),
+                ('notified_price', models.DecimalField(blank=True, decimal_places=2, help_text='Price of the last notification; cleared when the alert stops matching.', max_digits=10, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='catalog.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.discount')),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='catalog.pricealert')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['product', 'threshold'], name='price_alert_match_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricealert',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'kind'), name='unique_price_alert_per_kind'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricealert',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('kind', 'any_discount'), ('threshold__isnull', True)), models.Q(('kind', 'target_price'), ('threshold__isnull', False)), _connector='OR'), name='price_alert_threshold_matches_kind'),
+        ),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(fields=['sent_at', 'created_at'], name='alert_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0026_price_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductMatchKey',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='match_key', serialize=False, to='catalog.product')),
+                ('name', models.CharField(help_text='Normalized name without the pack size.', max_length=255)),
+                ('unit', models.CharField(blank=True, choices=[('g', 'Grams'), ('ml', 'Millilitres'), ('pcs', 'Pieces')], max_length=3)),
+                ('quantity', models.DecimalField(blank=True, decimal_places=3, help_text='Total pack size in ``unit``.', max_digits=12, null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('brand', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.category')),
+                ('cluster', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='catalog.productmatch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'unit', 'quantity'], name='match_block_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+CENT = Decimal("0.01")
+
+
+def apply_discount(price, discount_type, value):
+    # catalog.pricing.apply_discount as of this migration
+    if discount_type == "percentage":
+        discounted = price * (Decimal("1") - (Decimal(value) / Decimal("100")))
+    else:
+        discounted = price - Decimal(value)
+    return max(discounted, Decimal("0")).quantize(CENT)
+
+
+def recompute_open_rows(apps, schema_editor):
+    """Open history rows snapshotted the list price before 0020; store the discounted price."""
+    ProductDiscountHistory = apps.get_model("catalog", "ProductDiscountHistory")
+    rows = (
+        ProductDiscountHistory.objects.filter(removed_at__isnull=True, product__price__isnull=False)
+        .select_related("product", "discount")
+        .iterator(chunk_size=1000)
+    )
+    batch = []
+    for row in rows:
+        price = apply_discount(row.product.price, row.discount.discount_type, row.discount.value)
+        if price != row.applied_price:
+            row.applied_price = price
+            batch.append(row)
+        if len(batch) >= 1000:
+            ProductDiscountHistory.objects.bulk_update(batch, ["applied_price"])
+            batch = []
+    if batch:
+        ProductDiscountHistory.objects.bulk_update(batch, ["applied_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0027_product_matching'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_open_rows, migrations.RunPython.noop),
+    ]
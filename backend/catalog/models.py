@@ -16,10 +16,39 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+def _count(queryset) -> models.Subquery:
+    """Correlated ``SELECT COUNT(*)`` over ``queryset`` as an integer subquery."""
+    counted = queryset.order_by().annotate(total=models.Func(models.F("pk"), function="COUNT")).values("total")
+    return models.Subquery(counted, output_field=models.IntegerField())
+
+
+class BrandQuerySet(models.QuerySet):
+    STATS = ("stores_total", "products_total", "active_discounts_total")
+
+    def with_stats(self):
+        """Annotate store, product and active-discount counts, one subquery each.
+
+        A discount counts for a brand whatever its scope: set on the brand itself
+        (brand- and brand-scoped category discounts), on one of its stores (store-
+        and store-scoped category discounts) or on one of its products.
+        """
+        brand = models.OuterRef("pk")
+        active = Discount.objects.filter(status=Discount.DiscountStatus.APPROVED, phase=Discount.Phase.ACTIVE).filter(
+            models.Q(brand=brand) | models.Q(store__brand=brand) | models.Q(product__brand=brand)
+        )
+        return self.annotate(
+            stores_total=_count(Store.objects.filter(brand=brand)),
+            products_total=_count(Product.objects.filter(brand=brand)),
+            active_discounts_total=_count(active),
+        )
+
+
 class Brand(TimeStampedModel):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
 
+    objects = BrandQuerySet.as_manager()
+
     class Meta:
         ordering = ["name"]
 
@@ -88,6 +117,11 @@ class Discount(TimeStampedModel):
         APPROVED = "approved", "Approved"
         DENIED = "denied", "Denied"
 
+    class Phase(models.TextChoices):
+        SCHEDULED = "scheduled", "Scheduled"
+        ACTIVE = "active", "Active"
+        ENDED = "ended", "Ended"
+
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES)
@@ -132,6 +166,12 @@ class Discount(TimeStampedModel):
         null=True,
         related_name="submitted_discounts",
     )
+    phase = models.CharField(
+        max_length=20,
+        choices=Phase.choices,
+        default=Phase.SCHEDULED,
+        help_text="Position in the time window; set on save and advanced by the lifecycle worker.",
+    )
 
     class Meta:
         constraints = [
@@ -141,26 +181,49 @@ class Discount(TimeStampedModel):
                 name="discount_percentage_max_100",
             )
         ]
+        indexes = [
+            models.Index(fields=["status", "starts_at", "ends_at"], name="discount_lifecycle_idx"),
+            models.Index(fields=["status", "phase"], name="discount_phase_idx"),
+            models.Index(fields=["status", "created_at"], name="discount_moderation_idx"),
+        ]
         ordering = ["-created_at"]
 
     def __str__(self) -> str:
         return self.name
 
+    def phase_at(self, when) -> str:
+        if self.ends_at <= when:
+            return self.Phase.ENDED
+        if self.starts_at > when:
+            return self.Phase.SCHEDULED
+        return self.Phase.ACTIVE
+
+    def save(self, *args, **kwargs):
+        self.phase = self.phase_at(timezone.now())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "phase"}
+        super().save(*args, **kwargs)
+
     @property
     def effective_status(self) -> str:
-        """Returns the calculated status based on current time."""
-        if self.status == self.DiscountStatus.IN_REVIEW:
+        """Returns the status shown to users, from the persisted ``phase``."""
+        return self.status_for(self.status, self.phase)
+
+    @classmethod
+    def status_for(cls, status: str, phase: str) -> str:
+        """``effective_status`` of a discount with this ``status`` and ``phase`` (for ``values()`` rows)."""
+        if status == cls.DiscountStatus.IN_REVIEW:
             return "IN_REVIEW"
-        if self.status == self.DiscountStatus.DENIED:
+        if status == cls.DiscountStatus.DENIED:
             return "DENIED"
-        if self.status == self.DiscountStatus.APPROVED:
-            now = timezone.now()
-            if self.ends_at < now:
+        if status == cls.DiscountStatus.APPROVED:
+            if phase == cls.Phase.ENDED:
                 return "ENDED"
-            if self.starts_at > now:
+            if phase == cls.Phase.SCHEDULED:
                 return "APPROVED"
             return "IN_ACTION"
-        return self.status.upper()
+        return status.upper()
 
     def clean(self) -> None:
         target_map = {
@@ -219,9 +282,27 @@ class Product(TimeStampedModel):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     photo_url = models.URLField(blank=True)
+    # local copy of photo_url made by the mirror_product_photos command
+    photo = models.ForeignKey(
+        "ImageBlob", null=True, blank=True, on_delete=models.SET_NULL, related_name="products"
+    )
+    photo_source = models.URLField(
+        blank=True, help_text="The photo_url that photo was mirrored from; a changed photo_url is mirrored again."
+    )
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0'))], null=True, blank=True)
     price_unit = models.CharField(max_length=20, choices=PRICE_UNIT_CHOICES, default=PER_PIECE, null=True, blank=True)
     weight = models.DecimalField(max_digits=8, decimal_places=3, validators=[MinValueValidator(Decimal('0'))], null=True, blank=True)
+    content_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        default="",
+        help_text="Hash of the imported feed fields; lets delta imports skip unchanged rows.",
+    )
+    stale_since = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Set when the product disappeared from its brand's feed.",
+    )
     discounts = models.ManyToManyField(
         "Discount",
         through="ProductDiscountHistory",
@@ -232,6 +313,11 @@ class Product(TimeStampedModel):
     class Meta:
         ordering = ["name"]
         unique_together = ("brand", "external_id")
+        indexes = [
+            # keyset pagination (catalog.pagination.KeysetPagination)
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -243,6 +329,107 @@ class Product(TimeStampedModel):
             raise ValidationError("Product brand must match the brand of the store it belongs to.")
 
 
+class ProductCurrentPrice(models.Model):
+    """Denormalized best current price of a product, maintained by ``catalog.pricing``."""
+
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="current_price",
+    )
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount = models.ForeignKey(
+        Discount,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="Winning discount, if any.",
+    )
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Next moment the price may change (winning discount ends or another one starts).",
+    )
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["effective_price"]),
+            models.Index(fields=["valid_until"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id}: {self.effective_price}"
+
+    @property
+    def is_current(self) -> bool:
+        return self.valid_until is None or self.valid_until > timezone.now()
+
+
+class ProductMatch(models.Model):
+    """A cluster of products from different chains judged to be the same item.
+
+    Built by ``catalog.matching``; members are linked through ``ProductMatchKey``.
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Match#{self.pk}"
+
+
+class ProductMatchKey(models.Model):
+    """Normalized matching attributes of a product, maintained by ``catalog.matching``.
+
+    Products are only compared within a block of the same category and pack
+    size (``match_block_idx``). A key older than its product's ``updated_at``
+    is recomputed by the next incremental run.
+    """
+
+    class Unit(models.TextChoices):
+        GRAM = "g", "Grams"
+        MILLILITRE = "ml", "Millilitres"
+        PIECE = "pcs", "Pieces"
+
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="match_key")
+    name = models.CharField(max_length=255, help_text="Normalized name without the pack size.")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    brand = models.ForeignKey(Brand, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+    unit = models.CharField(max_length=3, choices=Unit.choices, blank=True)
+    quantity = models.DecimalField(
+        max_digits=12, decimal_places=3, null=True, blank=True, help_text="Total pack size in ``unit``."
+    )
+    cluster = models.ForeignKey(
+        ProductMatch, null=True, blank=True, on_delete=models.SET_NULL, related_name="members"
+    )
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "unit", "quantity"], name="match_block_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.quantity} {self.unit})" if self.unit else self.name
+
+
+class ProductSearchTerm(models.Model):
+    """One trigram of a product's normalized name (inverted index used by product search)."""
+
+    gram = models.CharField(max_length=3)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_terms")
+
+    class Meta:
+        unique_together = ("gram", "product")
+
+    def __str__(self) -> str:
+        return f"{self.gram} -> {self.product_id}"
+
+
 class ProductDiscountHistory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="discount_history")
     discount = models.ForeignKey(Discount, on_delete=models.CASCADE, related_name="product_history")
@@ -252,12 +439,15 @@ class ProductDiscountHistory(models.Model):
         max_digits=10,
         decimal_places=2,
     validators=[MinValueValidator(Decimal('0'))],
-        help_text="Snapshot of the product price when the discount was applied.",
+        help_text="Snapshot of the discounted product price while the discount applied.",
     )
 
     class Meta:
         ordering = ["-applied_at"]
         verbose_name_plural = "product discount history"
+        indexes = [
+            models.Index(fields=["product", "removed_at", "applied_at"], name="history_product_window_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.discount} on {self.product} (@ {self.applied_at:%Y-%m-%d})"
@@ -279,6 +469,81 @@ class WishlistItem(TimeStampedModel):
         return f"{self.user_id} -> {self.product_id}"
 
 
+class PriceAlert(TimeStampedModel):
+    """A user's request to hear when a wishlisted product gets cheaper.
+
+    A ``target_price`` alert fires once the product's effective price drops to
+    ``threshold``; an ``any_discount`` alert fires when any discount applies.
+    ``notified_price`` keeps an alert from firing again until the price drops
+    further; it is cleared when the alert stops matching. Alerts are matched
+    by ``catalog.alerts`` whenever product prices are recomputed.
+    """
+
+    class Kind(models.TextChoices):
+        TARGET_PRICE = "target_price", "Target price"
+        ANY_DISCOUNT = "any_discount", "Any discount"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="price_alerts")
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="price_alerts")
+    kind = models.CharField(max_length=20, choices=Kind.choices, default=Kind.TARGET_PRICE)
+    threshold = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0'))],
+        help_text="Target price (target_price alerts only).",
+    )
+    is_active = models.BooleanField(default=True)
+    notified_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Price of the last notification; cleared when the alert stops matching.",
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product", "kind"], name="unique_price_alert_per_kind"),
+            models.CheckConstraint(
+                check=models.Q(kind="any_discount", threshold__isnull=True)
+                | models.Q(kind="target_price", threshold__isnull=False),
+                name="price_alert_threshold_matches_kind",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product", "threshold"], name="price_alert_match_idx"),
+        ]
+
+    def __str__(self) -> str:
+        if self.kind == self.Kind.ANY_DISCOUNT:
+            return f"{self.user_id} -> {self.product_id} (any discount)"
+        return f"{self.user_id} -> {self.product_id} (<= {self.threshold})"
+
+
+class AlertNotification(models.Model):
+    """Outbox row for a fired ``PriceAlert``, delivered in batches by ``send_price_alerts``."""
+
+    alert = models.ForeignKey(PriceAlert, on_delete=models.CASCADE, related_name="notifications")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount = models.ForeignKey(Discount, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["sent_at", "created_at"], name="alert_outbox_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Alert#{self.alert_id} @ {self.price}"
+
+
 class ShoppingCart(TimeStampedModel):
     """A user's shopping cart.
     - Optional name
@@ -331,11 +596,27 @@ class ShoppingCartItem(models.Model):
         return f"Cart#{self.shopping_cart_id} -> Product#{self.product_id} x{self.quantity}"
 
 
+class ImageBlob(models.Model):
+    """An uploaded image stored on disk under the SHA-256 of its bytes (see ``catalog.images``)."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=200)
+    thumbnail = models.FileField(max_length=200)
+    content_type = models.CharField(max_length=32)
+    size = models.PositiveIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.sha256[:12]} ({self.content_type}, {self.width}x{self.height})"
+
+
 class Report(TimeStampedModel):
     """A user report targeting either a product or a discount.
     Requirements:
     - If reporting a product: a single reason must be selected (name/photo/price)
-    - If reporting a discount: an image (base64) must be provided
+    - If reporting a discount: an image must be provided
     - Both must include a textual description
     - Moderators/Admins can change status from REPORTED to ACCEPTED or DENIED
     """
@@ -365,8 +646,10 @@ class Report(TimeStampedModel):
     # For product reports, a single reason is selected
     product_reason = models.CharField(max_length=16, choices=PRODUCT_REASON_CHOICES, null=True, blank=True)
 
-    # For discount reports, an image in base64 is required
-    discount_image_base64 = models.TextField(blank=True)
+    # For discount reports, an image is required; shared by identical uploads
+    image = models.ForeignKey(
+        ImageBlob, null=True, blank=True, on_delete=models.PROTECT, related_name="reports"
+    )
 
     # Free-form description required for both
     description = models.TextField()
@@ -384,6 +667,9 @@ class Report(TimeStampedModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="report_moderation_idx"),
+        ]
         constraints = [
             # XOR: exactly one of product or discount must be set
             models.CheckConstraint(
@@ -400,8 +686,8 @@ class Report(TimeStampedModel):
             raise ValidationError("Exactly one of product or discount must be provided.")
         if self.product and not self.product_reason:
             raise ValidationError("Product reports must include a product_reason.")
-        if self.discount and not self.discount_image_base64:
-            raise ValidationError("Discount reports must include a base64 image.")
+        if self.discount and not self.image_id:
+            raise ValidationError("Discount reports must include an image.")
         if not self.description:
             raise ValidationError("Description is required.")
 
@@ -1,11 +1,47 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 30
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+    async def apaginate_queryset(self, queryset, request):
+        """``paginate_queryset`` on the async ORM: the count and the page slice are awaited.
+
+        Mirrors ``paginate_queryset`` and ``Paginator.page`` step by step; the
+        count is set before ``get_page_number`` so ``page=last`` resolves.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        rows = [row async for row in queryset[bottom:top]]
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return rows
+
     def get_paginated_response(self, data):
         return Response({
             'links': {
@@ -17,3 +53,180 @@ class StandardResultsSetPagination(PageNumberPagination):
             'current_page': self.page.number,
             'results': data
         })
+
+
+class KeysetPagination(BasePagination):
+    """Seek pagination on ``(<field>, id)``: each page continues after the last row
+    of the previous one (``WHERE (field, id) > (last field, last id)``), so page N
+    costs the same as page 1 and no ``COUNT(*)`` is run.
+
+    Only the ``orderings`` listed are supported (each backed by a composite index);
+    NULLs sort last in both directions. A nullable field is paged as two
+    segments, the non-NULL rows by ``(field, id)`` and then the NULL rows by
+    ``id``, so no seek predicate mixes in an ``IS NULL`` that would keep the
+    index from serving it. The opaque ``cursor`` carries the ordering and the
+    last row's key.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    orderings = ('name', 'price')
+
+    def supports(self, ordering):
+        return ordering.lstrip('-') in self.orderings
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None, ordering='name'):
+        self.request = request
+        self.ordering = ordering
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        model_field = queryset.model._meta.get_field(field)
+        id_order = '-id' if descending else 'id'
+
+        cursor = self.decode_cursor(request)
+        value = None
+        if cursor is not None and cursor['v'] is not None:
+            try:
+                value = model_field.to_python(cursor['v'])
+            except ValidationError:
+                raise NotFound('Invalid cursor')
+
+        self.page_size_value = self.get_page_size(request)
+        wanted = self.page_size_value + 1
+        rows = []
+        if cursor is None or value is not None:
+            keyed = queryset.order_by(ordering, id_order)
+            if model_field.null:
+                keyed = keyed.filter(**{f'{field}__isnull': False})
+            if cursor is not None:
+                keyed = keyed.filter(self.after(field, descending, value, cursor['id']))
+            rows = list(keyed[:wanted])
+        if model_field.null and len(rows) < wanted:
+            unkeyed = queryset.filter(**{f'{field}__isnull': True}).order_by(id_order)
+            if cursor is not None and value is None:
+                unkeyed = unkeyed.filter(**{'id__lt' if descending else 'id__gt': cursor['id']})
+            rows += unkeyed[:wanted - len(rows)]
+
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        self.last = rows[-1] if rows else None
+        self.field = field
+        return rows
+
+    @staticmethod
+    def after(field, descending, value, pk):
+        """Rows strictly after ``(value, pk)`` in the page order."""
+        beyond = 'lt' if descending else 'gt'
+        return Q(**{f'{field}__{beyond}': value}) | Q(**{field: value, f'id__{beyond}': pk})
+
+    def encode_cursor(self, row):
+        # rows are model instances or values() dicts
+        if isinstance(row, dict):
+            value, pk = row[self.field], row['id']
+        else:
+            value, pk = getattr(row, self.field), row.pk
+        payload = {'o': self.ordering, 'v': None if value is None else str(value), 'id': pk}
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode()))
+            valid = (
+                cursor['o'] == self.ordering
+                and isinstance(cursor['id'], int)
+                and (cursor['v'] is None or isinstance(cursor['v'], str))
+            )
+        except (ValueError, TypeError, KeyError):
+            valid = False
+        if not valid:
+            raise NotFound('Invalid cursor')
+        return cursor
+
+    def get_next_cursor(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last)
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('links', {'next': self.get_next_link(), 'previous': None}),
+            ('next_cursor', self.get_next_cursor()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'links': {'type': 'object'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class ProductPagination(StandardResultsSetPagination):
+    """Page numbers by default; keyset pages when the request passes ``cursor`` or
+    ``pagination=keyset`` and orders by a keyset-capable field (``name`` unless
+    ``ordering`` says otherwise). Other orderings keep page numbers."""
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        wants_keyset = 'cursor' in request.query_params or request.query_params.get('pagination') == 'keyset'
+        ordering = request.query_params.get('ordering') or 'name'
+        if wants_keyset and isinstance(queryset, QuerySet) and ',' not in ordering:
+            keyset = self.keyset_class()
+            if keyset.supports(ordering):
+                self.keyset = keyset
+                return keyset.paginate_queryset(queryset, request, view, ordering=ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request):
+        self.keyset = None
+        return await super().apaginate_queryset(queryset, request)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ModerationQueuePagination(BasePagination):
+    """Moderation lists stay plain arrays unless the request opts in: ``cursor`` or
+    ``pagination=keyset`` pages newest first on ``(created_at, id)`` (served by the
+    ``(status, created_at)`` indexes); ``page``/``page_size`` uses page numbers."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.delegate = None
+        if 'cursor' in params or params.get('pagination') == 'keyset':
+            self.delegate = KeysetPagination()
+            return self.delegate.paginate_queryset(queryset, request, view, ordering='-created_at')
+        if 'page' in params or 'page_size' in params:
+            self.delegate = StandardResultsSetPagination()
+            return self.delegate.paginate_queryset(queryset, request, view)
+        return None
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
@@ -0,0 +1,110 @@
+"""Mirror remote product photos into the local image store.
+
+``Product.photo_url`` points at retailer CDNs. ``mirror_product_photos``
+downloads every photo not mirrored yet with a bounded pool of worker threads,
+stores it (and its thumbnail) through ``catalog.images`` and links the product
+to the blob, recording the URL it came from. Serializers then return the local
+URLs (``images.product_photo_url``); a product whose ``photo_url`` changes
+falls back to the remote photo until it is mirrored again. Products sharing a
+URL are fetched once.
+"""
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from django.db.models import F
+
+from . import caching, images
+from .models import ImageBlob, Product
+
+USER_AGENT = "nuolaidauk-photo-mirror/1.0"
+_local = threading.local()
+
+
+@dataclass
+class MirrorResult:
+    urls: int = 0
+    products: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def _session() -> requests.Session:
+    # requests sessions are not thread-safe; keep one (and its connection pool) per worker
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers["User-Agent"] = USER_AGENT
+    return _local.session
+
+
+def download(url: str, timeout: float) -> bytes:
+    max_bytes = getattr(settings, "IMAGE_MAX_BYTES", 5 * 1024 * 1024)
+    with _session().get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data += chunk
+            if len(data) > max_bytes:
+                raise images.InvalidImage(f"Image is larger than {max_bytes // 1024} KiB.")
+    return bytes(data)
+
+
+def _fetch(url: str, timeout: float) -> images.StoredImage:
+    return images.write_image(download(url, timeout))
+
+
+def pending_photos(force: bool = False):
+    """Products with a photo URL that has no local copy (every one with ``force``)."""
+    products = Product.objects.exclude(photo_url="")
+    if not force:
+        products = products.exclude(photo__isnull=False, photo_source=F("photo_url"))
+    return products
+
+
+def _save(stored: Dict[str, images.StoredImage], by_url: Dict[str, list]) -> int:
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(**vars(item)) for item in stored.values()], ignore_conflicts=True
+    )
+    rows = [
+        Product(pk=pk, photo_id=item.sha256, photo_source=url)
+        for url, item in stored.items()
+        for pk in by_url[url]
+    ]
+    Product.objects.bulk_update(rows, ["photo", "photo_source"], batch_size=500)
+    return len(rows)
+
+
+def mirror_product_photos(
+    workers: int = 8,
+    timeout: float = 10.0,
+    limit: Optional[int] = None,
+    force: bool = False,
+    batch_size: int = 200,
+) -> MirrorResult:
+    by_url = defaultdict(list)
+    rows = pending_photos(force).order_by("pk").values_list("pk", "photo_url")
+    for pk, url in rows[:limit] if limit else rows:
+        by_url[url].append(pk)
+
+    result = MirrorResult(urls=len(by_url))
+    batch = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch, url, timeout): url for url in by_url}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                batch[url] = future.result()
+            except (requests.RequestException, images.InvalidImage) as exc:
+                result.failed[url] = str(exc)
+                continue
+            if len(batch) >= batch_size:
+                result.products += _save(batch, by_url)
+                batch = {}
+    if batch:
+        result.products += _save(batch, by_url)
+    if result.products:
+        caching.bump("product")
+    return result
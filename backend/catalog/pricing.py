@@ -0,0 +1,424 @@
+"""Discount resolution shared by the cart, wishlist and price caches.
+
+A discount applies to a product through its ``target_type``:
+
+- product: ``discount.product`` is the product
+- category: the product is in ``discount.category``; when the discount is scoped
+  to a store (or brand) the product must belong to it
+- brand: the product belongs to ``discount.brand``
+- store: the product belongs to ``discount.store``; catalog products imported
+  without a store are matched through the store's brand
+"""
+import operator
+from collections import defaultdict
+from functools import reduce
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Discount, Product, ProductCurrentPrice, ProductDiscountHistory
+from . import alerts, caching
+
+CENT = Decimal("0.01")
+
+
+def apply_discount(price: Decimal, discount_type: str, value) -> Decimal:
+    """Return ``price`` after a discount, never below zero, rounded to cents."""
+    if discount_type == Discount.PERCENTAGE:
+        discounted = price * (Decimal("1") - (Decimal(value) / Decimal("100")))
+    else:
+        discounted = price - Decimal(value)
+    return max(discounted, Decimal("0")).quantize(CENT)
+
+
+def active_discounts(now=None):
+    """Approved discounts whose time window contains ``now``."""
+    now = now or timezone.now()
+    return Discount.objects.filter(
+        status=Discount.DiscountStatus.APPROVED,
+        starts_at__lte=now,
+        ends_at__gte=now,
+    )
+
+
+def annotate_effective_prices(queryset):
+    """Annotate a Product queryset with ``effective_price``, ``saving`` and ``saving_percent``.
+
+    The values come from the materialized ProductCurrentPrice row (joined on the
+    product's primary key), so filtering and ordering by them happen in SQL.
+    """
+    money = DecimalField(max_digits=10, decimal_places=2)
+    effective = Coalesce(F("current_price__effective_price"), F("price"), output_field=money)
+    saving = ExpressionWrapper(F("price") - effective, output_field=money)
+    return queryset.annotate(
+        effective_price=effective,
+        saving=saving,
+        saving_percent=ExpressionWrapper(
+            Value(Decimal("100")) * (F("price") - effective) / NullIf(F("price"), Value(Decimal("0"))),
+            output_field=DecimalField(max_digits=7, decimal_places=2),
+        ),
+    )
+
+
+def discount_applies(discount: Discount, product: Product) -> bool:
+    """Whether ``discount`` targets ``product`` (ignores status and time window)."""
+    target = discount.target_type
+    if target == Discount.TARGET_PRODUCT:
+        return discount.product_id == product.pk
+    if target == Discount.TARGET_BRAND:
+        return discount.brand_id is not None and discount.brand_id == product.brand_id
+    if target == Discount.TARGET_STORE:
+        return _in_store(discount, product)
+    if target == Discount.TARGET_CATEGORY:
+        if discount.category_id != product.category_id:
+            return False
+        if discount.store_id:
+            return _in_store(discount, product)
+        if discount.brand_id:
+            return discount.brand_id == product.brand_id
+        return True
+    return False
+
+
+def _in_store(discount: Discount, product: Product) -> bool:
+    if not discount.store_id:
+        return False
+    if product.store_id:
+        return product.store_id == discount.store_id
+    return product.brand_id is not None and discount.store.brand_id == product.brand_id
+
+
+class DiscountResolver:
+    """Resolve the best active discount for many products with a single query.
+
+    All approved, currently active discounts that may target any of the given
+    products (by product, category, brand or store) are fetched at once and
+    indexed in memory; ``best()`` then picks the one giving the lowest price.
+    With ``upcoming=True`` approved discounts that have not started yet are
+    loaded too, so ``next_change()`` can tell when the best price may change.
+    """
+
+    def __init__(self, products: Iterable[Product], now=None, upcoming: bool = False):
+        self.now = now or timezone.now()
+        self.upcoming = upcoming
+        self.products = [p for p in products if p is not None]
+        self._by_product: Dict[int, List[Discount]] = defaultdict(list)
+        self._by_category: Dict[int, List[Discount]] = defaultdict(list)
+        self._by_brand: Dict[int, List[Discount]] = defaultdict(list)
+        self._by_store: Dict[int, List[Discount]] = defaultdict(list)
+        self._by_store_brand: Dict[int, List[Discount]] = defaultdict(list)
+        self._best: Dict[int, Tuple[Optional[Discount], Optional[Decimal]]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.products:
+            return
+        product_ids = {p.pk for p in self.products}
+        category_ids = {p.category_id for p in self.products if p.category_id}
+        brand_ids = {p.brand_id for p in self.products if p.brand_id}
+        store_ids = {p.store_id for p in self.products if p.store_id}
+
+        scope = Q(target_type=Discount.TARGET_PRODUCT, product_id__in=product_ids)
+        if category_ids:
+            scope |= Q(target_type=Discount.TARGET_CATEGORY, category_id__in=category_ids)
+        if brand_ids:
+            scope |= Q(target_type=Discount.TARGET_BRAND, brand_id__in=brand_ids)
+            scope |= Q(target_type=Discount.TARGET_STORE, store__brand_id__in=brand_ids)
+        if store_ids:
+            scope |= Q(target_type=Discount.TARGET_STORE, store_id__in=store_ids)
+
+        if self.upcoming:
+            discounts = Discount.objects.filter(status=Discount.DiscountStatus.APPROVED, ends_at__gte=self.now)
+        else:
+            discounts = active_discounts(self.now)
+        for d in discounts.filter(scope).select_related("store"):
+            if d.target_type == Discount.TARGET_PRODUCT:
+                self._by_product[d.product_id].append(d)
+            elif d.target_type == Discount.TARGET_CATEGORY:
+                self._by_category[d.category_id].append(d)
+            elif d.target_type == Discount.TARGET_BRAND:
+                self._by_brand[d.brand_id].append(d)
+            elif d.target_type == Discount.TARGET_STORE:
+                self._by_store[d.store_id].append(d)
+                self._by_store_brand[d.store.brand_id].append(d)
+
+    def _applicable(self, product: Product) -> List[Discount]:
+        found = list(self._by_product.get(product.pk, ()))
+        found += self._by_category.get(product.category_id, ())
+        found += self._by_brand.get(product.brand_id, ())
+        if product.store_id:
+            found += self._by_store.get(product.store_id, ())
+        else:
+            found += self._by_store_brand.get(product.brand_id, ())
+        return [d for d in found if discount_applies(d, product)]
+
+    def candidates(self, product: Product) -> List[Discount]:
+        """Active discounts applying to ``product``."""
+        return [d for d in self._applicable(product) if d.starts_at <= self.now]
+
+    def next_change(self, product: Product):
+        """Earliest moment the best price of ``product`` may change, or None.
+
+        That is when the winning discount ends or when an upcoming one starts;
+        only meaningful when the resolver was built with ``upcoming=True``.
+        """
+        best = self.best(product)
+        moments = [d.starts_at for d in self._applicable(product) if d.starts_at > self.now]
+        if best is not None:
+            moments.append(best.ends_at)
+        return min(moments) if moments else None
+
+    def resolve(self, product: Product) -> Tuple[Optional[Discount], Optional[Decimal]]:
+        """Return ``(best discount, discounted price)``; ``(None, None)`` when nothing applies."""
+        if product is None or product.price is None:
+            return None, None
+        if product.pk not in self._best:
+            best: Optional[Discount] = None
+            best_price: Optional[Decimal] = None
+            for d in self.candidates(product):
+                price = apply_discount(product.price, d.discount_type, d.value)
+                if best is None or price < best_price:
+                    best, best_price = d, price
+            self._best[product.pk] = (best, best_price)
+        return self._best[product.pk]
+
+    def best(self, product: Product) -> Optional[Discount]:
+        return self.resolve(product)[0]
+
+
+class CurrentPrices:
+    """Discounted prices for many products, from their materialized price rows.
+
+    Load the products with ``select_related("current_price")``. A row that is
+    missing or has passed its ``valid_until`` (the worker has not refreshed it
+    yet) is not trusted: those products are resolved live by one
+    ``DiscountResolver``, so any number of products costs at most one query.
+    """
+
+    def __init__(self, products: Iterable[Product], now=None):
+        self.now = now or timezone.now()
+        self._resolvers: Dict[int, DiscountResolver] = {}
+        self._resolve_live([p for p in products if p is not None and not self._fresh(p)])
+
+    def _resolve_live(self, products: List[Product]) -> None:
+        if products:
+            resolver = DiscountResolver(products, now=self.now)
+            self._resolvers.update((p.pk, resolver) for p in products)
+
+    def _fresh(self, product: Product) -> bool:
+        current = getattr(product, "current_price", None)
+        return current is not None and (current.valid_until is None or current.valid_until > self.now)
+
+    def discounted_price(self, product: Product) -> Optional[Decimal]:
+        """Best discounted price of ``product``, or None when no discount is active."""
+        if product is None:
+            return None
+        if self._fresh(product):
+            current = product.current_price
+            return current.effective_price if current.discount_id else None
+        if product.pk not in self._resolvers:
+            self._resolve_live([product])
+        return self._resolvers[product.pk].resolve(product)[1]
+
+
+def _target_condition(discount: Discount) -> Optional[Q]:
+    """Product filter matching what ``discount`` targets (``None`` if it targets nothing)."""
+    target = discount.target_type
+    if target == Discount.TARGET_PRODUCT and discount.product_id:
+        return Q(pk=discount.product_id)
+    if target == Discount.TARGET_BRAND and discount.brand_id:
+        return Q(brand_id=discount.brand_id)
+    if target == Discount.TARGET_STORE and discount.store_id:
+        return Q(store_id=discount.store_id) | Q(store__isnull=True, brand_id=discount.store.brand_id)
+    if target == Discount.TARGET_CATEGORY and discount.category_id:
+        condition = Q(category_id=discount.category_id)
+        if discount.store_id:
+            condition &= Q(store_id=discount.store_id) | Q(store__isnull=True, brand_id=discount.store.brand_id)
+        elif discount.brand_id:
+            condition &= Q(brand_id=discount.brand_id)
+        return condition
+    return None
+
+
+def products_for_discounts(discounts: Iterable[Discount]) -> List[int]:
+    """Ids of the products any of ``discounts`` targets, plus any whose cached price one of them wins.
+
+    Two queries however many discounts are given; load them with ``select_related("store")``.
+    """
+    discounts = list(discounts)
+    conditions = [c for c in map(_target_condition, discounts) if c is not None]
+    ids = set()
+    if conditions:
+        ids.update(Product.objects.filter(reduce(operator.or_, conditions)).values_list("pk", flat=True))
+    saved = [d.pk for d in discounts if d.pk]
+    if saved:
+        ids.update(ProductCurrentPrice.objects.filter(discount_id__in=saved).values_list("product_id", flat=True))
+    return sorted(ids)
+
+
+def products_for_discount(discount: Discount) -> List[int]:
+    """Ids of the products ``discount`` targets, plus any whose cached price it currently wins."""
+    return products_for_discounts([discount])
+
+
+def refresh_current_prices(product_ids: Iterable[int], now=None, chunk_size: int = 500) -> int:
+    """Recompute ``ProductCurrentPrice`` rows and discount history for the given products in bulk.
+
+    Each chunk costs one product query, one discount query, one upsert, the
+    history sync (one read plus at most one insert and one update) and the
+    price alert match (one read, writes only when alerts fire or re-arm).
+    Returns the number of price rows written.
+    """
+    now = now or timezone.now()
+    product_ids = list(product_ids)
+    written = 0
+    for start in range(0, len(product_ids), chunk_size):
+        products = list(Product.objects.filter(pk__in=product_ids[start:start + chunk_size]))
+        resolver = DiscountResolver(products, now=now, upcoming=True)
+        rows = []
+        for product in products:
+            discount, price = resolver.resolve(product)
+            rows.append(ProductCurrentPrice(
+                product_id=product.pk,
+                effective_price=price if discount else product.price,
+                discount=discount,
+                valid_from=max(discount.starts_at, now) if discount else now,
+                valid_until=resolver.next_change(product),
+                computed_at=now,
+            ))
+        ProductCurrentPrice.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["effective_price", "discount", "valid_from", "valid_until", "computed_at"],
+        )
+        sync_discount_history(products, resolver, now)
+        alerts.match_price_alerts({row.product_id: (row.effective_price, row.discount_id) for row in rows})
+        written += len(rows)
+    if written:
+        caching.bump("product")
+    return written
+
+
+def refresh_on_commit(discount_ids: Iterable[int] = (), product_ids: Iterable[int] = ()) -> None:
+    """Refresh the prices of what the given discounts target, plus ``product_ids``, once the
+    current transaction commits (immediately in autocommit mode).
+
+    Saves within one transaction are collected and refreshed by a single
+    ``refresh_current_prices``. More than ``CATALOG_PRICE_REFRESH_INLINE_LIMIT``
+    products (a brand- or category-wide discount) are not recomputed in the
+    request: their rows are expired and the lifecycle worker refreshes them.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, "_catalog_price_refresh", None)
+    if pending is None:
+        pending = connection._catalog_price_refresh = (set(), set())
+    pending[0].update(discount_ids)
+    pending[1].update(product_ids)
+    # one callback per save; the first to run takes everything collected so far
+    transaction.on_commit(lambda: _flush_refresh(connection))
+
+
+def _flush_refresh(connection) -> None:
+    pending = getattr(connection, "_catalog_price_refresh", None)
+    if pending is None:
+        return
+    del connection._catalog_price_refresh
+    discount_ids, product_ids = pending
+    if discount_ids:
+        product_ids |= set(products_for_discounts(Discount.objects.filter(pk__in=discount_ids).select_related("store")))
+    if len(product_ids) > getattr(settings, "CATALOG_PRICE_REFRESH_INLINE_LIMIT", 2000):
+        expire_current_prices(product_ids)
+    else:
+        refresh_current_prices(product_ids)
+
+
+def expire_current_prices(product_ids: Iterable[int], now=None, chunk_size: int = 5000) -> int:
+    """Mark cached prices as expired so the next ``refresh_stale_prices`` recomputes them.
+
+    Until then wishlist and cart prices of these products are resolved live
+    (``CurrentPrices``). Products without a row are stale already.
+    """
+    now = now or timezone.now()
+    product_ids = sorted(product_ids)
+    expired = 0
+    for start in range(0, len(product_ids), chunk_size):
+        expired += ProductCurrentPrice.objects.filter(product_id__in=product_ids[start:start + chunk_size]).update(
+            valid_until=now
+        )
+    if product_ids:
+        caching.bump("product")
+    return expired
+
+
+def sync_discount_history(products: List[Product], resolver: DiscountResolver, now) -> None:
+    """Open a history row for every active discount applying to a product and close
+    open rows whose discount no longer applies. ``applied_price`` snapshots the
+    discounted price, so a list price change closes the open row and opens a new
+    one at the new price."""
+    open_rows = {
+        (product_id, discount_id): (pk, applied_price)
+        for pk, product_id, discount_id, applied_price in ProductDiscountHistory.objects.filter(
+            product__in=products, removed_at__isnull=True
+        ).values_list("id", "product_id", "discount_id", "applied_price")
+    }
+    to_open = []
+    applying = set()
+    for product in products:
+        if product.price is None:
+            continue
+        for discount in resolver.candidates(product):
+            key = (product.pk, discount.pk)
+            price = apply_discount(product.price, discount.discount_type, discount.value)
+            if key in open_rows and open_rows[key][1] == price:
+                applying.add(key)
+                continue
+            to_open.append(ProductDiscountHistory(product_id=product.pk, discount_id=discount.pk, applied_price=price))
+    to_close = [pk for key, (pk, _) in open_rows.items() if key not in applying]
+    if to_close:
+        ProductDiscountHistory.objects.filter(pk__in=to_close).update(removed_at=now)
+    if to_open:
+        ProductDiscountHistory.objects.bulk_create(to_open)
+
+
+def close_ended_history(now=None) -> int:
+    """Close open history rows whose discount window has passed, dated at the discount's end."""
+    now = now or timezone.now()
+    return ProductDiscountHistory.objects.filter(
+        removed_at__isnull=True,
+        discount__ends_at__lt=now,
+    ).update(removed_at=Subquery(Discount.objects.filter(pk=OuterRef("discount_id")).values("ends_at")[:1]))
+
+
+def lowest_prices_since(product_ids: Iterable[int], since) -> Dict[int, Decimal]:
+    """Lowest discounted price each product had from ``since`` until now, from history.
+
+    Served by the ``(product, removed_at, applied_at)`` index as one grouped range scan.
+    """
+    rows = (
+        ProductDiscountHistory.objects.filter(product_id__in=list(product_ids))
+        .filter(Q(removed_at__isnull=True) | Q(removed_at__gte=since))
+        .values("product_id")
+        .annotate(lowest=Min("applied_price"))
+    )
+    return {row["product_id"]: row["lowest"] for row in rows}
+
+
+def stale_product_ids(now=None) -> List[int]:
+    """Products without a cached price or whose cached price has expired."""
+    now = now or timezone.now()
+    missing = Product.objects.filter(current_price__isnull=True).values_list("pk", flat=True)
+    expired = ProductCurrentPrice.objects.filter(valid_until__lte=now).values_list("product_id", flat=True)
+    return sorted(set(missing) | set(expired))
+
+
+def refresh_stale_prices(now=None, chunk_size: int = 500) -> int:
+    """Handle time-window boundaries: expired cached prices and ended discounts."""
+    now = now or timezone.now()
+    close_ended_history(now)
+    return refresh_current_prices(stale_product_ids(now), now=now, chunk_size=chunk_size)
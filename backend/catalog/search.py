@@ -0,0 +1,123 @@
+"""Fuzzy product search backed by a trigram inverted index.
+
+Product names are normalized (lower-cased, accents stripped) and split into
+padded trigrams stored in ``ProductSearchTerm``. A query is turned into the
+same trigrams, the index narrows the catalog down to the products sharing the
+most trigrams with it, and only those candidates are scored with RapidFuzz.
+"""
+import unicodedata
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from rapidfuzz import fuzz, process
+
+from .models import Product, ProductSearchTerm
+
+GRAM_SIZE = 3
+PAD = "_"
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip accents (ą -> a, š -> s) and collapse non-alphanumerics to spaces."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    cleaned = "".join(ch if ch.isalnum() else " " for ch in stripped.lower())
+    return " ".join(cleaned.split())
+
+
+def trigrams(text: str) -> set:
+    """Return the padded trigrams of every word in ``text``."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"{PAD}{word}{PAD}"
+        for i in range(len(padded) - GRAM_SIZE + 1):
+            grams.add(padded[i:i + GRAM_SIZE])
+    return grams
+
+
+def _terms_for(product_id: int, name: str) -> List[ProductSearchTerm]:
+    return [ProductSearchTerm(product_id=product_id, gram=g) for g in trigrams(name)]
+
+
+def index_product(product: Product) -> None:
+    """(Re)build the index entries of a single product."""
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product_id=product.pk).delete()
+        ProductSearchTerm.objects.bulk_create(_terms_for(product.pk, product.name))
+
+
+def index_products(product_ids: Iterable[int], chunk_size: int = 1000) -> int:
+    """(Re)build the index entries of many products. Returns the number of products indexed."""
+    product_ids = list(product_ids)
+    indexed = 0
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[start:start + chunk_size]
+        rows = Product.objects.filter(pk__in=chunk).values_list("id", "name")
+        terms = []
+        for pk, name in rows:
+            terms.extend(_terms_for(pk, name))
+            indexed += 1
+        with transaction.atomic():
+            ProductSearchTerm.objects.filter(product_id__in=chunk).delete()
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=chunk_size)
+    return indexed
+
+
+def rebuild_index(chunk_size: int = 1000) -> int:
+    """Drop and rebuild the whole index from the ``Product`` table."""
+    ProductSearchTerm.objects.all().delete()
+    ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+    return index_products(ids, chunk_size=chunk_size)
+
+
+def search_products(
+    query: str,
+    *,
+    threshold: Optional[float] = None,
+    limit: Optional[int] = None,
+    brand: Optional[str] = None,
+    category: Optional[str] = None,
+) -> List[Tuple[int, float]]:
+    """Return ``(product_id, score)`` pairs for ``query``, best match first.
+
+    Only the ``CATALOG_SEARCH_CANDIDATES`` products sharing the most trigrams with
+    the query are scored; matches scoring below ``threshold`` are dropped.
+    """
+    if threshold is None:
+        threshold = getattr(settings, "CATALOG_SEARCH_THRESHOLD", 75)
+    if limit is None:
+        limit = getattr(settings, "CATALOG_SEARCH_MAX_RESULTS", 100)
+    candidate_limit = getattr(settings, "CATALOG_SEARCH_CANDIDATES", 200)
+
+    grams = trigrams(query)
+    if not grams:
+        return []
+
+    terms = ProductSearchTerm.objects.filter(gram__in=grams)
+    if brand:
+        terms = terms.filter(product__brand__name__iexact=brand)
+    if category:
+        terms = terms.filter(product__category__name__iexact=category)
+    candidate_ids = list(
+        terms.values("product_id")
+        .annotate(hits=Count("id"))
+        .order_by("-hits", "product_id")
+        .values_list("product_id", flat=True)[:candidate_limit]
+    )
+    if not candidate_ids:
+        return []
+
+    choices = {
+        pk: normalize(name)
+        for pk, name in Product.objects.filter(pk__in=candidate_ids).values_list("id", "name")
+    }
+    matches = process.extract(
+        normalize(query),
+        choices,
+        scorer=fuzz.WRatio,
+        score_cutoff=threshold,
+        limit=limit,
+    )
+    return [(pk, score) for _, score, pk in matches]
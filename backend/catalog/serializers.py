@@ -5,13 +5,17 @@ from .models import (
     Discount,
     Store,
     Brand,
+    BrandQuerySet,
     ProductDiscountHistory,
     WishlistItem,
+    PriceAlert,
     Report,
     ShoppingCart,
     ShoppingCartItem,
 )
-from django.utils import timezone
+from django.conf import settings
+from . import carts, images
+from .pricing import CurrentPrices, DiscountResolver
 from decimal import Decimal
 from typing import Optional
 
@@ -197,20 +201,22 @@ class BrandSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ("id", "created_at", "updated_at")
 
+    def _stats(self, obj: Brand) -> Brand:
+        """Counts come from ``Brand.objects.with_stats()``; load them for instances that lack them (e.g. on create)."""
+        if not hasattr(obj, "products_total"):
+            stats = Brand.objects.with_stats().filter(pk=obj.pk).values(*BrandQuerySet.STATS).first() or {}
+            for name in BrandQuerySet.STATS:
+                setattr(obj, name, stats.get(name, 0))
+        return obj
+
     def get_stores_count(self, obj) -> int:
-        return obj.stores.count()
+        return self._stats(obj).stores_total
 
     def get_products_count(self, obj) -> int:
-        return obj.products.count()
+        return self._stats(obj).products_total
 
     def get_active_discounts_count(self, obj) -> int:
-        now = timezone.now()
-        return Discount.objects.filter(
-            product__brand=obj,
-            starts_at__lte=now,
-            ends_at__gte=now,
-            status=Discount.DiscountStatus.APPROVED
-        ).count()
+        return self._stats(obj).active_discounts_total
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -243,10 +249,62 @@ class DiscountSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class DiscountSummarySerializer(serializers.ModelSerializer):
+    """The parts of an active discount that a product list renders."""
+    effective_status = serializers.CharField(read_only=True)
+    # the columns these fields are built from, for only() and values()
+    columns = ("id", "name", "discount_type", "value", "ends_at", "status", "phase")
+
+    class Meta:
+        model = Discount
+        fields = ("id", "name", "discount_type", "value", "ends_at", "effective_status")
+        read_only_fields = fields
+
+
+def param_list(value: Optional[str]) -> list:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class SparseFieldsMixin:
+    """Lets the client shape the representation with query parameters.
+
+    - ``fields=a,b``: return only these fields
+    - ``expand=x``: replace the compact field ``x`` with the full form built by
+      ``expandable_fields[x]``
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+        for name in param_list(request.query_params.get("expand")):
+            if name not in self.expandable_fields:
+                raise serializers.ValidationError({"expand": f"Unknown field '{name}'."})
+            self.fields[name] = self.expandable_fields[name]()
+        wanted = param_list(request.query_params.get("fields"))
+        if wanted:
+            unknown = sorted(set(wanted) - set(self.fields))
+            if unknown:
+                raise serializers.ValidationError({"fields": f"Unknown fields: {', '.join(unknown)}."})
+            for name in set(self.fields) - set(wanted):
+                self.fields.pop(name)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     discounts = DiscountSerializer(many=True, read_only=True, source='discount_rules')
     # expose the brand's human-readable name as a read-only field
     brand_name = serializers.CharField(source='brand.name', read_only=True)
+    # annotated by pricing.annotate_effective_prices from the materialized ProductCurrentPrice row
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, required=False)
+    saving = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, required=False)
+    saving_percent = serializers.DecimalField(max_digits=7, decimal_places=2, read_only=True, required=False)
+    # photo_url stays the writable source URL; these are the local copy (and its
+    # thumbnail) once the photo is mirrored (mirror_product_photos), else the remote photo
+    photo_display_url = serializers.SerializerMethodField()
+    photo_thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -259,7 +317,12 @@ class ProductSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "photo_url",
+            "photo_display_url",
+            "photo_thumbnail_url",
             "price",
+            "effective_price",
+            "saving",
+            "saving_percent",
             "price_unit",
             "weight",
             "store",
@@ -269,6 +332,12 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ("id", "created_at", "updated_at")
 
+    def get_photo_display_url(self, obj: Product) -> str:
+        return images.product_photo_url(obj, self.context.get("request"))
+
+    def get_photo_thumbnail_url(self, obj: Product) -> str:
+        return images.product_photo_url(obj, self.context.get("request"), "thumbnail")
+
     def validate(self, attrs):
         brand = attrs.get("brand") or getattr(self.instance, "brand", None)
         store = attrs.get("store") or getattr(self.instance, "store", None)
@@ -277,6 +346,36 @@ class ProductSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class ProductListSerializer(SparseFieldsMixin, ProductSerializer):
+    """Compact product for lists and search: no description or timestamps, and only the
+    active discounts (prefetched into ``active_discounts``) in summary form.
+    ``expand=discounts`` returns them in full; ``fields=`` picks columns."""
+    discounts = DiscountSummarySerializer(many=True, read_only=True, source="active_discounts")
+    expandable_fields = {
+        "discounts": lambda: DiscountSerializer(many=True, read_only=True, source="active_discounts"),
+    }
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            "id",
+            "name",
+            "photo_url",
+            "photo_display_url",
+            "photo_thumbnail_url",
+            "price",
+            "effective_price",
+            "saving",
+            "saving_percent",
+            "price_unit",
+            "weight",
+            "store",
+            "brand",
+            "brand_name",
+            "category",
+            "discounts",
+        ]
+
+
 class ProductDiscountHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductDiscountHistory
@@ -284,6 +383,15 @@ class ProductDiscountHistorySerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "applied_at")
 
 
+class WishlistItemListSerializer(serializers.ListSerializer):
+    """Resolves the discounted prices of every listed item together (at most one query)."""
+
+    def to_representation(self, data):
+        items = data.all() if hasattr(data, "all") else data
+        self.context["current_prices"] = CurrentPrices(item.product for item in items)
+        return super().to_representation(items)
+
+
 class WishlistItemSerializer(serializers.ModelSerializer):
     product_name = serializers.SerializerMethodField()
     product_photo_url = serializers.SerializerMethodField()
@@ -294,61 +402,60 @@ class WishlistItemSerializer(serializers.ModelSerializer):
         model = WishlistItem
         fields = ("id", "product", "product_name", "product_photo_url", "price", "discounted_price", "created_at")
         read_only_fields = ("id", "created_at")
+        list_serializer_class = WishlistItemListSerializer
+
+    def to_representation(self, instance):
+        if "current_prices" not in self.context:
+            self.context["current_prices"] = CurrentPrices([instance.product])
+        return super().to_representation(instance)
 
     def get_product_name(self, obj: WishlistItem) -> Optional[str]:
         return getattr(obj.product, "name", None)
 
     def get_product_photo_url(self, obj: WishlistItem) -> Optional[str]:
-        return getattr(obj.product, "photo_url", None)
+        return images.product_photo_url(obj.product, self.context.get("request")) if obj.product else None
 
     def get_price(self, obj: WishlistItem) -> Optional[Decimal]:
         return obj.product.price if obj.product else None
 
     def get_discounted_price(self, obj: WishlistItem) -> Optional[Decimal]:
         """Return the best (lowest) discounted price if a discount is active; otherwise None.
-        Active means: current time between starts_at and ends_at. We do not hard-require
-        an APPROVED status here because upstream data may not consistently set it; the
-        time window is the source of truth for activity.
-        We first check direct discount rules on the product, then fall back to discount history.
+        Covers product, category, brand and store discounts: read from the materialized
+        ProductCurrentPrice row, or resolved live while that row is missing or expired.
         """
-        product = obj.product
-        if not product:
-            return None
+        return self.context["current_prices"].discounted_price(obj.product)
 
-        now = timezone.now()
-        price: Decimal = product.price
-        best: Optional[Decimal] = None
 
-        # 1) Check direct discount rules attached to the product
-        for disc in getattr(product, 'discount_rules', []).all() if hasattr(product, 'discount_rules') else []:
-            if disc.starts_at <= now <= disc.ends_at:
-                if disc.discount_type == Discount.PERCENTAGE:
-                    discounted = price * (Decimal('1') - (Decimal(disc.value) / Decimal('100')))
-                else:
-                    discounted = price - Decimal(disc.value)
-                if discounted < Decimal('0'):
-                    discounted = Decimal('0')
-                discounted = discounted.quantize(Decimal('0.01'))
-                best = discounted if best is None or discounted < best else best
-
-        # 2) Fallback to most recent active discount history entries
-        if best is None:
-            for hist in product.discount_history.select_related("discount").order_by("-applied_at"):
-                if hist.removed_at is not None and hist.removed_at <= now:
-                    continue
-                disc: Discount = hist.discount
-                if not disc or not (disc.starts_at <= now <= disc.ends_at):
-                    continue
-                if disc.discount_type == Discount.PERCENTAGE:
-                    discounted = price * (Decimal('1') - (Decimal(disc.value) / Decimal('100')))
-                else:
-                    discounted = price - Decimal(disc.value)
-                if discounted < Decimal('0'):
-                    discounted = Decimal('0')
-                best = discounted.quantize(Decimal('0.01'))
-                break  # history is ordered by newest first; first active suffices
+class PriceAlertSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
+    class Meta:
+        model = PriceAlert
+        fields = ("id", "product", "product_name", "kind", "threshold", "is_active", "notified_price", "created_at")
+        read_only_fields = ("id", "notified_price", "created_at")
 
-        return best
+    def validate(self, attrs):
+        user = self.context["request"].user
+        product = attrs.get("product", getattr(self.instance, "product", None))
+        kind = attrs.get("kind", getattr(self.instance, "kind", PriceAlert.Kind.TARGET_PRICE))
+        threshold = attrs.get("threshold", getattr(self.instance, "threshold", None))
+        if self.instance is not None and product != self.instance.product:
+            raise serializers.ValidationError({"product": "The product of an alert cannot be changed."})
+        if not WishlistItem.objects.filter(user=user, product=product).exists():
+            raise serializers.ValidationError({"product": "Add the product to your wishlist first."})
+        if kind == PriceAlert.Kind.TARGET_PRICE and threshold is None:
+            raise serializers.ValidationError({"threshold": "A target price alert needs a threshold."})
+        if kind == PriceAlert.Kind.ANY_DISCOUNT:
+            attrs["threshold"] = None
+        duplicate = PriceAlert.objects.filter(user=user, product=product, kind=kind)
+        if self.instance is not None:
+            duplicate = duplicate.exclude(pk=self.instance.pk)
+        if duplicate.exists():
+            raise serializers.ValidationError({"kind": "You already have this alert for the product."})
+        if self.instance is not None and ("threshold" in attrs or "kind" in attrs):
+            # a changed condition is evaluated afresh
+            attrs["notified_price"] = None
+        return attrs
 
 
 class ShoppingCartItemSerializer(serializers.ModelSerializer):
@@ -380,55 +487,16 @@ class ShoppingCartItemSerializer(serializers.ModelSerializer):
         return getattr(obj.product, "price", None)
 
     def _best_current_discount(self, product: Product) -> Optional[Discount]:
-        """Return the most beneficial currently active discount for a product among
-        product -> category -> brand level. Status must be APPROVED and now between
-        starts/ends. Chooses the one producing the lowest price.
+        """Return the most beneficial currently active discount for a product.
+        Uses the cart-level resolver placed in the context by ShoppingCartSerializer so that
+        a whole cart costs a single discount query; falls back to resolving this product alone.
         """
         if not product:
             return None
-        now = timezone.now()
-        base_price: Optional[Decimal] = product.price
-        if base_price is None:
-            return None
-
-        candidates = list(Discount.objects.filter(
-            product=product,
-            status=Discount.DiscountStatus.APPROVED,
-            starts_at__lte=now,
-            ends_at__gte=now,
-        ))
-
-        # Category-level
-        candidates += list(Discount.objects.filter(
-            category=product.category,
-            status=Discount.DiscountStatus.APPROVED,
-            starts_at__lte=now,
-            ends_at__gte=now,
-        ))
-
-        # Brand-level
-        if product.brand:
-            candidates += list(Discount.objects.filter(
-                brand=product.brand,
-                status=Discount.DiscountStatus.APPROVED,
-                starts_at__lte=now,
-                ends_at__gte=now,
-            ))
-
-        def discounted_price(d: Discount) -> Decimal:
-            if d.discount_type == Discount.PERCENTAGE:
-                price = base_price * (Decimal('1') - (Decimal(d.value) / Decimal('100')))
-            else:
-                price = base_price - Decimal(d.value)
-            return max(price, Decimal('0')).quantize(Decimal('0.01'))
-
-        best: Optional[Discount] = None
-        best_price: Optional[Decimal] = None
-        for d in candidates:
-            dp = discounted_price(d)
-            if best is None or dp < best_price:
-                best, best_price = d, dp
-        return best
+        resolver = self.context.get("discount_resolver")
+        if resolver is None:
+            resolver = DiscountResolver([product])
+        return resolver.best(product)
 
     def get_current_discount(self, obj: ShoppingCartItem):
         d = self._best_current_discount(obj.product)
@@ -450,6 +518,39 @@ class ShoppingCartItemSerializer(serializers.ModelSerializer):
         return getattr(getattr(obj.product, "brand", None), "name", None)
 
 
+class CartOperationSerializer(serializers.Serializer):
+    """One change to a cart's items, applied by ``catalog.carts``."""
+
+    op = serializers.ChoiceField(choices=[carts.ADD, carts.UPDATE, carts.REMOVE])
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(required=False)
+    increment = serializers.BooleanField(default=False)
+    is_purchased = serializers.BooleanField(required=False)
+
+    def to_operation(self) -> carts.Operation:
+        return carts.Operation(**self.validated_data)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """Operations applied to a cart in one transaction, in order."""
+    MAX_OPERATIONS = 200
+
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=MAX_OPERATIONS)
+
+    def to_operations(self) -> list:
+        return [carts.Operation(**data) for data in self.validated_data["operations"]]
+
+
+class ShoppingCartListSerializer(serializers.ListSerializer):
+    """Resolves discounts for the items of every listed cart with one query."""
+
+    def to_representation(self, data):
+        carts = data.all() if hasattr(data, "all") else data
+        products = [item.product for cart in carts for item in cart.items.all()]
+        self.context["discount_resolver"] = DiscountResolver(products)
+        return super().to_representation(carts)
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     items = ShoppingCartItemSerializer(many=True, read_only=True)
 
@@ -464,6 +565,13 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             "items",
         )
         read_only_fields = ("id", "created_at", "updated_at", "status")
+        list_serializer_class = ShoppingCartListSerializer
+
+    def to_representation(self, instance):
+        if "discount_resolver" not in self.context:
+            products = [item.product for item in instance.items.all()]
+            self.context["discount_resolver"] = DiscountResolver(products)
+        return super().to_representation(instance)
 
     def validate(self, attrs):
         # Only one OPEN cart per user globally
@@ -480,9 +588,13 @@ class ReportCreateSerializer(serializers.ModelSerializer):
     Rules enforced:
     - Exactly one of product or discount is provided
     - If product is provided, product_reason must be one of: name/photo/price
-    - If discount is provided, discount_image_base64 is required
+    - If discount is provided, an image is required: ``discount_image_base64``
+      (JSON) or a multipart ``discount_image`` file
     - Description is required
+    The image is decoded once here and stored by its hash (``catalog.images``).
     """
+    discount_image_base64 = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    discount_image = serializers.FileField(write_only=True, required=False)
 
     class Meta:
         model = Report
@@ -492,6 +604,7 @@ class ReportCreateSerializer(serializers.ModelSerializer):
             "discount",
             "product_reason",
             "discount_image_base64",
+            "discount_image",
             "description",
             "status",
             "created_at",
@@ -502,16 +615,29 @@ class ReportCreateSerializer(serializers.ModelSerializer):
         product = attrs.get("product")
         discount = attrs.get("discount")
         reason = attrs.get("product_reason")
-        img_b64 = attrs.get("discount_image_base64", "")
+        img_b64 = attrs.pop("discount_image_base64", "")
+        upload = attrs.pop("discount_image", None)
 
         if bool(product) == bool(discount):
             raise serializers.ValidationError("Exactly one of 'product' or 'discount' must be provided.")
         if product and not reason:
             raise serializers.ValidationError({"product_reason": "Product reports require a reason."})
-        if discount and not img_b64:
-            raise serializers.ValidationError({"discount_image_base64": "Discount reports require a base64 image."})
+        if discount and not (img_b64 or upload):
+            raise serializers.ValidationError({"discount_image_base64": "Discount reports require an image."})
         if not attrs.get("description"):
             raise serializers.ValidationError({"description": "Description is required."})
+        if discount:
+            try:
+                if upload is not None:
+                    if upload.size > settings.IMAGE_MAX_BYTES:
+                        raise images.InvalidImage("Image is too large.")
+                    data = upload.read()
+                else:
+                    data = images.decode_base64(img_b64)
+                attrs["image"] = images.store_image(data)
+            except images.InvalidImage as exc:
+                field = "discount_image" if upload is not None else "discount_image_base64"
+                raise serializers.ValidationError({field: str(exc)})
         return attrs
 
     def create(self, validated_data):
@@ -519,8 +645,22 @@ class ReportCreateSerializer(serializers.ModelSerializer):
         return Report.objects.create(reported_by=getattr(request, "user", None), **validated_data)
 
 
-class ReportModerationSerializer(serializers.ModelSerializer):
+class ImageURLsMixin:
+    """``image_url``/``thumbnail_url`` of a report's stored image (None without one)."""
+
+    def get_image_url(self, obj) -> Optional[str]:
+        return images.image_url(obj.image_id, self.context.get("request")) if obj.image_id else None
+
+    def get_thumbnail_url(self, obj) -> Optional[str]:
+        if not obj.image_id:
+            return None
+        return images.image_url(obj.image_id, self.context.get("request"), "thumbnail")
+
+
+class ReportModerationSerializer(ImageURLsMixin, serializers.ModelSerializer):
     """Serializer for moderators/admins to view and update report status."""
+    image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Report
@@ -529,12 +669,59 @@ class ReportModerationSerializer(serializers.ModelSerializer):
             "product",
             "discount",
             "product_reason",
-            "discount_image_base64",
+            "image_url",
+            "thumbnail_url",
             "description",
             "status",
             "created_at",
         ]
-        read_only_fields = ("id", "product", "discount", "product_reason", "discount_image_base64", "description", "created_at")
+        read_only_fields = ("id", "product", "discount", "product_reason", "description", "created_at")
+
+
+class ReportModerationListSerializer(ImageURLsMixin, serializers.ModelSerializer):
+    """Queue row for moderators: the report with a link to its image thumbnail."""
+    has_image = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Report
+        fields = [
+            "id",
+            "product",
+            "discount",
+            "product_reason",
+            "has_image",
+            "thumbnail_url",
+            "description",
+            "status",
+            "reported_by",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+    def get_has_image(self, obj) -> bool:
+        return obj.image_id is not None
+
+
+class ModerationBulkSerializer(serializers.Serializer):
+    """Ids to move to ``status`` in one go; subclasses set the allowed statuses."""
+    MAX_ITEMS = 1000
+    status_choices = ()
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_ITEMS)
+    status = serializers.ChoiceField(choices=())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["status"].choices = self.status_choices
+
+
+class DiscountModerationBulkSerializer(ModerationBulkSerializer):
+    status_choices = Discount.DiscountStatus.choices
+
+
+class ReportModerationBulkSerializer(ModerationBulkSerializer):
+    status_choices = Report.ReportStatus.choices
 
 
 class DiscountModerationSerializer(serializers.ModelSerializer):
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .lifecycle import phase_changed
+from .models import Brand, Category, Discount, Product, Store
+from . import caching, pricing, search
+
+PRICE_FIELDS = {"price", "category", "brand", "store"}
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance: Product, raw=False, update_fields=None, **kwargs):
+    """Keep the search index in sync with product names (deletes cascade on their own)."""
+    if raw:
+        return
+    if update_fields is not None and "name" not in update_fields:
+        return
+    search.index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_price(sender, instance: Product, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not PRICE_FIELDS.intersection(update_fields):
+        return
+    pricing.refresh_current_prices([instance.pk])
+
+
+@receiver(post_save, sender=Discount)
+def refresh_discounted_prices(sender, instance: Discount, raw=False, **kwargs):
+    """Approval, edits and status changes all go through save(); recompute what it touches
+    after the transaction commits (``pricing.refresh_on_commit``)."""
+    if raw:
+        return
+    pricing.refresh_on_commit(discount_ids=[instance.pk])
+
+
+@receiver(pre_delete, sender=Discount)
+def remember_discounted_products(sender, instance: Discount, **kwargs):
+    instance._affected_product_ids = pricing.products_for_discount(instance)
+
+
+@receiver(post_delete, sender=Discount)
+def refresh_after_discount_delete(sender, instance: Discount, **kwargs):
+    pricing.refresh_on_commit(product_ids=getattr(instance, "_affected_product_ids", []))
+
+
+@receiver(phase_changed)
+def refresh_prices_on_phase_change(sender, now, changed, **kwargs):
+    """Discounts that started or ended make cached prices stale; recompute those (and close history)."""
+    pricing.refresh_stale_prices(now=now)
+
+
+@receiver(phase_changed)
+def bump_discount_cache_on_phase_change(sender, **kwargs):
+    caching.bump("discount")
+
+
+@receiver([post_save, post_delete])
+def bump_cache_version(sender, **kwargs):
+    """Cached catalog responses are keyed by model versions; any write moves them on."""
+    if sender in (Brand, Category, Store, Product, Discount):
+        caching.bump(sender._meta.model_name)
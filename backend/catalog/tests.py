@@ -1,27 +1,79 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import pickle
+import socketserver
+import tempfile
+import threading
+from collections import Counter
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from PIL import Image
 from rest_framework.test import APITestCase
 
 from .models import (
+    AlertNotification,
     Brand,
     Category,
     Discount,
+    ImageBlob,
+    PriceAlert,
     Product,
+    ProductCurrentPrice,
     ProductDiscountHistory,
+    ProductMatch,
+    ProductMatchKey,
+    ProductSearchTerm,
     Store,
     WishlistItem,
     Report,
+    ShoppingCart,
+    ShoppingCartItem,
 )
+from users.helpers.cache import claims_cache
+from users.tests import make_token
+from . import alerts, async_views, benchmark, caching, carts, images, lifecycle, loadtest, matching, photos
+from .pricing import refresh_current_prices, refresh_stale_prices, stale_product_ids
 
 User = get_user_model()
 
 
+def png_bytes(color="red", size=(40, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    """Store uploaded images in a throwaway MEDIA_ROOT for the test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        media = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+        super().setUpClass()
+
+
 class CatalogModelsTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(email="modeltest@example.com", password="password")
@@ -404,8 +456,57 @@ class WishlistAPITests(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(WishlistItem.objects.filter(user=self.user, product=self.product).exists())
 
+    def discount(self, value=Decimal("10"), **target):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Discount.objects.create(
+                name=f"{target}", discount_type=Discount.PERCENTAGE, value=value,
+                status=Discount.DiscountStatus.APPROVED, starts_at=now - timezone.timedelta(hours=1),
+                ends_at=now + timezone.timedelta(days=1), **target,
+            )
+
+    def test_prices_cover_every_scope_in_constant_queries(self):
+        other_category = Category.objects.create(name="Other Category")
+        products = [self.product] + [
+            Product.objects.create(
+                store=self.store, brand=self.brand, category=other_category, name=f"Wish {i}", price=Decimal("10.00")
+            )
+            for i in range(6)
+        ]
+        self.discount(target_type=Discount.TARGET_CATEGORY, category=self.category)
+        self.discount(target_type=Discount.TARGET_PRODUCT, product=products[1], value=Decimal("50"))
+        WishlistItem.objects.bulk_create([WishlistItem(user=self.user, product=p) for p in products[:3]])
+
+        def prices():
+            with CaptureQueriesContext(connection) as queries:
+                rows = self.client.get(self.list_create_url).data
+            return {row["product"]: row["discounted_price"] for row in rows}, len(queries)
+
+        found, few = prices()
+        self.assertEqual(found, {products[0].pk: Decimal("10.80"), products[1].pk: Decimal("5.00"), products[2].pk: None})
+        WishlistItem.objects.bulk_create([WishlistItem(user=self.user, product=p) for p in products[3:]])
+        self.discount(target_type=Discount.TARGET_BRAND, brand=self.brand, value=Decimal("20"))
+        found, many = prices()
+        self.assertEqual(many, few)
+        self.assertEqual(found[products[2].pk], Decimal("8.00"))
+        self.assertEqual(found[products[1].pk], Decimal("5.00"))
 
-class ReportModelTests(TestCase):
+    def test_missing_or_expired_price_rows_are_resolved_live(self):
+        self.discount(target_type=Discount.TARGET_STORE, store=self.store)
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        ProductCurrentPrice.objects.filter(product=self.product).update(
+            discount=None, effective_price=self.product.price, valid_until=timezone.now() - timezone.timedelta(minutes=1)
+        )
+        self.assertEqual(self.client.get(self.list_create_url).data[0]["discounted_price"], Decimal("10.80"))
+        ProductCurrentPrice.objects.filter(product=self.product).delete()
+        self.assertEqual(self.client.get(self.list_create_url).data[0]["discounted_price"], Decimal("10.80"))
+
+        res = self.client.post(self.list_create_url, {"product": self.product.id}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["discounted_price"], Decimal("10.80"))
+
+
+class ReportModelTests(TempMediaMixin, TestCase):
     def setUp(self):
         self.user = User.objects.create_user(email="repmodel@example.com", password="pw123456")
         self.brand = Brand.objects.create(name="Rep Brand")
@@ -471,12 +572,12 @@ class ReportModelTests(TestCase):
         with self.assertRaises(ValidationError):
             r.full_clean()
 
-        r2 = Report(discount=disc, discount_image_base64="AAA", description="OK", reported_by=self.user)
+        r2 = Report(discount=disc, image=images.store_image(png_bytes()), description="OK", reported_by=self.user)
         r2.full_clean()
         r2.save()
 
 
-class ReportAPITests(APITestCase):
+class ReportAPITests(TempMediaMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(email="reporter@example.com", password="pw123456")
         self.moderator = User.objects.create_user(email="mod@example.com", password="pw123456", role="moderator")
@@ -523,11 +624,32 @@ class ReportAPITests(APITestCase):
     def test_user_can_create_discount_report(self):
         data = {
             "discount": self.discount.id,
-            "discount_image_base64": "AAA",
+            "discount_image_base64": base64.b64encode(png_bytes()).decode(),
             "description": "Receipt proof",
         }
         res = self.client.post(self.create_url, data, format="json")
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(res.data["image_url"].endswith(f"/images/{hashlib.sha256(png_bytes()).hexdigest()}/"))
+
+    def test_discount_report_accepts_multipart_upload_and_shares_blobs(self):
+        for _ in range(2):
+            upload = io.BytesIO(png_bytes("blue"))
+            upload.name = "receipt.png"
+            data = {"discount": self.discount.id, "discount_image": upload, "description": "Receipt"}
+            res = self.client.post(self.create_url, data, format="multipart")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertEqual(ImageBlob.objects.get().reports.count(), 2)
+
+    def test_discount_report_rejects_non_images(self):
+        data = {
+            "discount": self.discount.id,
+            "discount_image_base64": base64.b64encode(b"not an image").decode(),
+            "description": "Receipt proof",
+        }
+        res = self.client.post(self.create_url, data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("discount_image_base64", res.data)
 
     def test_unauthenticated_cannot_create(self):
         self.client.force_authenticate(user=None)
@@ -651,3 +773,1611 @@ class ShoppingCartAPITests(APITestCase):
         item = next(i for i in res2.data["items"] if i["product"] == self.p1.id)
         self.assertTrue(item["is_purchased"])
         self.assertEqual(item["quantity"], 3)
+
+
+class CartMutationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="taps@example.com", password="pw123456")
+        self.client.force_authenticate(user=self.user)
+        brand = Brand.objects.create(name="Tap Brand")
+        category = Category.objects.create(name="Tap Category")
+        self.milk = Product.objects.create(brand=brand, category=category, name="Milk", price=Decimal("1.20"))
+        self.bread = Product.objects.create(brand=brand, category=category, name="Bread", price=Decimal("0.90"))
+        self.cart = ShoppingCart.objects.create(user=self.user)
+        self.url = f"/api/catalog/shopping-carts/{self.cart.id}/"
+
+    def quantities(self):
+        return dict(self.cart.items.values_list("product_id", "quantity"))
+
+    def test_increment_is_one_upsert(self):
+        self.client.post(self.url + "add-item/", {"product": self.milk.id, "quantity": 2}, format="json")
+        with CaptureQueriesContext(connection) as queries:
+            carts.add(self.cart.id, self.milk.id, 1, increment=True)
+        self.assertEqual(len(queries), 1)
+        res = self.client.post(self.url + "add-item/", {"product": self.milk.id, "increment": True}, format="json")
+        self.assertEqual(res.data["items"][0]["quantity"], 4)
+        self.client.post(self.url + "add-item/", {"product": self.milk.id, "quantity": 2}, format="json")
+        self.assertEqual(self.quantities(), {self.milk.id: 2})
+        res = self.client.post(self.url + "add-item/", {"product": 999999}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delta_response(self):
+        ShoppingCartItem.objects.create(shopping_cart=self.cart, product=self.bread, quantity=2, is_purchased=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(
+                name="Milk promo", discount_type=Discount.FIXED, value=Decimal("0.20"),
+                target_type=Discount.TARGET_PRODUCT, product=self.milk, status=Discount.DiscountStatus.APPROVED,
+                starts_at=timezone.now() - timezone.timedelta(days=1), ends_at=timezone.now() + timezone.timedelta(days=1),
+            )
+        with CaptureQueriesContext(connection) as full:
+            self.client.post(self.url + "add-item/", {"product": self.milk.id, "quantity": 3}, format="json")
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(self.url + "add-item/?response=delta", {"product": self.milk.id, "increment": True}, format="json")
+        self.assertLess(len(queries), len(full))
+        self.assertEqual([(item["product"], item["quantity"]) for item in res.data["items"]], [(self.milk.id, 4)])
+        self.assertEqual(res.data["items"][0]["current_discount"]["name"], "Milk promo")
+        self.assertEqual(res.data["removed"], [])
+        self.assertEqual(res.data["totals"], {
+            "items": 2, "units": 6, "total": Decimal("5.80"), "remaining": Decimal("4.00"),
+        })
+
+        res = self.client.delete(self.url + f"remove-item/?product={self.bread.id}&response=delta")
+        self.assertEqual((res.data["items"], res.data["removed"]), ([], [self.bread.id]))
+        self.assertEqual(res.data["totals"]["units"], 4)
+
+    def test_delta_totals_use_live_discounts(self):
+        ShoppingCartItem.objects.create(shopping_cart=self.cart, product=self.milk, quantity=2)
+        Discount.objects.create(
+            name="Milk promo", discount_type=Discount.FIXED, value=Decimal("0.20"),
+            target_type=Discount.TARGET_PRODUCT, product=self.milk, status=Discount.DiscountStatus.APPROVED,
+            starts_at=timezone.now() - timezone.timedelta(days=1), ends_at=timezone.now() + timezone.timedelta(days=1),
+        )
+        # the stored current price has not been refreshed for the new discount
+        ProductCurrentPrice.objects.filter(product=self.milk).delete()
+        res = self.client.post(self.url + "add-item/?response=delta", {"product": self.milk.id, "increment": True}, format="json")
+        self.assertEqual(res.data["items"][0]["current_discount"]["name"], "Milk promo")
+        self.assertEqual(res.data["totals"]["total"], Decimal("3.00"))
+
+    def test_batch_applies_all_or_nothing(self):
+        operations = [
+            {"op": "add", "product": self.milk.id, "quantity": 2},
+            {"op": "add", "product": self.bread.id},
+            {"op": "add", "product": self.milk.id, "quantity": 3, "increment": True},
+            {"op": "update", "product": self.bread.id, "is_purchased": True},
+        ]
+        res = self.client.post(self.url + "batch/", {"operations": operations}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual({item["product"]: (item["quantity"], item["is_purchased"]) for item in res.data["items"]}, {
+            self.milk.id: (5, False), self.bread.id: (1, True),
+        })
+
+        failing = [{"op": "remove", "product": self.milk.id}, {"op": "update", "product": 999999, "quantity": 1}]
+        res = self.client.post(self.url + "batch/", {"operations": failing}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.quantities(), {self.milk.id: 5, self.bread.id: 1})
+
+        res = self.client.post(self.url + "batch/", {"operations": [{"op": "replace", "product": self.milk.id}]}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.rimi = Brand.objects.create(name="Rimi")
+        self.maxima = Brand.objects.create(name="Maxima")
+        self.category = Category.objects.create(name="Daržovės")
+        self.potatoes = Product.objects.create(
+            brand=self.rimi, category=self.category, name="Lietuviškos bulvės 45+, 1 kg", price=Decimal("0.89")
+        )
+        self.carrots = Product.objects.create(
+            brand=self.maxima, category=self.category, name="Lietuviškos plautos morkos, kg", price=Decimal("0.29")
+        )
+        self.url = "/api/catalog/products/search/"
+
+    def test_index_is_accent_insensitive(self):
+        from .search import trigrams
+
+        self.assertEqual(trigrams("Bulvės"), trigrams("bulves"))
+        self.assertTrue(ProductSearchTerm.objects.filter(product=self.potatoes, gram="bul").exists())
+
+    def test_search_returns_scored_matches(self):
+        res = self.client.get(self.url, {"q": "bulves"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["id"] for row in res.data], [self.potatoes.id])
+        self.assertGreaterEqual(res.data[0]["score"], 75)
+
+    def test_invalid_limit_is_rejected(self):
+        for limit in ("-1", "0", "2.5", "ten"):
+            res = self.client.get(self.url, {"q": "bulves", "limit": limit})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, limit)
+
+    def test_brand_filter_and_pagination(self):
+        res = self.client.get(self.url, {"q": "lietuviskos", "brand": "maxima", "page": 1})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 1)
+        self.assertEqual(res.data["results"][0]["id"], self.carrots.id)
+
+    def test_rename_updates_index(self):
+        self.potatoes.name = "Avokadai"
+        self.potatoes.save()
+        res = self.client.get(self.url, {"q": "avokadai"})
+        self.assertEqual([row["id"] for row in res.data], [self.potatoes.id])
+        self.assertEqual(self.client.get(self.url, {"q": "bulves"}).data, [])
+
+
+class CartDiscountResolutionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="resolver@example.com", password="pw123456")
+        self.client.force_authenticate(user=self.user)
+        self.brand = Brand.objects.create(name="Resolver Brand")
+        self.category = Category.objects.create(name="Resolver Category")
+        self.store = Store.objects.create(brand=self.brand, address_line1="3 St", city="Kaunas")
+        self.cart = ShoppingCart.objects.create(user=self.user)
+        now = timezone.now()
+        self.window = {"starts_at": now - timezone.timedelta(days=1), "ends_at": now + timezone.timedelta(days=1)}
+
+    def _add_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                brand=self.brand, category=self.category, name=f"Item {i}", price=Decimal("10.00")
+            )
+            ShoppingCartItem.objects.create(shopping_cart=self.cart, product=product)
+            Discount.objects.create(
+                name=f"Promo {i}", discount_type=Discount.FIXED, value=Decimal("1.00"),
+                target_type=Discount.TARGET_PRODUCT, product=product,
+                status=Discount.DiscountStatus.APPROVED, **self.window,
+            )
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        url = f"/api/catalog/shopping-carts/{self.cart.id}/"
+        self._add_products(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self._add_products(20)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(url)
+        self.assertEqual(len(res.data["items"]), 22)
+        self.assertEqual(len(small), len(large))
+
+    def test_best_discount_across_scopes(self):
+        product = Product.objects.create(
+            store=self.store, brand=self.brand, category=self.category, name="Scoped", price=Decimal("10.00")
+        )
+        ShoppingCartItem.objects.create(shopping_cart=self.cart, product=product)
+        Discount.objects.create(
+            name="Store wide", discount_type=Discount.PERCENTAGE, value=Decimal("30"),
+            target_type=Discount.TARGET_STORE, store=self.store,
+            status=Discount.DiscountStatus.APPROVED, **self.window,
+        )
+        Discount.objects.create(
+            name="Category", discount_type=Discount.FIXED, value=Decimal("2.00"),
+            target_type=Discount.TARGET_CATEGORY, category=self.category, store=self.store,
+            status=Discount.DiscountStatus.APPROVED, **self.window,
+        )
+        Discount.objects.create(
+            name="Not approved", discount_type=Discount.PERCENTAGE, value=Decimal("90"),
+            target_type=Discount.TARGET_BRAND, brand=self.brand, **self.window,
+        )
+        res = self.client.get(f"/api/catalog/shopping-carts/{self.cart.id}/")
+        self.assertEqual(res.data["items"][0]["current_discount"]["name"], "Store wide")
+
+
+class ProductCurrentPriceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="prices@example.com", password="pw123456")
+        self.brand = Brand.objects.create(name="Price Brand")
+        self.category = Category.objects.create(name="Price Category")
+        self.product = Product.objects.create(
+            brand=self.brand, category=self.category, name="Milk", price=Decimal("2.00")
+        )
+
+    def _discount(self, **kwargs):
+        now = timezone.now()
+        defaults = {
+            "name": "Milk promo",
+            "discount_type": Discount.PERCENTAGE,
+            "value": Decimal("25"),
+            "target_type": Discount.TARGET_PRODUCT,
+            "product": self.product,
+            "submitted_by": self.user,
+            "starts_at": now - timezone.timedelta(hours=1),
+            "ends_at": now + timezone.timedelta(days=1),
+        }
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Discount.objects.create(**defaults)
+
+    def test_row_created_with_list_price(self):
+        current = ProductCurrentPrice.objects.get(product=self.product)
+        self.assertEqual(current.effective_price, Decimal("2.00"))
+        self.assertIsNone(current.discount)
+
+    def test_recomputed_on_approval_and_price_change(self):
+        discount = self._discount()
+        self.assertIsNone(ProductCurrentPrice.objects.get(product=self.product).discount)
+
+        discount.status = Discount.DiscountStatus.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.save()
+        current = ProductCurrentPrice.objects.get(product=self.product)
+        self.assertEqual(current.discount, discount)
+        self.assertEqual(current.effective_price, Decimal("1.50"))
+        self.assertEqual(current.valid_until, discount.ends_at)
+
+        self.product.price = Decimal("4.00")
+        self.product.save()
+        self.assertEqual(ProductCurrentPrice.objects.get(product=self.product).effective_price, Decimal("3.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.delete()
+        self.assertEqual(ProductCurrentPrice.objects.get(product=self.product).effective_price, Decimal("4.00"))
+
+    def test_upcoming_discount_sets_expiry_and_refresh_applies_it(self):
+        starts = timezone.now() + timezone.timedelta(hours=2)
+        discount = self._discount(
+            status=Discount.DiscountStatus.APPROVED, starts_at=starts, ends_at=starts + timezone.timedelta(days=1)
+        )
+        current = ProductCurrentPrice.objects.get(product=self.product)
+        self.assertEqual(current.effective_price, Decimal("2.00"))
+        self.assertEqual(current.valid_until, starts)
+
+        later = starts + timezone.timedelta(minutes=1)
+        self.assertEqual(stale_product_ids(later), [self.product.id])
+        refresh_stale_prices(now=later)
+        current.refresh_from_db()
+        self.assertEqual(current.discount, discount)
+        self.assertEqual(current.effective_price, Decimal("1.50"))
+
+
+    def test_discount_saves_refresh_after_commit(self):
+        other = Product.objects.create(brand=self.brand, category=self.category, name="Kefir", price=Decimal("4.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            now = timezone.now()
+            discount = Discount.objects.create(
+                name="Brand week", discount_type=Discount.PERCENTAGE, value=Decimal("25"),
+                target_type=Discount.TARGET_BRAND, brand=self.brand, status=Discount.DiscountStatus.APPROVED,
+                starts_at=now - timezone.timedelta(hours=1), ends_at=now + timezone.timedelta(days=1),
+            )
+            discount.value = Decimal("50")
+            discount.save()
+            self.assertIsNone(ProductCurrentPrice.objects.get(product=self.product).discount)
+        prices = dict(ProductCurrentPrice.objects.values_list("product_id", "effective_price"))
+        self.assertEqual(prices, {self.product.pk: Decimal("1.00"), other.pk: Decimal("2.00")})
+
+        # too many products for the request: expired here, recomputed by the worker
+        with override_settings(CATALOG_PRICE_REFRESH_INLINE_LIMIT=1), self.captureOnCommitCallbacks(execute=True):
+            discount.value = Decimal("25")
+            discount.save()
+        self.assertEqual(ProductCurrentPrice.objects.get(product=other).effective_price, Decimal("2.00"))
+        self.assertEqual(sorted(stale_product_ids()), sorted([self.product.pk, other.pk]))
+        out = io.StringIO()
+        call_command("run_discount_lifecycle", "--once", stdout=out)
+        self.assertIn("2 prices refreshed", out.getvalue())
+        prices = dict(ProductCurrentPrice.objects.values_list("product_id", "effective_price"))
+        self.assertEqual(prices, {self.product.pk: Decimal("1.50"), other.pk: Decimal("3.00")})
+
+
+class ProductDiscountHistoryMaintenanceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="history@example.com", password="pw123456")
+        self.brand = Brand.objects.create(name="History Brand")
+        self.category = Category.objects.create(name="History Category")
+        self.product = Product.objects.create(
+            brand=self.brand, category=self.category, name="Butter", price=Decimal("4.00")
+        )
+        now = timezone.now()
+        self.discount = Discount.objects.create(
+            name="Butter promo",
+            discount_type=Discount.PERCENTAGE,
+            value=Decimal("25"),
+            target_type=Discount.TARGET_CATEGORY,
+            category=self.category,
+            brand=self.brand,
+            submitted_by=self.user,
+            starts_at=now - timezone.timedelta(hours=1),
+            ends_at=now + timezone.timedelta(hours=1),
+        )
+
+    def test_approval_opens_and_rejection_closes_row(self):
+        self.assertFalse(ProductDiscountHistory.objects.exists())
+        self.discount.status = Discount.DiscountStatus.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.save()
+        row = ProductDiscountHistory.objects.get(product=self.product)
+        self.assertEqual(row.discount, self.discount)
+        self.assertEqual(row.applied_price, Decimal("3.00"))
+        self.assertIsNone(row.removed_at)
+
+        # a list price change closes the row and opens one at the new discounted price
+        self.product.price = Decimal("5.00")
+        self.product.save()
+        row.refresh_from_db()
+        self.assertIsNotNone(row.removed_at)
+        current = ProductDiscountHistory.objects.get(product=self.product, removed_at__isnull=True)
+        self.assertEqual(current.applied_price, Decimal("3.75"))
+        self.product.save()
+        self.assertEqual(ProductDiscountHistory.objects.count(), 2)
+
+        self.discount.status = Discount.DiscountStatus.DENIED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.save()
+        current.refresh_from_db()
+        self.assertIsNotNone(current.removed_at)
+
+    def test_ended_discount_closed_at_its_end(self):
+        self.discount.status = Discount.DiscountStatus.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.save()
+        later = self.discount.ends_at + timezone.timedelta(minutes=5)
+        refresh_stale_prices(now=later)
+        row = ProductDiscountHistory.objects.get(product=self.product)
+        self.assertEqual(row.removed_at, self.discount.ends_at)
+
+    def test_price_history_endpoint_reports_lowest_price(self):
+        self.discount.status = Discount.DiscountStatus.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.save()
+        response = self.client.get(reverse("catalog:product-price-history", kwargs={"pk": self.product.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["lowest_price"]), Decimal("3.00"))
+        self.assertEqual(len(response.data["history"]), 1)
+        response = self.client.get(reverse("catalog:product-price-history", kwargs={"pk": self.product.id}), {"days": -1})
+        self.assertEqual(response.status_code, 400)
+
+
+class DiscountLifecycleTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="lifecycle@example.com", password="pw123456")
+        self.brand = Brand.objects.create(name="Lifecycle Brand")
+        self.category = Category.objects.create(name="Lifecycle Category")
+        self.product = Product.objects.create(
+            brand=self.brand, category=self.category, name="Cheese", price=Decimal("10.00")
+        )
+        self.starts = timezone.now() + timezone.timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount = Discount.objects.create(
+                name="Cheese promo",
+                discount_type=Discount.FIXED,
+                value=Decimal("2.00"),
+                target_type=Discount.TARGET_PRODUCT,
+                product=self.product,
+                submitted_by=self.user,
+                status=Discount.DiscountStatus.APPROVED,
+                starts_at=self.starts,
+                ends_at=self.starts + timezone.timedelta(hours=1),
+            )
+
+    def test_phase_persisted_and_advanced(self):
+        self.assertEqual(self.discount.phase, Discount.Phase.SCHEDULED)
+        self.assertEqual(lifecycle.next_boundary(), self.starts)
+
+        changed = lifecycle.advance_discounts(self.starts + timezone.timedelta(minutes=1))
+        self.assertEqual(changed, {Discount.Phase.ACTIVE: [self.discount.id]})
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.effective_status, "IN_ACTION")
+        current = ProductCurrentPrice.objects.get(product=self.product)
+        self.assertEqual(current.effective_price, Decimal("8.00"))
+
+        lifecycle.advance_discounts(self.discount.ends_at)
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.effective_status, "ENDED")
+        self.assertEqual(lifecycle.advance_discounts(self.discount.ends_at), {})
+
+    def test_filter_by_effective_status(self):
+        url = reverse("catalog:discount-list")
+        response = self.client.get(url, {"effective_status": "IN_ACTION"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 0)
+
+        Discount.objects.filter(pk=self.discount.pk).update(starts_at=timezone.now() - timezone.timedelta(minutes=1))
+        out = io.StringIO()
+        call_command("run_discount_lifecycle", "--once", stdout=out)
+        self.assertIn("1 active", out.getvalue())
+        response = self.client.get(url, {"effective_status": "IN_ACTION"})
+        self.assertEqual([d["id"] for d in response.data], [self.discount.id])
+
+
+class BrandStatsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="brands@example.com", password="pw123456")
+        self.category = Category.objects.create(name="Brand Stats Category")
+        self.brand = Brand.objects.create(name="Stats Brand")
+        self.store = Store.objects.create(brand=self.brand, address_line1="Gedimino 1", city="Vilnius")
+        self.product = Product.objects.create(brand=self.brand, category=self.category, name="Kefir", price=Decimal("1.00"))
+        now = timezone.now()
+        window = {
+            "status": Discount.DiscountStatus.APPROVED,
+            "submitted_by": self.user,
+            "discount_type": Discount.PERCENTAGE,
+            "value": Decimal("10"),
+            "starts_at": now - timezone.timedelta(hours=1),
+            "ends_at": now + timezone.timedelta(hours=1),
+        }
+        Discount.objects.create(name="Product", target_type=Discount.TARGET_PRODUCT, product=self.product, **window)
+        Discount.objects.create(name="Brand", target_type=Discount.TARGET_BRAND, brand=self.brand, **window)
+        Discount.objects.create(name="Store", target_type=Discount.TARGET_STORE, store=self.store, **window)
+        Discount.objects.create(
+            name="Category", target_type=Discount.TARGET_CATEGORY, category=self.category, store=self.store, **window
+        )
+        window["status"] = Discount.DiscountStatus.IN_REVIEW
+        Discount.objects.create(name="Pending", target_type=Discount.TARGET_BRAND, brand=self.brand, **window)
+
+    def test_counts_cover_every_scope(self):
+        response = self.client.get(reverse("catalog:brand-detail", kwargs={"pk": self.brand.pk}))
+        self.assertEqual(response.data["stores_count"], 1)
+        self.assertEqual(response.data["products_count"], 1)
+        self.assertEqual(response.data["active_discounts_count"], 4)
+
+    def test_list_query_count_is_constant(self):
+        url = reverse("catalog:brand-list")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(5):
+            Brand.objects.create(name=f"Extra brand {i}")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(len(many), len(few))
+
+
+@override_settings(CATALOG_CACHE_ENABLED=True)
+class CatalogResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.brand = Brand.objects.create(name="Cache Brand")
+        self.category = Category.objects.create(name="Cache Category")
+        self.product = Product.objects.create(
+            brand=self.brand, category=self.category, name="Yoghurt", price=Decimal("1.20")
+        )
+
+    def test_hit_after_miss_and_not_modified(self):
+        url = reverse("catalog:category-list")
+        first = self.client.get(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.content, first.content)
+
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        for response in (first, second, revalidated):
+            self.assertIn("Accept", response["Vary"])
+
+    def test_writes_invalidate_dependent_responses(self):
+        url = reverse("catalog:product-detail", kwargs={"pk": self.product.pk})
+        etag = self.client.get(url)["ETag"]
+        self.product.price = Decimal("0.99")
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["price"], "0.99")
+
+        brands = reverse("catalog:brand-list")
+        self.client.get(brands)
+        Store.objects.create(brand=self.brand, address_line1="Pylimo 2", city="Vilnius")
+        self.assertEqual(self.client.get(brands).json()[0]["stores_count"], 1)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        url = reverse("catalog:product-list")
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, {"brand": "Cache Brand"})["X-Cache"], "MISS")
+        self.assertEqual(caching.metrics(["product-list"])["product-list"]["miss"], 2)
+
+
+class ProductKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        brand = Brand.objects.create(name="Keyset Brand")
+        category = Category.objects.create(name="Keyset Category")
+        prices = [Decimal("1.00"), Decimal("2.00"), None, Decimal("2.00"), Decimal("0.50"), None, Decimal("3.00")]
+        for i, price in enumerate(prices):
+            # duplicate names and prices exercise the id tie-breaker
+            Product.objects.create(brand=brand, category=category, name=f"Item {i % 3}", price=price)
+        self.url = reverse("catalog:product-list")
+
+    def walk(self, **params):
+        ids, response = [], self.client.get(self.url, {"pagination": "keyset", "page_size": 2, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            ids.extend(row["id"] for row in response.data["results"])
+            if not response.data["next_cursor"]:
+                return ids
+            response = self.client.get(self.url, {"cursor": response.data["next_cursor"], "page_size": 2, **params})
+
+    def test_walks_every_row_in_order(self):
+        products = list(Product.objects.all())
+        by_name = sorted(products, key=lambda p: (p.name, p.id))
+        self.assertEqual(self.walk(), [p.id for p in by_name])
+
+        priced = sorted((p for p in products if p.price is not None), key=lambda p: (-p.price, -p.id))
+        unpriced = sorted((p.id for p in products if p.price is None), reverse=True)
+        self.assertEqual(self.walk(ordering="-price"), [p.id for p in priced] + unpriced)
+
+    def test_no_count_query_and_invalid_cursor(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"pagination": "keyset", "ordering": "price"})
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in queries.captured_queries))
+        self.assertEqual(self.client.get(self.url, {"cursor": "bm90LWEtY3Vyc29y"}).status_code, 404)
+        for value in ("not-a-price", 1.5):
+            tampered = base64.urlsafe_b64encode(json.dumps({"o": "price", "v": value, "id": 1}).encode()).decode()
+            response = self.client.get(self.url, {"cursor": tampered, "ordering": "price"})
+            self.assertEqual(response.status_code, 404, value)
+
+    def test_seek_predicate_leaves_nulls_to_their_own_segment(self):
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.walk(ordering="price")
+        self.assertEqual(len(ids), 7)
+        for query in queries.captured_queries:
+            sql = query["sql"].upper()
+            # the keyed segment never ORs in the NULL rows
+            self.assertFalse(" OR " in sql and "IS NULL" in sql, sql)
+
+    def test_other_orderings_fall_back_to_page_numbers(self):
+        response = self.client.get(self.url, {"pagination": "keyset", "ordering": "saving"})
+        self.assertEqual(response.data["count"], 7)
+
+
+class ProductListFixture:
+    """Six products, each with an active, a scheduled and an in-review discount."""
+
+    def setUp(self):
+        brand = Brand.objects.create(name="Lean Brand")
+        category = Category.objects.create(name="Lean Category")
+        now = timezone.now()
+        self.products = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(6):
+                product = Product.objects.create(brand=brand, category=category, name=f"Lean {i}", price=Decimal("4.00"))
+                for status_, starts in [
+                    (Discount.DiscountStatus.APPROVED, now - timezone.timedelta(hours=1)),
+                    (Discount.DiscountStatus.APPROVED, now + timezone.timedelta(days=2)),
+                    (Discount.DiscountStatus.IN_REVIEW, now - timezone.timedelta(hours=1)),
+                ]:
+                    Discount.objects.create(
+                        name=f"{status_} {starts:%d}", discount_type=Discount.FIXED, value=Decimal("1.00"),
+                        target_type=Discount.TARGET_PRODUCT, product=product, status=status_,
+                        starts_at=starts, ends_at=starts + timezone.timedelta(days=1),
+                    )
+                self.products.append(product)
+        self.url = reverse("catalog:product-list")
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ProductListRepresentationTests(ProductListFixture, APITestCase):
+    def test_list_rows_are_compact_with_active_discounts_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get(self.url).data["results"]
+        # count, page, active discounts
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(rows), 6)
+        self.assertNotIn("description", rows[0])
+        self.assertEqual(len(rows[0]["discounts"]), 1)
+        self.assertEqual(
+            set(rows[0]["discounts"][0]), {"id", "name", "discount_type", "value", "ends_at", "effective_status"}
+        )
+        self.assertEqual(rows[0]["discounts"][0]["effective_status"], "IN_ACTION")
+
+        detail = self.client.get(reverse("catalog:product-detail", args=[self.products[0].pk])).data
+        self.assertEqual(len(detail["discounts"]), 3)
+
+    def test_fields_and_expand(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get(self.url, {"fields": "id,name,effective_price"}).data["results"]
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(set(rows[0]), {"id", "name", "effective_price"})
+        self.assertEqual(rows[0]["effective_price"], "3.00")
+
+        rows = self.client.get(self.url, {"fields": "id,discounts", "expand": "discounts"}).data["results"]
+        self.assertEqual(rows[0]["discounts"][0]["effective_status"], "IN_ACTION")
+
+        self.assertEqual(self.client.get(self.url, {"fields": "id,secret"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"expand": "brand"}).status_code, 400)
+
+    def test_spaced_and_empty_parameters_keep_the_discount_prefetch(self):
+        for params in [{"fields": "id, discounts"}, {"fields": ""}, {"expand": " discounts"}, {"fields": "id,discounts", "expand": "discounts "}]:
+            with CaptureQueriesContext(connection) as queries:
+                rows = self.client.get(self.url, params).data["results"]
+            self.assertEqual(len(rows[0]["discounts"]), 1, params)
+            # one query for the active discounts of the whole page, none per product
+            self.assertLessEqual(len(queries), 3, params)
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ProductRowsParityTests(TempMediaMixin, ProductListFixture, APITestCase):
+    """The values() rows must render exactly like ProductListSerializer."""
+
+    def setUp(self):
+        super().setUp()
+        blob = images.store_image(png_bytes())
+        Product.objects.filter(pk=self.products[0].pk).update(
+            photo_url="https://cdn.example.com/1.png", photo=blob, photo_source="https://cdn.example.com/1.png"
+        )
+        Product.objects.filter(pk=self.products[1].pk).update(price=None, weight=Decimal("0.5"))
+        refresh_current_prices([p.pk for p in self.products])
+
+    def both(self, url, params):
+        fast = self.client.get(url, params)
+        with override_settings(CATALOG_FAST_LISTS=False):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        return fast.content, slow.content
+
+    def test_rows_match_the_serializer(self):
+        for params in [{}, {"ordering": "-price"}, {"fields": "id,photo_url,weight"}, {"pagination": "keyset", "page_size": 4}]:
+            fast, slow = self.both(self.url, params)
+            self.assertEqual(fast, slow, params)
+        fast, slow = self.both(reverse("catalog:product-search"), {"q": "lean", "fields": "name"})
+        self.assertEqual(json.loads(fast), json.loads(slow))
+        self.assertEqual(set(json.loads(fast)[0]), {"name", "score"})
+
+    def test_orjson_renderer_matches_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from core.renderers import ORJSONRenderer
+
+        data = {
+            "price": Decimal("1.50"),
+            "when": timezone.now(),
+            "day": timezone.now().date(),
+            "text": "ąčę \u2028",
+            "nested": [{"a": None, "b": True, "c": 1.5}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = ORJSONRenderer().render(data, "application/json; indent=2")
+        self.assertEqual(indented, JSONRenderer().render(data, "application/json; indent=2"))
+
+
+class ModerationQueueTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="queue-user@example.com", password="pw123456")
+        self.moderator = User.objects.create_user(email="queue-mod@example.com", password="pw123456", role="moderator")
+        self.client.force_authenticate(user=self.moderator)
+        self.brand = Brand.objects.create(name="Queue Brand")
+        self.other_brand = Brand.objects.create(name="Other Queue Brand")
+        self.category = Category.objects.create(name="Queue Category")
+        self.store = Store.objects.create(brand=self.brand, address_line1="Queue st 1", city="Kaunas")
+        self.product = Product.objects.create(
+            brand=self.brand, category=self.category, name="Queue Bread", price=Decimal("2.00")
+        )
+        now = timezone.now()
+        self.discounts = [
+            Discount.objects.create(
+                name=f"Queue {i}",
+                discount_type=Discount.FIXED,
+                value=Decimal("0.50"),
+                target_type=Discount.TARGET_PRODUCT,
+                product=self.product,
+                submitted_by=self.user,
+                starts_at=now - timezone.timedelta(hours=1),
+                ends_at=now + timezone.timedelta(days=1),
+            )
+            for i in range(3)
+        ]
+        Discount.objects.create(
+            name="Other brand",
+            discount_type=Discount.PERCENTAGE,
+            value=Decimal("10"),
+            target_type=Discount.TARGET_BRAND,
+            brand=self.other_brand,
+            submitted_by=self.moderator,
+            starts_at=now,
+            ends_at=now + timezone.timedelta(days=1),
+        )
+        Report.objects.create(
+            discount=self.discounts[0], image=images.store_image(png_bytes()), description="Fake", reported_by=self.user
+        )
+        Report.objects.create(product=self.product, product_reason=Report.PRODUCT_REASON_PRICE, description="Price", reported_by=self.user)
+
+    def test_filters_and_keyset_pages(self):
+        mine = self.client.get("/api/catalog/discounts/moderation/", {"brand": self.brand.id, "submitter": self.user.id})
+        self.assertEqual(len(mine.data), 3)
+
+        first = self.client.get("/api/catalog/discounts/moderation/", {"pagination": "keyset", "page_size": 2})
+        self.assertEqual(len(first.data["results"]), 2)
+        second = self.client.get(
+            "/api/catalog/discounts/moderation/", {"cursor": first.data["next_cursor"], "page_size": 2}
+        )
+        self.assertEqual(len(second.data["results"]), 2)
+        self.assertIsNone(second.data["next_cursor"])
+
+        old = self.client.get(reverse("catalog:report-list"), {"min_age_hours": 1})
+        self.assertEqual(old.data, [])
+
+    def test_report_rows_link_the_thumbnail(self):
+        rows = self.client.get(reverse("catalog:report-list"), {"store": self.store.id}).data
+        self.assertEqual(rows, [])
+        rows = self.client.get(reverse("catalog:report-list"), {"brand": self.brand.id}).data
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(sorted(r["has_image"] for r in rows), [False, True])
+        self.assertEqual(sum(r["thumbnail_url"] is not None for r in rows), 1)
+
+    def test_bulk_approve_recomputes_prices_once(self):
+        ids = [d.id for d in self.discounts]
+        with mock.patch("catalog.pricing.refresh_current_prices", wraps=refresh_current_prices) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("catalog:discount-bulk"), {"ids": ids + [999999], "status": "approved"}, format="json"
+                )
+        self.assertEqual(response.data, {"updated": 3, "missing": [999999]})
+        refresh.assert_called_once()
+        self.assertEqual(ProductCurrentPrice.objects.get(product=self.product).effective_price, Decimal("1.50"))
+        self.assertEqual(Discount.objects.filter(status=Discount.DiscountStatus.APPROVED).count(), 3)
+
+        response = self.client.post(reverse("catalog:report-bulk"), {"ids": list(Report.objects.values_list("id", flat=True)), "status": "DENIED"}, format="json")
+        self.assertEqual(response.data["updated"], 2)
+
+    def test_bulk_requires_moderator(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse("catalog:discount-bulk"), {"ids": [1], "status": "approved"}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class ReportImageStoreTests(TempMediaMixin, TestCase):
+    def test_identical_images_share_one_blob_and_thumbnail(self):
+        data = png_bytes(size=(1200, 600))
+        first = images.store_image(data)
+        second = images.store_image(images.decode_base64("data:image/png;base64," + base64.b64encode(data).decode()))
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(first.pk, hashlib.sha256(data).hexdigest())
+        self.assertEqual((first.width, first.height, first.content_type), (1200, 600, "image/png"))
+        with first.thumbnail.open("rb") as fh:
+            thumb = Image.open(fh)
+            self.assertEqual((thumb.format, thumb.size), ("WEBP", (320, 320)))
+
+        with self.assertRaises(images.InvalidImage):
+            images.store_image(b"GIF89a broken")
+        with self.assertRaises(images.InvalidImage):
+            images.decode_base64("%%%")
+
+    def test_thumbnail_format_defaults_to_webp_without_the_setting(self):
+        with self.settings():
+            del settings.IMAGE_THUMBNAIL_FORMAT
+            blob = images.store_image(png_bytes())
+        self.assertTrue(blob.thumbnail.name.endswith(".webp"))
+
+    def test_images_are_streamed_with_immutable_cache_headers(self):
+        blob = images.store_image(png_bytes())
+        url = reverse("catalog:image", args=[blob.pk])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "image/png")
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertEqual(b"".join(res.streaming_content), png_bytes())
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 304)
+        thumb = self.client.get(reverse("catalog:image-thumbnail", args=[blob.pk]))
+        self.assertEqual(thumb["Content-Type"], "image/webp")
+        self.assertEqual(self.client.get(reverse("catalog:image", args=["0" * 64])).status_code, 404)
+
+        blob.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 404)
+
+
+class PhotoServer(ThreadingHTTPServer):
+    """Local stand-in for a retailer CDN: serves ``files`` and counts requests per path."""
+
+    def __init__(self, files):
+        self.files = files
+        self.hits = Counter()
+        super().__init__(("127.0.0.1", 0), PhotoHandler)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class PhotoHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits[self.path] += 1
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProductPhotoMirrorTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        self.server = PhotoServer({"/milk.png": png_bytes("white"), "/bad.png": b"<html>oops</html>"})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        brand = Brand.objects.create(name="Photo Brand")
+        category = Category.objects.create(name="Photo Category")
+        self.products = [
+            Product.objects.create(brand=brand, category=category, name=name, price=Decimal("1.00"), photo_url=url)
+            for name, url in [
+                ("Milk 1 l", self.server.url("/milk.png")),
+                ("Milk 1 l again", self.server.url("/milk.png")),
+                ("Missing", self.server.url("/gone.png")),
+                ("Broken", self.server.url("/bad.png")),
+            ]
+        ]
+
+    def test_photos_are_mirrored_once_and_served_locally(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("mirror_product_photos", workers=3, stdout=out, stderr=err)
+        self.assertIn("Mirrored 1/3 photos for 2 products", out.getvalue())
+        self.assertIn("/gone.png", err.getvalue())
+        self.assertEqual(self.server.hits["/milk.png"], 1)
+
+        sha = hashlib.sha256(png_bytes("white")).hexdigest()
+        milk = self.client.get(reverse("catalog:product-detail", args=[self.products[0].pk])).data
+        self.assertEqual(milk["photo_url"], self.server.url("/milk.png"))
+        self.assertTrue(milk["photo_display_url"].endswith(f"/api/catalog/images/{sha}/"))
+        self.assertTrue(milk["photo_thumbnail_url"].endswith(f"/api/catalog/images/{sha}/thumbnail/"))
+        missing = self.client.get(reverse("catalog:product-detail", args=[self.products[2].pk])).data
+        self.assertEqual(missing["photo_display_url"], self.server.url("/gone.png"))
+
+        call_command("mirror_product_photos", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.server.hits["/milk.png"], 1)
+
+    def test_changed_photo_url_falls_back_until_mirrored_again(self):
+        call_command("mirror_product_photos", stdout=io.StringIO(), stderr=io.StringIO())
+        product = self.products[0]
+        product.photo_url = self.server.url("/bad.png")
+        product.save()
+        data = self.client.get(reverse("catalog:product-detail", args=[product.pk])).data
+        self.assertEqual(data["photo_display_url"], self.server.url("/bad.png"))
+        self.assertEqual(photos.pending_photos().filter(pk=product.pk).count(), 1)
+
+
+class MigrationTestMixin:
+    def migrate(self, target=None):
+        executor = MigrationExecutor(connection)
+        targets = [("catalog", target)] if target else executor.loader.graph.leaf_nodes("catalog")
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+
+class ReportImageMigrationTests(MigrationTestMixin, TempMediaMixin, TransactionTestCase):
+    def test_existing_base64_images_move_to_the_blob_store(self):
+        old = self.migrate("0023_moderation_queue_indexes")
+        brand = old.get_model("catalog", "Brand").objects.create(name="Migr")
+        category = old.get_model("catalog", "Category").objects.create(name="Migr")
+        product = old.get_model("catalog", "Product").objects.create(
+            brand=brand, category=category, name="Migr milk", price=Decimal("1.00")
+        )
+        now = timezone.now()
+        discount = old.get_model("catalog", "Discount").objects.create(
+            name="Migr", discount_type=Discount.FIXED, value=1, target_type=Discount.TARGET_PRODUCT,
+            product=product, starts_at=now, ends_at=now + timezone.timedelta(days=1),
+        )
+        OldReport = old.get_model("catalog", "Report")
+        encoded = base64.b64encode(png_bytes()).decode()
+        for value in (encoded, encoded, "bm90IGFuIGltYWdl"):
+            bad = OldReport.objects.create(discount=discount, discount_image_base64=value, description="Proof")
+
+        # the old column is dropped, so an unreadable image stops the migration instead of being lost
+        with self.assertRaisesMessage(ValueError, f"Reports {bad.pk} have a discount image that cannot be decoded"):
+            self.migrate()
+        self.assertNotIn(ImageBlob._meta.db_table, connection.introspection.table_names())
+        OldReport.objects.filter(pk=bad.pk).update(discount_image_base64="")
+
+        self.migrate()
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertEqual(
+            sorted(Report.objects.values_list("image_id", flat=True), key=str),
+            sorted([hashlib.sha256(png_bytes()).hexdigest()] * 2 + [None], key=str),
+        )
+
+
+class DiscountHistoryMigrationTests(MigrationTestMixin, TransactionTestCase):
+    def test_open_rows_get_the_discounted_price(self):
+        old = self.migrate("0027_product_matching")
+        brand = old.get_model("catalog", "Brand").objects.create(name="Migr")
+        category = old.get_model("catalog", "Category").objects.create(name="Migr")
+        product = old.get_model("catalog", "Product").objects.create(
+            brand=brand, category=category, name="Migr butter", price=Decimal("4.00")
+        )
+        now = timezone.now()
+        discount = old.get_model("catalog", "Discount").objects.create(
+            name="Migr", discount_type=Discount.PERCENTAGE, value=25, target_type=Discount.TARGET_PRODUCT,
+            product=product, starts_at=now, ends_at=now + timezone.timedelta(days=1),
+        )
+        History = old.get_model("catalog", "ProductDiscountHistory")
+        closed = History.objects.create(product=product, discount=discount, applied_price=Decimal("4.00"), removed_at=now)
+        History.objects.create(product=product, discount=discount, applied_price=Decimal("4.00"))
+
+        self.migrate()
+        self.assertEqual(ProductDiscountHistory.objects.get(removed_at__isnull=True).applied_price, Decimal("3.00"))
+        self.assertEqual(ProductDiscountHistory.objects.get(pk=closed.pk).applied_price, Decimal("4.00"))
+
+
+class ProductEffectivePriceFilterTests(APITestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(name="Savings Brand")
+        self.category = Category.objects.create(name="Savings Category")
+        now = timezone.now()
+        window = {"starts_at": now - timezone.timedelta(days=1), "ends_at": now + timezone.timedelta(days=1)}
+        self.cheap = Product.objects.create(brand=self.brand, category=self.category, name="Cheap", price=Decimal("3.00"))
+        self.deal = Product.objects.create(brand=self.brand, category=self.category, name="Deal", price=Decimal("10.00"))
+        self.small = Product.objects.create(brand=self.brand, category=self.category, name="Small", price=Decimal("5.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(
+                name="Half off", discount_type=Discount.PERCENTAGE, value=Decimal("50"),
+                target_type=Discount.TARGET_PRODUCT, product=self.deal,
+                status=Discount.DiscountStatus.APPROVED, **window,
+            )
+            Discount.objects.create(
+                name="Ten cents", discount_type=Discount.FIXED, value=Decimal("0.10"),
+                target_type=Discount.TARGET_PRODUCT, product=self.small,
+                status=Discount.DiscountStatus.APPROVED, **window,
+            )
+        self.url = "/api/catalog/products/"
+
+    def _ids(self, params):
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row["id"] for row in res.data["results"]]
+
+    def test_order_by_effective_price_and_saving(self):
+        self.assertEqual(self._ids({"ordering": "effective_price"}), [self.cheap.id, self.small.id, self.deal.id])
+        self.assertEqual(self._ids({"ordering": "-saving_percent"})[:2], [self.deal.id, self.small.id])
+
+    def test_filter_by_effective_price_and_saving(self):
+        self.assertEqual(set(self._ids({"max_effective_price": "5"})), {self.cheap.id, self.small.id, self.deal.id})
+        self.assertEqual(self._ids({"min_saving_percent": "10"}), [self.deal.id])
+        self.assertEqual(set(self._ids({"on_sale": "true"})), {self.deal.id, self.small.id})
+
+    def test_filters_match_rows_without_a_current_price_and_skip_expired_sales(self):
+        ProductCurrentPrice.objects.filter(product=self.cheap).delete()
+        ProductCurrentPrice.objects.filter(product=self.small).update(valid_until=timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(self._ids({"max_effective_price": "3", "ordering": "effective_price"}), [self.cheap.id])
+        self.assertEqual(self._ids({"on_sale": "true"}), [self.deal.id])
+        self.assertEqual(set(self._ids({"on_sale": "false"})), {self.cheap.id, self.small.id})
+
+    def test_annotations_are_serialized(self):
+        res = self.client.get(f"{self.url}{self.deal.id}/")
+        self.assertEqual(Decimal(res.data["effective_price"]), Decimal("5.00"))
+        self.assertEqual(Decimal(res.data["saving"]), Decimal("5.00"))
+        self.assertEqual(Decimal(res.data["saving_percent"]), Decimal("50.00"))
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.items = [
+            {"id": "1", "name": "Avokadai, 2 vnt", "category": "Vaisiai", "price": 2.49, "discount_price": 1.79,
+             "offer_start_date": "2025/10/20", "offer_end_date": "2025-10-26", "photo_url": "https://cdn.example/1"},
+            {"id": "2", "name": "Bulvės, 1 kg", "category": "Daržovės", "price": 0.89, "photo_url": "https://cdn.example/2"},
+            {"id": "3", "name": "No category", "category": "", "price": 1.00},
+            {"id": "4", "name": "No price", "category": "Vaisiai", "price": None},
+        ]
+
+    def _write(self, name, items, ndjson=False):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            if ndjson:
+                f.write("\n".join(json.dumps(item) for item in items))
+            else:
+                json.dump(items, f, ensure_ascii=False, indent=2)
+        return path
+
+    def test_streaming_parser_handles_small_reads_and_ndjson(self):
+        from . import feeds
+
+        path = self._write("feed.json", self.items)
+        with mock.patch.object(feeds, "READ_SIZE", 7):
+            self.assertEqual(list(feeds.iter_feed(path)), self.items)
+        self.assertEqual(list(feeds.iter_feed(self._write("feed.ndjson", self.items, ndjson=True))), self.items)
+
+    def test_parsed_feed_is_spooled_in_batches(self):
+        from . import feeds
+
+        items = [{"id": str(i), "name": f"Item {i}", "category": "Vaisiai", "price": 1} for i in range(5)]
+        parsed = feeds.parse_feed(self._write("feed.json", items + self.items[2:]), "Rimi", timezone.localtime(), batch_size=2)
+        self.assertEqual((parsed.records, sum(parsed.skipped.values())), (5, 2))
+        self.assertTrue(os.path.exists(parsed.spool))
+        # what crosses the process boundary carries no records
+        self.assertLess(len(pickle.dumps(parsed)), 1000)
+
+        spool = parsed.spool
+        self.assertEqual([len(batch) for batch in parsed.batches()], [2, 2, 1])
+        self.assertFalse(os.path.exists(spool))
+        self.assertEqual(list(parsed.iter_records()), [])
+
+    def test_import_upserts_and_reports_summary(self):
+        path = self._write("feed.json", self.items)
+        out = io.StringIO()
+        call_command("import_products", path, "Rimi", "--chunk-size", "1", stdout=out)
+        self.assertIn("2 created, 0 updated, 2 skipped, 1 discounts", out.getvalue())
+        self.assertEqual(out.getvalue().count("\n"), 1)
+
+        product = Product.objects.get(external_id="1")
+        discount = product.discount_rules.get()
+        self.assertEqual(discount.value, Decimal("0.70"))
+        self.assertEqual(discount.status, Discount.DiscountStatus.APPROVED)
+        self.assertEqual(timezone.localtime(discount.ends_at).date().isoformat(), "2025-10-26")
+        self.assertTrue(ProductSearchTerm.objects.filter(product=product).exists())
+
+        self.items[1]["price"] = 0.99
+        out = io.StringIO()
+        call_command("import_products", self._write("feed2.json", self.items), "Rimi", stdout=out)
+        self.assertIn("0 created, 2 updated", out.getvalue())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Discount.objects.count(), 1)
+        self.assertEqual(Product.objects.get(external_id="2").price, Decimal("0.99"))
+        self.assertEqual(ProductCurrentPrice.objects.get(product__external_id="2").effective_price, Decimal("0.99"))
+
+    def test_manifest_imports_feeds_in_parallel(self):
+        self._write("rimi.json", self.items)
+        self._write("iki.ndjson", [{"id": "1", "name": "Pienas", "category": "Pienas", "price": 1.19}], ndjson=True)
+        manifest = self._write("manifest.json", [
+            {"file": "rimi.json", "brand": "Rimi"},
+            {"file": "iki.ndjson", "brand": "IKI"},
+        ])
+        out = io.StringIO()
+        call_command("import_products", "--manifest", manifest, "--workers", "2", stdout=out)
+        self.assertIn("Rimi (rimi.json): 2 rows, 2 created", out.getvalue())
+        self.assertIn("IKI (iki.ndjson): 1 rows, 1 created", out.getvalue())
+        self.assertIn("Imported 2 feeds, 3 rows", out.getvalue())
+        self.assertEqual(Product.objects.filter(brand__name="IKI", external_id="1").count(), 1)
+        self.assertEqual(Product.objects.filter(brand__name="Rimi").count(), 2)
+
+    def test_delta_import_skips_unchanged_and_handles_missing(self):
+        call_command("import_products", self._write("feed.json", self.items), "Rimi", stdout=io.StringIO())
+        untouched = Product.objects.get(external_id="1")
+        manual = Product.objects.create(name="Rankinis", price=Decimal("3.00"), brand=untouched.brand, category=untouched.category)
+        with self.captureOnCommitCallbacks(execute=True):
+            manual_discount = Discount.objects.create(
+                product=manual, discount_type=Discount.FIXED, value=Decimal("1.00"), status=Discount.DiscountStatus.APPROVED,
+                starts_at=timezone.now() - timezone.timedelta(days=1), ends_at=timezone.now() + timezone.timedelta(days=3),
+            )
+
+        self.items[1]["price"] = 0.99
+        feed = [self.items[1]]
+        out = io.StringIO()
+        call_command(
+            "import_products", self._write("feed2.json", feed), "Rimi",
+            "--delta", "--mark-missing-stale", "--end-missing-discounts", stdout=out,
+        )
+        self.assertIn("1 rows, 0 created, 1 updated", out.getvalue())
+        self.assertIn("1 missing", out.getvalue())
+
+        missing = Product.objects.get(external_id="1")
+        self.assertIsNotNone(missing.stale_since)
+        self.assertLessEqual(missing.discount_rules.get().ends_at, timezone.now())
+        self.assertEqual(Product.objects.get(external_id="2").price, Decimal("0.99"))
+        # products entered by hand are not in any feed
+        manual.refresh_from_db()
+        manual_discount.refresh_from_db()
+        self.assertIsNone(manual.stale_since)
+        self.assertGreater(manual_discount.ends_at, timezone.now())
+
+        unchanged_at = Product.objects.get(external_id="2").updated_at
+        out = io.StringIO()
+        call_command("import_products", self._write("feed3.json", self.items), "Rimi", "--delta", stdout=out)
+        self.assertIn("1 rows, 0 created, 1 updated", out.getvalue())
+        self.assertIn("1 unchanged", out.getvalue())
+        self.assertIsNone(Product.objects.get(external_id="1").stale_since)
+        self.assertEqual(Product.objects.get(external_id="2").updated_at, unchanged_at)
+        self.assertNotEqual(untouched.content_hash, "")
+
+    def test_delta_import_renews_defaulted_windows_and_their_prices(self):
+        feed = self._write("feed.json", [{"id": "5", "name": "Sūris", "category": "Pienas", "price": 4.00, "discount_price": 3.00}])
+        call_command("import_products", feed, "Rimi", "--delta", stdout=io.StringIO())
+        product = Product.objects.get(external_id="5")
+        self.assertEqual(ProductCurrentPrice.objects.get(product=product).effective_price, Decimal("3.00"))
+        # nothing to renew: cached responses stay valid
+        with mock.patch.object(caching, "bump") as bump:
+            call_command("import_products", feed, "Rimi", "--delta", stdout=io.StringIO())
+        bump.assert_not_called()
+
+        Discount.objects.filter(product=product).update(ends_at=timezone.now() - timezone.timedelta(minutes=1))
+        refresh_current_prices([product.pk])
+        self.assertEqual(ProductCurrentPrice.objects.get(product=product).effective_price, Decimal("4.00"))
+
+        out = io.StringIO()
+        with mock.patch.object(caching, "bump") as bump:
+            call_command("import_products", feed, "Rimi", "--delta", stdout=out)
+        bump.assert_any_call("discount")
+        self.assertIn("1 unchanged", out.getvalue())
+        self.assertGreater(product.discount_rules.get().ends_at, timezone.now() + timezone.timedelta(days=6))
+        self.assertEqual(ProductCurrentPrice.objects.get(product=product).effective_price, Decimal("3.00"))
+        self.assertTrue(ProductDiscountHistory.objects.filter(product=product, removed_at__isnull=True).exists())
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class AsyncCatalogViewTests(ProductListFixture, APITestCase):
+    """The async read views answer exactly like the sync routes they shadow."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        claims_cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(email="async@example.com", password="pw123456")
+        self.token = make_token(self.user)
+        Store.objects.create(brand=self.products[0].brand, address_line1="Gedimino 1", city="Vilnius")
+        WishlistItem.objects.create(user=self.user, product=self.products[0])
+        self.cart = ShoppingCart.objects.create(user=self.user, name="Async")
+        ShoppingCartItem.objects.create(shopping_cart=self.cart, product=self.products[1], quantity=2)
+        refresh_current_prices([p.pk for p in self.products])
+
+    async def call(self, view_class, path, params=None, method="get", token=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = getattr(self.factory, method)(path, params or {}, headers=headers)
+        return await view_class.as_endpoint()(request, **kwargs)
+
+    def sync_get(self, path, params=None, token=None):
+        client = self.client_class()
+        if token:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client.get(path, params or {})
+
+    async def assert_same(self, view_class, path, params=None, token=None, **kwargs):
+        response = await self.call(view_class, path, params, token=token, **kwargs)
+        expected = await sync_to_async(self.sync_get)(path, params, token)
+        self.assertEqual(response.status_code, expected.status_code, params)
+        self.assertEqual(response.content, expected.content, params)
+
+    async def test_public_reads_match_the_sync_views(self):
+        products = "/api/catalog/products/"
+        for params in [{}, {"page_size": 4, "page": 2}, {"ordering": "-name", "fields": "id,name,discounts"}, {"page": 9}]:
+            await self.assert_same(async_views.ProductListView, products, params)
+        # DRF's last_page_strings and invalid page numbers
+        for params in [{"page": "last", "page_size": 4}, {"page": "last"}, {"page": "0"}, {"page": "x"}]:
+            await self.assert_same(async_views.ProductListView, products, params)
+        for params in [{"q": "lean", "page_size": 2}, {"q": "lean", "fields": "id"}, {}]:
+            await self.assert_same(async_views.ProductSearchView, "/api/catalog/products/search/", params)
+        await self.assert_same(async_views.BrandListView, "/api/catalog/brands/")
+        await self.assert_same(async_views.CategoryListView, "/api/catalog/categories/")
+        await self.assert_same(async_views.StoreListView, "/api/catalog/stores/")
+        response = await self.call(async_views.ProductListView, products, {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_user_reads_require_a_token(self):
+        wishlist, cart = "/api/catalog/user/wishlist/", f"/api/catalog/shopping-carts/{self.cart.pk}/"
+        await self.assert_same(async_views.WishlistView, wishlist, token=self.token)
+        await self.assert_same(async_views.ShoppingCartView, cart, token=self.token, pk=self.cart.pk)
+        self.assertEqual((await self.call(async_views.WishlistView, wishlist)).status_code, 403)
+        self.assertEqual((await self.call(async_views.WishlistView, wishlist, token="junk")).status_code, 403)
+        other = await sync_to_async(User.objects.create_user)(email="other@example.com", password="pw123456")
+        missing = await self.call(
+            async_views.ShoppingCartView, cart, token=make_token(other), pk=self.cart.pk
+        )
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_other_requests_fall_back_to_the_sync_view(self):
+        products = "/api/catalog/products/"
+        await self.assert_same(async_views.ProductListView, products, {"expand": "discounts"})
+        await self.assert_same(async_views.ProductListView, products, {"pagination": "keyset", "page_size": 2})
+        # the fallback still authenticates and checks permissions itself
+        response = await self.call(async_views.ProductListView, products, {"name": "x"}, method="post")
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_and_sync_views_share_cached_responses(self):
+        products = "/api/catalog/products/"
+        with override_settings(CATALOG_CACHE_ENABLED=True):
+            first = await self.call(async_views.ProductListView, products, {"page_size": 3})
+            second = await sync_to_async(self.sync_get)(products, {"page_size": 3})
+            revalidated = await self.call(
+                async_views.ProductListView, products, {"page_size": 3}, headers={"If-None-Match": first["ETag"]}
+            )
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+
+class ProductMatchingTests(APITestCase):
+    def setUp(self):
+        self.dairy = Category.objects.create(name="Dairy")
+        chains = [Brand.objects.create(name=name) for name in ("Rimi", "Maxima", "IKI")]
+        self.rimi, self.maxima, self.iki = chains
+
+        def product(brand, name, price):
+            return Product.objects.create(brand=brand, category=self.dairy, name=name, price=Decimal(price))
+
+        self.yoghurts = [
+            product(self.rimi, "Braškių jogurt. gėrimas ACTIMEL, 1,5%, 4x100g", "2.59"),
+            product(self.maxima, "Jogurtinis gėrimas ACTIMEL braškių 1,5% 400 g", "2.39"),
+            product(self.iki, "ACTIMEL braškių jogurtinis gėrimas 1.5 % 4 x 100 g", "2.79"),
+        ]
+        self.bigger = product(self.maxima, "Jogurtinis gėrimas ACTIMEL braškių 1,5% 6x100g", "3.49")
+        self.product = product
+        self.unrelated = product(self.iki, "Varškės sūrelis MAGIJA 400 g", "0.99")
+
+    def cluster_of(self, product):
+        return ProductMatchKey.objects.get(product=product).cluster_id
+
+    def test_parse_size(self):
+        cases = {
+            "Pomidorų padažas PONAS POMIDORAS, 500g": ("g", Decimal("500")),
+            "Migdolų gėrimas ICA, 1l": ("ml", Decimal("1000")),
+            "Sultys 1,5 l": ("ml", Decimal("1500")),
+            "Indaplovių druska FINISH SALT, 4kg": ("g", Decimal("4000")),
+            "Šluostės SPONTEX Top Tex 3 vnt 15,5x18,5": ("pcs", Decimal("3")),
+            "Lankstus kibiras": ("", None),
+        }
+        for name, expected in cases.items():
+            self.assertEqual(matching.parse_size(name)[:2], expected, name)
+        self.assertEqual(matching.match_key(1, "ACTIMEL, 4x100g", 1, None, timezone.now()).name, "actimel")
+
+    def test_matches_same_item_across_chains(self):
+        # as on MySQL, where bulk inserts return no ids
+        with mock.patch.object(type(connection.features), "can_return_rows_from_bulk_insert", False):
+            result = matching.match_products()
+        self.assertEqual(result.products, 5)
+        cluster = self.cluster_of(self.yoghurts[0])
+        self.assertIsNotNone(cluster)
+        self.assertEqual([self.cluster_of(p) for p in self.yoghurts], [cluster] * 3)
+        self.assertIsNone(self.cluster_of(self.bigger))
+        self.assertIsNone(self.cluster_of(self.unrelated))
+
+        url = reverse("catalog:product-compare", args=[self.yoghurts[0].pk])
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).data
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data["match"], cluster)
+        offers = data["offers"]
+        self.assertEqual([o["id"] for o in offers], [self.yoghurts[1].pk, self.yoghurts[0].pk, self.yoghurts[2].pk])
+        self.assertEqual((offers[0]["brand_name"], offers[0]["unit_price"], offers[0]["unit"]), ("Maxima", Decimal("5.98"), "kg"))
+
+        lone = self.client.get(reverse("catalog:product-compare", args=[self.unrelated.pk])).data
+        self.assertEqual((lone["match"], len(lone["offers"])), (None, 1))
+        self.assertEqual(self.client.get(reverse("catalog:product-compare", args=[999999])).status_code, 404)
+
+    def test_runs_are_incremental(self):
+        matching.match_products()
+        self.assertEqual(matching.match_products().products, 0)
+
+        self.yoghurts[2].name = "Kefyras ROKIŠKIO 400 g"
+        self.yoghurts[2].save()
+        result = matching.match_products()
+        # the block it left and the one it joined
+        self.assertEqual((result.products, result.blocks), (1, 2))
+        self.assertIsNone(self.cluster_of(self.yoghurts[2]))
+        self.assertEqual(self.cluster_of(self.yoghurts[0]), self.cluster_of(self.yoghurts[1]))
+
+        # the last chain leaving dissolves the cluster
+        self.yoghurts[1].name = "Pienas DVARO 400 ml"
+        self.yoghurts[1].save()
+        out = io.StringIO()
+        call_command("match_products", stdout=out)
+        self.assertIn("Keyed 1 products", out.getvalue())
+        self.assertFalse(ProductMatch.objects.exists())
+        self.assertIsNone(self.cluster_of(self.yoghurts[0]))
+
+    def test_longer_names_and_other_numbers_do_not_match(self):
+        pairs = [
+            ("Jogurtas 400 g", "Jogurtas su braškėmis 400 g"),
+            ("Kava 500 g", "Kava pupelėse LAVAZZA ORO 500 g"),
+            ("Pienas 2,5% 1 l", "Pienas 3,5% 1 l"),
+        ]
+        for rimi, maxima in pairs:
+            self.product(self.rimi, rimi, "1.00")
+            self.product(self.maxima, maxima, "1.00")
+        matching.match_products()
+        self.assertEqual(
+            sorted(ProductMatchKey.objects.filter(cluster__isnull=False).values_list("product_id", flat=True)),
+            [p.pk for p in self.yoghurts],
+        )
+
+    def test_clusters_are_complete_linkage_and_a_leaver_reopens_its_cluster(self):
+        # two Maxima candidates for the Rimi item: only one fits a cluster
+        twin = self.product(self.maxima, "ACTIMEL braškių jogurtinis gėrimas 1,5% 4x100g", "2.49")
+        matching.match_products()
+        cluster = self.cluster_of(self.yoghurts[0])
+        self.assertEqual(
+            sorted(ProductMatchKey.objects.filter(cluster_id=cluster).values_list("product__brand__name", flat=True)),
+            ["IKI", "Maxima", "Rimi"],
+        )
+        member = self.yoghurts[1] if self.cluster_of(self.yoghurts[1]) == cluster else twin
+        other = twin if member is self.yoghurts[1] else self.yoghurts[1]
+        self.assertIsNone(self.cluster_of(other))
+
+        # the Maxima member changes: the remaining members take the other one in
+        member.name = "Pienas DVARO 400 ml"
+        member.save()
+        matching.match_products()
+        self.assertIsNone(self.cluster_of(member))
+        self.assertEqual(self.cluster_of(other), self.cluster_of(self.yoghurts[0]))
+        self.assertEqual(self.cluster_of(self.yoghurts[2]), self.cluster_of(self.yoghurts[0]))
+
+
+class CartOptimizeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="optimizer@example.com", password="pw123456")
+        self.client.force_authenticate(user=self.user)
+        dairy = Category.objects.create(name="Dairy")
+        self.rimi, self.maxima, self.iki = (Brand.objects.create(name=name) for name in ("Rimi", "Maxima", "IKI"))
+
+        def product(brand, name, price):
+            return Product.objects.create(brand=brand, category=dairy, name=name, price=Decimal(price))
+
+        self.yoghurt = product(self.rimi, "Jogurtinis gėrimas ACTIMEL braškių, 4x100g", "2.59")
+        self.maxima_yoghurt = product(self.maxima, "ACTIMEL braškių jogurtinis gėrimas 400 g", "2.39")
+        product(self.iki, "Jogurtinis gėrimas ACTIMEL braškių 4 x 100 g", "2.79")
+        self.milk = product(self.rimi, "Pienas DVARO 2,5 %, 1 l", "1.00")
+        self.iki_milk = product(self.iki, "DVARO pienas 2,5 % 1l", "0.80")
+        self.bread = product(self.rimi, "Juoda duona VILNIAUS, 800 g", "1.50")
+        matching.match_products()
+
+        self.cart = ShoppingCart.objects.create(user=self.user)
+        for item, quantity in ((self.yoghurt, 2), (self.milk, 1), (self.bread, 1)):
+            ShoppingCartItem.objects.create(shopping_cart=self.cart, product=item, quantity=quantity)
+        self.url = reverse("catalog:shopping-carts-optimize", args=[self.cart.pk])
+
+    def test_totals_per_chain_and_best_split(self):
+        data = self.client.get(self.url).data
+        self.assertEqual(data["current_total"], Decimal("7.68"))
+        chains = [(row["brand_name"], row["total"], row["missing"]) for row in data["chains"]]
+        self.assertEqual(chains, [
+            ("Rimi", Decimal("7.68"), []),
+            ("IKI", Decimal("6.38"), [self.bread.pk]),
+            ("Maxima", Decimal("4.78"), [self.milk.pk, self.bread.pk]),
+        ])
+        self.assertEqual((data["split"]["brands"], data["split"]["saving"]), ([self.rimi.pk], Decimal("0")))
+
+        split = self.client.get(self.url, {"k": 2}).data["split"]
+        self.assertEqual(sorted(split["brands"]), sorted([self.rimi.pk, self.maxima.pk]))
+        self.assertEqual((split["total"], split["saving"], split["missing"]), (Decimal("7.28"), Decimal("0.40"), []))
+        yoghurt = split["items"][0]
+        self.assertEqual((yoghurt["buy"], yoghurt["total"], yoghurt["substituted"]), (self.maxima_yoghurt.pk, Decimal("4.78"), True))
+
+        split = self.client.get(self.url, {"k": 3}).data["split"]
+        self.assertEqual(split["total"], Decimal("7.08"))
+        self.assertEqual([item["buy"] for item in split["items"]], [self.maxima_yoghurt.pk, self.iki_milk.pk, self.bread.pk])
+
+    def test_purchased_items_and_invalid_k(self):
+        ShoppingCartItem.objects.filter(product=self.bread).update(is_purchased=True)
+        data = self.client.get(self.url).data
+        self.assertEqual((data["split"]["brands"], data["split"]["total"]), ([self.rimi.pk], Decimal("6.18")))
+        for k in ("0", "4", "two"):
+            self.assertEqual(self.client.get(self.url, {"k": k}).status_code, 400, k)
+        other = User.objects.create_user(email="someone@example.com", password="pw123456")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(CATALOG_CACHE_ENABLED=True)
+    def test_cached_per_cart_contents_and_prices(self):
+        with CaptureQueriesContext(connection) as miss:
+            self.client.get(self.url, {"k": 2})
+        with CaptureQueriesContext(connection) as hit:
+            self.client.get(self.url, {"k": 2})
+        self.assertEqual(len(hit), len(miss) - 1)
+
+        ShoppingCartItem.objects.filter(product=self.yoghurt).update(quantity=1)
+        self.assertEqual(self.client.get(self.url, {"k": 2}).data["split"]["total"], Decimal("4.89"))
+        self.maxima_yoghurt.price = Decimal("1.99")
+        self.maxima_yoghurt.save()
+        self.assertEqual(self.client.get(self.url, {"k": 2}).data["split"]["total"], Decimal("4.49"))
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in: accepts every message and keeps ``(recipients, body)``."""
+
+    daemon_threads = True
+
+    def __init__(self, reject=()):
+        self.messages = []
+        self.reject = set(reject)
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+
+    def settings(self):
+        return override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.server_address[1],
+            EMAIL_USE_TLS=False,
+        )
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 stand-in")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 bye")
+                return
+            if command in ("EHLO", "HELO"):
+                self.reply("250 stand-in")
+            elif command == "RCPT":
+                address = line.partition(":")[2].strip("<> ")
+                if address in self.server.reject:
+                    self.reply("550 no such user")
+                    continue
+                recipients.append(address)
+                self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                body = []
+                for raw in iter(self.rfile.readline, b""):
+                    if raw in (b".\r\n", b".\n"):
+                        break
+                    body.append(raw.decode())
+                self.server.messages.append((recipients, "".join(body)))
+                recipients = []
+                self.reply("250 queued")
+            else:  # MAIL, RSET, NOOP
+                recipients = [] if command == "RSET" else recipients
+                self.reply("250 ok")
+
+
+class PriceAlertTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="alert@example.com", password="pw123456", name="Alert")
+        self.client.force_authenticate(user=self.user)
+        brand = Brand.objects.create(name="Alert Brand")
+        self.category = Category.objects.create(name="Alert Category")
+        self.product = Product.objects.create(brand=brand, category=self.category, name="Coffee", price=Decimal("10.00"))
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        self.url = reverse("catalog:price-alerts-list")
+
+    def discount(self, value):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Discount.objects.create(
+                name=f"-{value}%", discount_type=Discount.PERCENTAGE, value=Decimal(value),
+                target_type=Discount.TARGET_CATEGORY, category=self.category, status=Discount.DiscountStatus.APPROVED,
+                starts_at=now - timezone.timedelta(hours=1), ends_at=now + timezone.timedelta(days=1),
+            )
+
+    def test_alerts_fire_once_per_drop_and_rearm(self):
+        res = self.client.post(self.url, {"product": self.product.pk, "threshold": "8.50"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.client.post(self.url, {"product": self.product.pk, "kind": "any_discount"}, format="json")
+        self.assertFalse(AlertNotification.objects.exists())
+
+        first = self.discount(10)
+        self.assertEqual(list(AlertNotification.objects.values_list("alert__kind", "price")), [("any_discount", Decimal("9.00"))])
+        second = self.discount(20)
+        self.assertEqual(
+            sorted(AlertNotification.objects.values_list("alert__kind", "price")),
+            [("any_discount", Decimal("8.00")), ("any_discount", Decimal("9.00")), ("target_price", Decimal("8.00"))],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(AlertNotification.objects.count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(PriceAlert.objects.filter(notified_price__isnull=False).exists())
+        self.discount(20)
+        self.assertEqual(AlertNotification.objects.count(), 5)
+
+    def test_matching_reads_only_the_changed_products(self):
+        others = [
+            Product.objects.create(brand=self.product.brand, category=self.category, name=f"Tea {i}", price=Decimal("4.00"))
+            for i in range(5)
+        ]
+        for i, product in enumerate(others):
+            user = User.objects.create_user(email=f"alert{i}@example.com", password="pw123456")
+            PriceAlert.objects.create(user=user, product=product, threshold=Decimal("5.00"))
+        with CaptureQueriesContext(connection) as queries:
+            fired = alerts.match_price_alerts({p.pk: (p.price, None) for p in others})
+        # read matching alerts, insert notifications, mark them notified
+        self.assertEqual((fired, len(queries)), (5, 3))
+        self.assertIn("product_id", queries[0]["sql"])
+
+    def test_alerts_need_a_wishlisted_product_and_go_with_it(self):
+        other = Product.objects.create(brand=self.product.brand, category=self.category, name="Tea", price=Decimal("3.00"))
+        res = self.client.post(self.url, {"product": other.pk, "threshold": "2.00"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(self.url, {"product": self.product.pk}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(self.url, {"product": self.product.pk, "threshold": "20.00"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # the current price already matches
+        self.assertEqual(AlertNotification.objects.count(), 1)
+
+        # also when the product has no price row yet
+        tea = Product.objects.create(brand=self.product.brand, category=self.category, name="Tea", price=Decimal("3.00"))
+        WishlistItem.objects.create(user=self.user, product=tea)
+        ProductCurrentPrice.objects.filter(product=tea).delete()
+        res = self.client.post(self.url, {"product": tea.pk, "threshold": "4.00"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(AlertNotification.objects.filter(alert__product=tea).count(), 1)
+        self.client.delete(reverse("catalog:wishlist-destroy", kwargs={"product_id": self.product.pk}))
+        self.assertFalse(PriceAlert.objects.filter(product=self.product).exists())
+
+    def test_outbox_is_delivered_over_smtp_in_batches(self):
+        server = SMTPServer(reject=["bounce@example.com"])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        bounce = User.objects.create_user(email="bounce@example.com", password="pw123456")
+        tea = Product.objects.create(brand=self.product.brand, category=self.category, name="Tea", price=Decimal("3.00"))
+        for user, product in [(self.user, self.product), (self.user, tea), (bounce, tea)]:
+            WishlistItem.objects.get_or_create(user=user, product=product)
+            PriceAlert.objects.create(user=user, product=product, kind=PriceAlert.Kind.ANY_DISCOUNT)
+        self.discount(10)
+        self.assertEqual(AlertNotification.objects.count(), 3)
+
+        with server.settings():
+            out, err = io.StringIO(), io.StringIO()
+            call_command("send_price_alerts", "--once", stdout=out, stderr=err)
+        self.assertIn("Sent 2 notifications, 1 failed", out.getvalue())
+        self.assertEqual(len(server.messages), 1)
+        recipients, body = server.messages[0]
+        self.assertEqual(recipients, ["alert@example.com"])
+        self.assertIn("Coffee: 9.00 EUR (was 10.00 EUR)", body)
+        self.assertIn("Tea: 2.70 EUR", body)
+
+        failed = AlertNotification.objects.get(sent_at__isnull=True)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("bounce@example.com", failed.last_error)
+        with server.settings(), override_settings(PRICE_ALERT_MAX_ATTEMPTS=1):
+            self.assertEqual(alerts.deliver_pending(), (0, 0))
+
+        # switched off after firing: not sent
+        PriceAlert.objects.filter(pk=failed.alert_id).update(is_active=False)
+        with server.settings():
+            self.assertEqual(alerts.deliver_pending(), (0, 0))
+        self.assertEqual(len(server.messages), 1)
+
+
+class LoadTestCommandTests(TestCase):
+    def setUp(self):
+        self.server = PhotoServer({"/ok": b"{}"})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_reports_each_target(self):
+        result = loadtest.run_load("stub", self.server.url(""), ["/ok", "/missing"], concurrency=3, total=20)
+        self.assertEqual(result.requests, 20)
+        self.assertEqual(result.errors, 10)
+        self.assertEqual(self.server.hits, Counter({"/ok": 10, "/missing": 10}))
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+
+        out = io.StringIO()
+        call_command("load_test", "/ok", "--target", f"a={self.server.url('')}", "--requests", "5", stdout=out)
+        self.assertRegex(out.getvalue().splitlines()[1], r"^a\s+5\s+0\s")
+
+
+class EndpointBenchmarkTests(TempMediaMixin, TestCase):
+    def test_run_measures_endpoints_and_compare_flags_regressions(self):
+        data = benchmark.seed(products=200, brands=2, stores_per_brand=2, categories=4)
+        results = benchmark.run(data, repeat=1, only=["products-list", "shopping-carts-detail", "users-user"])
+        self.assertEqual([r.status for r in results], [200, 200, 200])
+        self.assertTrue(all(r.peak_kb > 0 for r in results))
+        self.assertGreater(results[0].queries, 0)
+
+        paths = benchmark.serialization_paths(page_size=20, repeat=1)
+        self.assertEqual([r.name for r in paths], [
+            "products-page-serializer+json", "products-page-serializer+orjson", "products-page-rows+orjson",
+        ])
+
+        self.assertTrue(all(r.bytes > 0 for r in results + paths))
+
+        baseline = {r.name: r.as_dict() for r in results}
+        # timings are reported, never compared
+        baseline["users-user"]["ms"] /= 100
+        self.assertEqual(benchmark.compare(results, baseline), [])
+        baseline["products-list"]["queries"] -= 1
+        baseline["shopping-carts-detail"]["bytes"] //= 2
+        problems = benchmark.compare(results, baseline)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(problems[0].startswith("products-list:"))
+        self.assertTrue(problems[1].startswith("shopping-carts-detail:"))
+        self.assertIn("x ref", benchmark.format_table(results, baseline, reference="users-user"))
+
+        merged = benchmark.merge_baseline(results, baseline)
+        self.assertEqual(merged["users-user"], baseline["users-user"])
+        self.assertEqual(merged["products-list"], results[0].as_dict())
+        self.assertEqual(merged["shopping-carts-detail"], results[1].as_dict())
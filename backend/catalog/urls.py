@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
+from .images import serve_image
 from .views import (
     BrandViewSet,
     CategoryViewSet,
@@ -14,9 +17,12 @@ from .views import (
     ReportCreateView,
     ReportModerationListView,
     ReportModerationDetailView,
+    ReportModerationBulkView,
     DiscountModerationListView,
     DiscountModerationDetailView,
+    DiscountModerationBulkView,
     ShoppingCartViewSet,
+    PriceAlertViewSet,
 )
 
 app_name = "catalog"
@@ -29,6 +35,7 @@ router.register(r"products", ProductViewSet)
 router.register(r"discounts", DiscountViewSet)
 router.register(r"product-discount-history", ProductDiscountHistoryViewSet, basename="product-discount-history")
 router.register(r"shopping-carts", ShoppingCartViewSet, basename="shopping-carts")
+router.register(r"user/price-alerts", PriceAlertViewSet, basename="price-alerts")
 
 urlpatterns = [
     # ... your other url patterns
@@ -39,9 +46,18 @@ urlpatterns = [
     path('reports/', ReportCreateView.as_view(), name='report-create'),  # POST by authenticated users
     path('reports/moderation/', ReportModerationListView.as_view(), name='report-list'),  # GET by moderators/admins
     path('reports/moderation/<int:pk>/', ReportModerationDetailView.as_view(), name='report-detail'),  # GET/PATCH by moderators/admins
+    path('reports/moderation/bulk/', ReportModerationBulkView.as_view(), name='report-bulk'),  # POST by moderators/admins
+    # Report images, content-addressed
+    path('images/<str:sha256>/', serve_image, name='image'),
+    path('images/<str:sha256>/thumbnail/', serve_image, {'variant': 'thumbnail'}, name='image-thumbnail'),
     # Discounts moderation
     path('discounts/moderation/', DiscountModerationListView.as_view(), name='discount-list'),
     path('discounts/moderation/<int:pk>/', DiscountModerationDetailView.as_view(), name='discount-detail'),
+    path('discounts/moderation/bulk/', DiscountModerationBulkView.as_view(), name='discount-bulk'),
 ]
 
 urlpatterns += router.urls
+
+if settings.CATALOG_ASYNC_VIEWS:
+    # async JSON reads first; they hand everything else to the routes below
+    urlpatterns = async_views.urlpatterns() + urlpatterns
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
 from rest_framework import generics, permissions, viewsets, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse
 from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from fuzzywuzzy import process
 from rest_framework.decorators import action
 
 from .models import (
@@ -14,27 +19,41 @@ from .models import (
     ProductDiscountHistory,
     Store,
     WishlistItem,
+    PriceAlert,
     Report,
     ShoppingCart,
     ShoppingCartItem,
 )
-from .pagination import StandardResultsSetPagination
-from .filters import ProductFilter
+from .pagination import ModerationQueuePagination, ProductPagination
+from . import alerts, baskets, carts, caching, matching, search
+from .caching import CachedReadMixin
+from .rows import ProductRows, RowsListMixin, fast_lists_enabled
+from .pricing import annotate_effective_prices, lowest_prices_since, refresh_on_commit
+from .filters import DiscountFilter, DiscountModerationFilter, ProductFilter, ReportModerationFilter
 from .serializers import (
     BrandSerializer,
     CategorySerializer,
     DiscountSerializer,
     DiscountModerationSerializer,
+    DiscountModerationBulkSerializer,
+    DiscountSummarySerializer,
     ProductDiscountHistorySerializer,
+    ProductListSerializer,
     ProductSerializer,
     StoreSerializer,
     UserDiscountCreateSerializer,
     UserDiscountListSerializer,
     WishlistItemSerializer,
+    param_list,
+    PriceAlertSerializer,
     ReportCreateSerializer,
     ReportModerationSerializer,
+    ReportModerationListSerializer,
+    ReportModerationBulkSerializer,
     ShoppingCartSerializer,
     ShoppingCartItemSerializer,
+    CartOperationSerializer,
+    CartBatchSerializer,
 )
 from users.helpers.permissions import IsModeratorOrAdmin
 
@@ -47,8 +66,9 @@ from users.helpers.permissions import IsModeratorOrAdmin
     partial_update=extend_schema(tags=["Brands"], summary="Partially update brand"),
     destroy=extend_schema(tags=["Brands"], summary="Delete brand"),
 )
-class BrandViewSet(viewsets.ModelViewSet):
-    queryset = Brand.objects.all().order_by("name")
+class BrandViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_dependencies = ("brand", "store", "product", "discount")
+    queryset = Brand.objects.with_stats().order_by("name")
     serializer_class = BrandSerializer
 
     def get_permissions(self):
@@ -67,7 +87,8 @@ class BrandViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Categories"], summary="Partially update category"),
     destroy=extend_schema(tags=["Categories"], summary="Delete category"),
 )
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_dependencies = ("category",)
     queryset = Category.objects.all().order_by("name")
     serializer_class = CategorySerializer
 
@@ -87,7 +108,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Stores"], summary="Partially update store"),
     destroy=extend_schema(tags=["Stores"], summary="Delete store"),
 )
-class StoreViewSet(viewsets.ModelViewSet):
+class StoreViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_dependencies = ("store", "brand")
     queryset = Store.objects.select_related("brand").all()
     serializer_class = StoreSerializer
 
@@ -107,41 +129,148 @@ class StoreViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=["Products"], summary="Partially update product"),
     destroy=extend_schema(tags=["Products"], summary="Delete product"),
 )
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Product.objects.select_related("brand", "category", "store")
-        .prefetch_related("discounts")
-        .all()
-    )
+class ProductViewSet(CachedReadMixin, RowsListMixin, viewsets.ModelViewSet):
+    cache_dependencies = ("product", "brand", "category", "store", "discount")
+    queryset = Product.objects.select_related("brand").all()
     serializer_class = ProductSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ProductPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = ProductFilter
-    ordering_fields = ["name", "price"]
+    ordering_fields = ["name", "price", "effective_price", "saving", "saving_percent"]
+    list_actions = ("list", "search")
+
+    def get_rows(self):
+        """``values()``-based rows for list and search; the serializer handles ``expand``."""
+        if self.action in self.list_actions and fast_lists_enabled() and "expand" not in self.request.query_params:
+            return ProductRows.from_request(self.request)
+        return None
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return ProductListSerializer
+        return ProductSerializer
+
+    def get_queryset(self):
+        queryset = annotate_effective_prices(super().get_queryset())
+        if self.action not in self.list_actions:
+            return queryset.prefetch_related("discount_rules")
+        params = self.request.query_params
+        fields = param_list(params.get("fields"))
+        if fields and "discounts" not in fields:
+            return queryset
+        active = Discount.objects.filter(
+            status=Discount.DiscountStatus.APPROVED, phase=Discount.Phase.ACTIVE
+        )
+        if "discounts" not in param_list(params.get("expand")):
+            active = active.only(*DiscountSummarySerializer.columns, "product")
+        return queryset.prefetch_related(Prefetch("discount_rules", queryset=active, to_attr="active_discounts"))
 
     @action(detail=False, methods=['get'], url_path='search')
     def search(self, request):
-        query = request.query_params.get('q', None)
+        """Fuzzy name search over the trigram index.
+
+        Optional parameters: ``brand``, ``category``, ``threshold`` (0-100) and ``limit``.
+        Passing ``page``/``page_size`` returns a paginated response instead of a plain list.
+        """
+        arguments, error = self.search_arguments(request.query_params)
+        if error is not None:
+            return error
+        paginated = arguments.pop('paginated')
+        matches = search.search_products(**arguments)
+
+        page = self.paginate_queryset(matches) if paginated else matches
+        queryset = self.get_queryset().filter(pk__in=dict(page))
+        rows = self.get_rows()
+        if rows is not None:
+            products = {row['id']: row for row in rows.values(queryset)}
+            ordered = [products[pk] for pk, _ in page if pk in products]
+            data = self.scored(page, [row['id'] for row in ordered], rows.build(ordered))
+        else:
+            products = {p.pk: p for p in queryset}
+            ordered = [products[pk] for pk, _ in page if pk in products]
+            data = self.scored(page, [p.pk for p in ordered], self.get_serializer(ordered, many=True).data)
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @staticmethod
+    def search_arguments(params):
+        """``search_products`` keyword arguments plus ``paginated``, or a 400 response."""
+        query = params.get('q', None)
         if not query:
-            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-        products = Product.objects.all()
-        product_names = [p.name for p in products]
-        
-        # Use fuzzywuzzy to find matches
-        matches = process.extract(query, product_names, limit=10)
-        
-        # Get the product IDs of the best matches
-        matched_product_names = [match[0] for match in matches if match[1] > 75] # score threshold
-        
-        # Retrieve the full product objects
-        matched_products = Product.objects.filter(name__in=matched_product_names)
-        
-        serializer = self.get_serializer(matched_products, many=True)
-        return Response(serializer.data)
+            return None, Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            threshold = float(params['threshold']) if 'threshold' in params else None
+            limit = int(params.get('limit', 10))
+        except ValueError:
+            return None, Response(
+                {"error": "'threshold' and 'limit' must be numbers."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1:
+            return None, Response({"error": "'limit' must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+        paginated = 'page' in params or 'page_size' in params
+        return {
+            'query': query,
+            'threshold': threshold,
+            'limit': None if paginated else limit,
+            'brand': params.get('brand'),
+            'category': params.get('category'),
+            'paginated': paginated,
+        }, None
+
+    @staticmethod
+    def scored(page, ids, data):
+        scores = dict(page)
+        for pk, row in zip(ids, data):
+            row['score'] = round(scores[pk], 1)
+        return data
+
+    @action(detail=True, methods=['get'], url_path='price-history')
+    def price_history(self, request, pk=None):
+        """Discount history of a product within the last ``days`` (default 30) and the
+        lowest price it had in that window."""
+        product = self.get_object()
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"error": "'days' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        if days < 0:
+            return Response({"error": "'days' must not be negative."}, status=status.HTTP_400_BAD_REQUEST)
+        since = timezone.now() - timedelta(days=days)
+        rows = (
+            ProductDiscountHistory.objects.filter(product=product)
+            .filter(Q(removed_at__isnull=True) | Q(removed_at__gte=since))
+            .order_by("applied_at")
+        )
+        lowest = lowest_prices_since([product.pk], since).get(product.pk)
+        if product.price is not None and (lowest is None or product.price < lowest):
+            lowest = product.price
+        return Response({
+            "product": product.pk,
+            "days": days,
+            "lowest_price": lowest,
+            "history": ProductDiscountHistorySerializer(rows, many=True).data,
+        })
+
+    @action(detail=True, methods=['get'], url_path='compare')
+    def compare(self, request, pk=None):
+        """Where is this product cheapest: the product and its matches in other chains
+        (``match_products``), cheapest first, with prices per kilogram, litre or piece."""
+        try:
+            product_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        offers = matching.compare_offers(product_id)
+        if not offers:
+            raise NotFound()
+        return Response({
+            "product": product_id,
+            "match": offers[0]["match"],
+            "offers": offers,
+        })
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'search']:
+        if self.action in ['list', 'retrieve', 'search', 'price_history', 'compare']:
             self.permission_classes = [permissions.AllowAny]
         else:
             self.permission_classes = [IsModeratorOrAdmin]
@@ -159,6 +288,8 @@ class ProductViewSet(viewsets.ModelViewSet):
 class DiscountViewSet(viewsets.ModelViewSet):
     queryset = Discount.objects.select_related("brand", "category", "product").all()
     serializer_class = DiscountSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = DiscountFilter
 
 
 @extend_schema_view(
@@ -182,8 +313,7 @@ class WishlistListCreateView(generics.ListCreateAPIView):
         return (
             WishlistItem.objects
             .filter(user=self.request.user)
-            .select_related("product")
-            .prefetch_related("product__discount_history__discount")
+            .select_related("product__current_price")
         )
 
     def perform_create(self, serializer):
@@ -195,10 +325,10 @@ class WishlistListCreateView(generics.ListCreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         # get_or_create ensures uniqueness
-        obj, created = WishlistItem.objects.get_or_create(
-            user=request.user, product=serializer.validated_data["product"]
-        )
-        out = WishlistItemSerializer(obj)
+        product = serializer.validated_data["product"]
+        obj, created = WishlistItem.objects.get_or_create(user=request.user, product=product)
+        obj.product = product
+        out = self.get_serializer(obj)
         status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
         headers = self.get_success_headers(out.data)
         return Response(out.data, status=status_code, headers=headers)
@@ -217,6 +347,42 @@ class WishlistDestroyView(generics.DestroyAPIView):
         product_id = self.kwargs.get(self.lookup_url_kwarg)
         return generics.get_object_or_404(WishlistItem, user=self.request.user, product_id=product_id)
 
+    def perform_destroy(self, instance):
+        # alerts only exist for wishlisted products
+        PriceAlert.objects.filter(user=instance.user_id, product=instance.product_id).delete()
+        instance.delete()
+
+
+@extend_schema_view(
+    list=extend_schema(tags=["Price Alerts"], summary="List my price alerts"),
+    retrieve=extend_schema(tags=["Price Alerts"], summary="Get a price alert"),
+    create=extend_schema(tags=["Price Alerts"], summary="Alert me when a wishlisted product gets cheaper"),
+    update=extend_schema(tags=["Price Alerts"], summary="Update a price alert"),
+    partial_update=extend_schema(tags=["Price Alerts"], summary="Partially update a price alert"),
+    destroy=extend_schema(tags=["Price Alerts"], summary="Delete a price alert"),
+)
+class PriceAlertViewSet(viewsets.ModelViewSet):
+    """Target-price and any-discount alerts on the user's wishlisted products.
+
+    Alerts are matched whenever prices are recomputed (imports, discount
+    approval, the lifecycle worker) and delivered by ``send_price_alerts``.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PriceAlertSerializer
+
+    def get_queryset(self):
+        return PriceAlert.objects.filter(user=self.request.user).select_related("product")
+
+    def perform_create(self, serializer):
+        alert = serializer.save(user=self.request.user)
+        # a price that already matches fires right away
+        alerts.match_current_prices([alert.product_id])
+
+    def perform_update(self, serializer):
+        alert = serializer.save()
+        alerts.match_current_prices([alert.product_id])
+
 
 @extend_schema_view(
     post=extend_schema(tags=["Reports"], summary="Report a product or a discount"),
@@ -238,15 +404,39 @@ class ReportCreateView(generics.CreateAPIView):
     get=extend_schema(tags=["Reports"], summary="List reported items (moderation)")
 )
 class ReportModerationListView(generics.ListAPIView):
+    """Report queue, newest first. Rows link the image thumbnail; filters: status, store,
+    brand, submitter, created_after/created_before and min/max_age_hours. A plain list
+    unless ``cursor``/``pagination=keyset`` or ``page`` is given."""
     permission_classes = [IsModeratorOrAdmin]
-    serializer_class = ReportModerationSerializer
+    serializer_class = ReportModerationListSerializer
+    pagination_class = ModerationQueuePagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ReportModerationFilter
 
     def get_queryset(self):
-        qs = Report.objects.select_related("product", "discount", "reported_by").all().order_by("-created_at")
-        status_param = self.request.query_params.get("status")
-        if status_param:
-            qs = qs.filter(status=status_param)
-        return qs
+        return Report.objects.order_by("-created_at", "-id")
+
+
+@extend_schema(
+    tags=["Reports"],
+    summary="Set the status of many reports (moderation)",
+    request=ReportModerationBulkSerializer,
+    responses={200: OpenApiResponse(description="Number of reports updated and ids not found")},
+)
+class ReportModerationBulkView(generics.GenericAPIView):
+    permission_classes = [IsModeratorOrAdmin]
+    serializer_class = ReportModerationBulkSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+        with transaction.atomic():
+            found = set(Report.objects.select_for_update().filter(pk__in=ids).values_list("pk", flat=True))
+            Report.objects.filter(pk__in=found).update(
+                status=serializer.validated_data["status"], updated_at=timezone.now()
+            )
+        return Response({"updated": len(found), "missing": sorted(ids - found)})
 
 
 @extend_schema_view(
@@ -263,15 +453,47 @@ class ReportModerationDetailView(generics.RetrieveUpdateAPIView):
     get=extend_schema(tags=["Discounts Moderation"], summary="List submitted discounts (moderation)"),
 )
 class DiscountModerationListView(generics.ListAPIView):
+    """Discount queue, newest first. Filters: status, target_type, store, brand,
+    submitter, created_after/created_before and min/max_age_hours. A plain list
+    unless ``cursor``/``pagination=keyset`` or ``page`` is given."""
     permission_classes = [IsModeratorOrAdmin]
     serializer_class = DiscountModerationSerializer
+    pagination_class = ModerationQueuePagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = DiscountModerationFilter
 
     def get_queryset(self):
-        qs = Discount.objects.select_related("brand", "category", "product", "store", "submitted_by").order_by("-created_at")
-        status_param = self.request.query_params.get("status")
-        if status_param:
-            qs = qs.filter(status=status_param)
-        return qs
+        # the serializer only needs the related ids, so no joins
+        return Discount.objects.order_by("-created_at", "-id")
+
+
+@extend_schema(
+    tags=["Discounts Moderation"],
+    summary="Approve or deny many discounts (moderation)",
+    request=DiscountModerationBulkSerializer,
+    responses={200: OpenApiResponse(description="Number of discounts updated and ids not found")},
+)
+class DiscountModerationBulkView(generics.GenericAPIView):
+    """Sets the status of up to ``MAX_ITEMS`` discounts in one transaction; once it
+    commits, the prices of every product they affect are recomputed in a single pass."""
+    permission_classes = [IsModeratorOrAdmin]
+    serializer_class = DiscountModerationBulkSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+        with transaction.atomic():
+            discounts = list(Discount.objects.select_for_update().select_related("store").filter(pk__in=ids))
+            changed = [d for d in discounts if d.status != serializer.validated_data["status"]]
+            Discount.objects.filter(pk__in=[d.pk for d in changed]).update(
+                status=serializer.validated_data["status"], updated_at=timezone.now()
+            )
+            # bulk update bypasses the per-discount signals
+            refresh_on_commit(discount_ids=[d.pk for d in changed])
+            caching.bump("discount")
+        found = {d.pk for d in discounts}
+        return Response({"updated": len(changed), "missing": sorted(ids - found)})
 
 
 @extend_schema_view(
@@ -336,11 +558,10 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     serializer_class = ShoppingCartSerializer
 
     def get_queryset(self):
-        qs = (
-            ShoppingCart.objects
-            .filter(user=self.request.user)
-            .prefetch_related("items__product__brand")
-        )
+        qs = ShoppingCart.objects.filter(user=self.request.user)
+        # item actions and the optimizer load what they need themselves
+        if self.action in ("list", "retrieve", "update", "partial_update"):
+            qs = qs.prefetch_related("items__product__brand")
         status_param = self.request.query_params.get("status")
         if status_param:
             qs = qs.filter(status=status_param.upper())
@@ -349,6 +570,36 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def _cart_response(self, cart: ShoppingCart) -> Response:
+        """Serialize a freshly loaded cart: items, products and brands are prefetched and
+        all item discounts are resolved together, so the cost does not grow with cart size."""
+        cart = ShoppingCart.objects.prefetch_related("items__product__brand").get(pk=cart.pk)
+        out = ShoppingCartSerializer(cart, context=self.get_serializer_context())
+        return Response(out.data)
+
+    def _apply(self, request, operations) -> Response:
+        """Apply item operations (``catalog.carts``) and answer with the whole cart or,
+        with ``?response=delta``, only the touched items and the cart's totals."""
+        cart: ShoppingCart = self.get_object()
+        try:
+            carts.apply(cart, operations)
+        except Product.DoesNotExist:
+            return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+        except ShoppingCartItem.DoesNotExist:
+            return Response({"detail": "Item not found in this cart."}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get("response") == "delta":
+            product_ids = {operation.product for operation in operations}
+            return Response(carts.delta(cart, product_ids, ShoppingCartItemSerializer, self.get_serializer_context()))
+        return self._cart_response(cart)
+
+    def _single(self, request, op: str, product_id) -> Response:
+        if not product_id:
+            return Response({"detail": "'product' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        data = {key: request.data[key] for key in ("quantity", "increment", "is_purchased") if key in request.data}
+        serializer = CartOperationSerializer(data={**data, "op": op, "product": product_id})
+        serializer.is_valid(raise_exception=True)
+        return self._apply(request, [serializer.to_operation()])
+
     @extend_schema(
         tags=["Shopping Carts"],
         summary="Add or increase an item",
@@ -357,22 +608,8 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     )
     @action(detail=True, methods=["post"], url_path="add-item")
     def add_item(self, request, pk=None):
-        cart: ShoppingCart = self.get_object()
-        product_id = request.data.get("product")
-        quantity = int(request.data.get("quantity", 1))
-        if not product_id:
-            return Response({"detail": "'product' is required."}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            product = Product.objects.select_related("brand").get(pk=product_id)
-        except Product.DoesNotExist:
-            return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
-        item, _ = ShoppingCartItem.objects.get_or_create(shopping_cart=cart, product=product)
-        if quantity < 1:
-            quantity = 1
-        item.quantity = item.quantity + quantity - 1 if request.data.get("increment", False) else quantity
-        item.save()
-        out = ShoppingCartSerializer(cart)
-        return Response(out.data)
+        """Set the item's quantity, or with ``increment`` add to it, in one upsert."""
+        return self._single(request, carts.ADD, request.data.get("product"))
 
     @extend_schema(
         tags=["Shopping Carts"],
@@ -382,26 +619,7 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     )
     @action(detail=True, methods=["patch"], url_path="update-item")
     def update_item(self, request, pk=None):
-        cart: ShoppingCart = self.get_object()
-        product_id = request.data.get("product")
-        if not product_id:
-            return Response({"detail": "'product' is required."}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            item = ShoppingCartItem.objects.select_related("product").get(shopping_cart=cart, product_id=product_id)
-        except ShoppingCartItem.DoesNotExist:
-            return Response({"detail": "Item not found in this cart."}, status=status.HTTP_404_NOT_FOUND)
-
-        if "quantity" in request.data:
-            try:
-                q = int(request.data.get("quantity", 1))
-            except ValueError:
-                return Response({"detail": "'quantity' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
-            item.quantity = max(q, 1)
-        if "is_purchased" in request.data:
-            item.is_purchased = bool(request.data.get("is_purchased"))
-        item.save()
-        out = ShoppingCartSerializer(cart)
-        return Response(out.data)
+        return self._single(request, carts.UPDATE, request.data.get("product"))
 
     @extend_schema(
         tags=["Shopping Carts"],
@@ -411,13 +629,39 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     )
     @action(detail=True, methods=["delete"], url_path="remove-item")
     def remove_item(self, request, pk=None):
+        return self._single(request, carts.REMOVE, request.data.get("product") or request.query_params.get("product"))
+
+    @extend_schema(
+        tags=["Shopping Carts"],
+        summary="Add, update and remove items in one request",
+        request=CartBatchSerializer,
+        responses={200: ShoppingCartSerializer},
+    )
+    @action(detail=True, methods=["post"], url_path="batch")
+    def batch(self, request, pk=None):
+        """Apply a list of add/update/remove operations in order, in one transaction."""
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._apply(request, serializer.to_operations())
+
+    @extend_schema(
+        tags=["Shopping Carts"],
+        summary="Cheapest chains for the cart",
+        parameters=[OpenApiParameter("k", int, description="Most chains to split the cart across (default 1)")],
+    )
+    @action(detail=True, methods=["get"], url_path="optimize")
+    def optimize(self, request, pk=None):
+        """What the cart's open items cost at each chain, and the cheapest way to buy them
+        visiting at most ``k`` chains, with matched products of other chains substituted."""
         cart: ShoppingCart = self.get_object()
-        product_id = request.data.get("product") or request.query_params.get("product")
-        if not product_id:
-            return Response({"detail": "'product' is required."}, status=status.HTTP_400_BAD_REQUEST)
-        ShoppingCartItem.objects.filter(shopping_cart=cart, product_id=product_id).delete()
-        out = ShoppingCartSerializer(cart)
-        return Response(out.data)
+        limit = baskets.max_chains()
+        try:
+            k = int(request.query_params.get("k", 1))
+        except ValueError:
+            return Response({"detail": "'k' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= k <= limit:
+            return Response({"detail": f"'k' must be between 1 and {limit}."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(baskets.optimize_cart(cart, k))
 
     @extend_schema(
         tags=["Shopping Carts"],
@@ -429,5 +673,4 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
         cart: ShoppingCart = self.get_object()
         cart.status = ShoppingCart.Status.CLOSED
         cart.save(update_fields=["status", "updated_at"])
-        out = ShoppingCartSerializer(cart)
-        return Response(out.data)
+        return self._cart_response(cart)
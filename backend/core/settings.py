@@ -84,6 +84,10 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'users.helpers.JWTAuthentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
@@ -107,6 +111,64 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
+# Product search (catalog.search): minimum RapidFuzz score, how many index
+# candidates are scored per query and the cap on returned matches.
+CATALOG_SEARCH_THRESHOLD = float(os.getenv('CATALOG_SEARCH_THRESHOLD', '75'))
+CATALOG_SEARCH_CANDIDATES = int(os.getenv('CATALOG_SEARCH_CANDIDATES', '200'))
+CATALOG_SEARCH_MAX_RESULTS = int(os.getenv('CATALOG_SEARCH_MAX_RESULTS', '100'))
+
+# Saving a discount recomputes the cached prices it affects after the transaction
+# commits (catalog.pricing.refresh_on_commit); above this many products they are
+# expired instead and refreshed by `manage.py run_discount_lifecycle`.
+CATALOG_PRICE_REFRESH_INLINE_LIMIT = int(os.getenv('CATALOG_PRICE_REFRESH_INLINE_LIMIT', '2000'))
+
+# Cross-chain matching (catalog.matching, `manage.py match_products`): minimum
+# RapidFuzz token-set score for two same-size products of one category to match.
+CATALOG_MATCH_THRESHOLD = float(os.getenv('CATALOG_MATCH_THRESHOLD', '85'))
+
+# Cart optimizer (catalog.baskets, /shopping-carts/{id}/optimize/): the largest
+# number of chains a cart may be split across (?k=).
+CART_OPTIMIZE_MAX_CHAINS = int(os.getenv('CART_OPTIMIZE_MAX_CHAINS', '3'))
+
+# Cache: local memory per process, or shared Redis when REDIS_URL is set
+# (e.g. redis://localhost:6379/0). Public catalog responses are cached for
+# CATALOG_CACHE_TIMEOUT seconds and invalidated by version bumps (catalog.caching).
+# The bumps only reach other workers through a shared backend, so the response
+# cache is on by default only with REDIS_URL.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'nuolaidauk',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', str(bool(REDIS_URL))) == 'True'
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Product list and search rows are built from values() instead of the serializer
+# (catalog.rows); turn off to compare or to rule it out.
+CATALOG_FAST_LISTS = os.getenv('CATALOG_FAST_LISTS', 'True') == 'True'
+
+# SERVER_MODE=asgi runs gunicorn with uvicorn workers (core.asgi). The async
+# catalog views (catalog.async_views) then serve the hot JSON reads; they are on
+# by default in that mode and can be toggled separately.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+CATALOG_ASYNC_VIEWS = os.getenv('CATALOG_ASYNC_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
+
+# JWT authentication (users.helpers.cache): decoded claims kept in a per-process
+# LRU of this many tokens; resolved users cached this many seconds.
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv('JWT_CLAIMS_CACHE_SIZE', '1024'))
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
@@ -168,6 +230,30 @@ STATIC_URL = 'static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Uploaded files. Report images and mirrored product photos live here
+# content-addressed (catalog.images) and are served by the catalog app.
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', '320'))
+IMAGE_THUMBNAIL_FORMAT = os.getenv('IMAGE_THUMBNAIL_FORMAT', 'WEBP')  # or JPEG
+
+# Price alerts (catalog.alerts): fired alerts are queued in an outbox and sent
+# in batches by `manage.py send_price_alerts` through PRICE_ALERT_BACKEND, which
+# by default emails through Django's email settings below.
+PRICE_ALERT_BACKEND = os.getenv('PRICE_ALERT_BACKEND', 'catalog.alerts.EmailBackend')
+PRICE_ALERT_BATCH_SIZE = int(os.getenv('PRICE_ALERT_BATCH_SIZE', '200'))
+PRICE_ALERT_MAX_ATTEMPTS = int(os.getenv('PRICE_ALERT_MAX_ATTEMPTS', '5'))
+
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'alerts@nuolaidauk.lt')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
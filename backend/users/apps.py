@@ -6,6 +6,8 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
+        from . import signals  # noqa: F401
+
         # Ensure OpenAPI extensions are imported so drf-spectacular can register them
         try:
             import users.helpers.openapi  # noqa: F401
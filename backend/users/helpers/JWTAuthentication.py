@@ -1,36 +1,75 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from users.models import User
+from users.helpers.cache import aget_user, claims_cache, get_user
 import jwt
 import os
 
 # Keep JWT secret consistent with application settings
 SECRET = os.getenv('JWT_SECRET', os.getenv('DJANGO_SECRET_KEY', 'secret'))
 
+
+def decode_token(token):
+    """Verify and decode ``token``, memoized per token until it expires."""
+    claims = claims_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            raise AuthenticationFailed('Token expired')
+        except jwt.InvalidTokenError:
+            raise AuthenticationFailed('Invalid token')
+        claims_cache.set(token, claims)
+    return claims
+
+
+def token_from_request(request):
+    # 1) Try Authorization: Bearer <token>
+    auth_header = request.headers.get('Authorization') or request.META.get('HTTP_AUTHORIZATION')
+    if auth_header and isinstance(auth_header, str):
+        parts = auth_header.split()
+        if len(parts) == 2 and parts[0].lower() == 'bearer':
+            return parts[1]
+
+    # 2) Fallback to cookie-based token
+    return request.COOKIES.get('jwt')
+
+
+def access_claims(token):
+    claims = decode_token(token)
+    if claims.get('type', 'access') != 'access':
+        raise AuthenticationFailed('Invalid token type')
+    return claims
+
+
+def check_user(user, claims):
+    if user is None:
+        raise AuthenticationFailed('User not found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive')
+    if 'role' in claims and claims['role'] != user.role:
+        raise AuthenticationFailed('Token is out of date')
+    return user
+
+
 class JWTAuthentication(BaseAuthentication):
-    def authenticate(self, request):
-        token = None
+    """Authenticates ``Authorization: Bearer`` or the ``jwt`` cookie.
 
-        # 1) Try Authorization: Bearer <token>
-        auth_header = request.headers.get('Authorization') or request.META.get('HTTP_AUTHORIZATION')
-        if auth_header and isinstance(auth_header, str):
-            parts = auth_header.split()
-            if len(parts) == 2 and parts[0].lower() == 'bearer':
-                token = parts[1]
+    Returns ``(user, claims)``, so ``request.auth`` holds the decoded claims.
+    A token whose ``role`` claim no longer matches the user is rejected, which
+    lets permission checks trust the claim. ``aauthenticate`` is the same check
+    for async views.
+    """
 
-        # 2) Fallback to cookie-based token
-        if not token:
-            token = request.COOKIES.get('jwt')
+    def authenticate(self, request):
+        token = token_from_request(request)
         if not token:
             return None
+        claims = access_claims(token)
+        return (check_user(get_user(claims['id']), claims), claims)
 
-        try:
-            payload = jwt.decode(token, SECRET, algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            raise AuthenticationFailed('Token expired')
-
-        try:
-            user = User.objects.get(id=payload['id'])
-        except User.DoesNotExist:
-            raise AuthenticationFailed('User not found')
-        return (user, token)
+    async def aauthenticate(self, request):
+        token = token_from_request(request)
+        if not token:
+            return None
+        claims = access_claims(token)
+        return (check_user(await aget_user(claims['id']), claims), claims)
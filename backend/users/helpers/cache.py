@@ -0,0 +1,119 @@
+"""Caches used by JWT authentication.
+
+- ``ClaimsCache``: decoded token claims in a bounded in-process LRU, keyed by
+  the SHA-256 of the token and kept until the token's ``exp``; a cached token
+  skips signature verification and decoding.
+- ``get_user``: the user behind a token from the shared cache for
+  ``JWT_USER_CACHE_TTL`` seconds. Only ``USER_FIELDS`` are cached (never the
+  password hash); the returned ``User`` loads any other field from the
+  database when it is first read. Entries are keyed by a per-user version
+  that ``invalidate_user`` bumps whenever the user is saved (password,
+  role, ...). ``aget_user`` is the same lookup for async views.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from users.models import User
+
+USER_VERSION_KEY = "users:version:{}"
+USER_KEY = "users:user:{}:{}"
+# what authentication and permission checks read
+USER_FIELDS = ("id", "role", "is_active")
+
+
+class ClaimsCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self.key(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+            if claims.get("exp", 0) <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+claims_cache = ClaimsCache(getattr(settings, "JWT_CLAIMS_CACHE_SIZE", 1024))
+
+
+def _version(user_id) -> int:
+    version = cache.get(USER_VERSION_KEY.format(user_id))
+    if version is None:
+        # start from the clock so an evicted counter never reuses an old version
+        cache.add(USER_VERSION_KEY.format(user_id), time.time_ns(), timeout=None)
+        version = cache.get(USER_VERSION_KEY.format(user_id))
+    return version
+
+
+def _user(row: Optional[dict]) -> Optional[User]:
+    """A ``User`` with only the cached fields loaded; the others are deferred."""
+    if row is None:
+        return None
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in row]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [row[name] for name in names])
+
+
+def get_user(user_id) -> Optional[User]:
+    key = USER_KEY.format(user_id, _version(user_id))
+    row = cache.get(key)
+    if row is None:
+        row = User.objects.filter(id=user_id).values(*USER_FIELDS).first()
+        if row is not None:
+            cache.set(key, row, getattr(settings, "JWT_USER_CACHE_TTL", 60))
+    return _user(row)
+
+
+async def _aversion(user_id) -> int:
+    version = await cache.aget(USER_VERSION_KEY.format(user_id))
+    if version is None:
+        await cache.aadd(USER_VERSION_KEY.format(user_id), time.time_ns(), timeout=None)
+        version = await cache.aget(USER_VERSION_KEY.format(user_id))
+    return version
+
+
+async def aget_user(user_id) -> Optional[User]:
+    """``get_user`` for async views."""
+    key = USER_KEY.format(user_id, await _aversion(user_id))
+    row = await cache.aget(key)
+    if row is None:
+        row = await User.objects.filter(id=user_id).values(*USER_FIELDS).afirst()
+        if row is not None:
+            await cache.aset(key, row, getattr(settings, "JWT_USER_CACHE_TTL", 60))
+    return _user(row)
+
+
+def invalidate_user(user_id) -> None:
+    try:
+        cache.incr(USER_VERSION_KEY.format(user_id))
+    except ValueError:
+        cache.add(USER_VERSION_KEY.format(user_id), time.time_ns(), timeout=None)
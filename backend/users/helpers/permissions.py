@@ -1,14 +1,20 @@
 from rest_framework.permissions import BasePermission
 
+
+def request_role(request):
+    """Role of the authenticated user, read from the token claims when present (no DB hit)."""
+    if not request.user or not request.user.is_authenticated:
+        return None
+    claims = request.auth if isinstance(request.auth, dict) else {}
+    return claims.get('role') or request.user.role
+
 class IsModeratorOrAdmin(BasePermission):
     """
     Allows access only to moderators or admin users.
     """
 
     def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        return request.user.role in ['moderator', 'admin']
+        return request_role(request) in ['moderator', 'admin']
 
 class IsAdminUser(BasePermission):
     """
@@ -16,6 +22,4 @@ class IsAdminUser(BasePermission):
     """
 
     def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        return request.user.role == 'admin'
+        return request_role(request) == 'admin'
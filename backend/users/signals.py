@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .helpers.cache import invalidate_user
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance: User, **kwargs):
+    """Password, role and profile changes must not be served from the auth cache."""
+    invalidate_user(instance.pk)
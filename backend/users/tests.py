@@ -1,3 +1,78 @@
+import datetime
+
+import jwt
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .helpers.JWTAuthentication import SECRET
+from .helpers.cache import USER_KEY, USER_VERSION_KEY, ClaimsCache, claims_cache
+from .models import User
+
+
+def make_token(user, **overrides):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {'id': user.id, 'exp': now + datetime.timedelta(hours=1), 'iat': now, 'role': user.role, 'type': 'access'}
+    payload.update(overrides)
+    return jwt.encode(payload, SECRET, algorithm='HS256')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        claims_cache.clear()
+        self.moderator = User.objects.create_user(email='mod@example.com', password='pw123456', role='moderator')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {make_token(self.moderator)}')
+
+    def test_repeat_requests_do_not_query_the_user(self):
+        self.assertEqual(self.client.get('/api/user').data['email'], 'mod@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/catalog/discounts/moderation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if User._meta.db_table in q['sql']])
+
+    def test_cache_holds_no_password_and_rejects_inactive_users(self):
+        self.client.get('/api/user')
+        key = USER_KEY.format(self.moderator.pk, cache.get(USER_VERSION_KEY.format(self.moderator.pk)))
+        self.assertEqual(cache.get(key), {'id': self.moderator.pk, 'role': 'moderator', 'is_active': True})
+
+        response = self.client.post(
+            '/api/change-password', {'current_password': 'pw123456', 'new_password': 'pw654321'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.moderator.refresh_from_db()
+        self.assertTrue(self.moderator.check_password('pw654321'))
+        self.assertEqual(self.moderator.email, 'mod@example.com')
+
+        self.moderator.is_active = False
+        self.moderator.save()
+        self.assertEqual(self.client.get('/api/user').status_code, 403)
+
+    def test_role_change_invalidates_cached_user_and_token(self):
+        self.assertEqual(self.client.get('/api/catalog/discounts/moderation/').status_code, 200)
+        self.moderator.role = 'user'
+        self.moderator.save()
+        self.assertEqual(self.client.get('/api/catalog/discounts/moderation/').status_code, 403)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {make_token(self.moderator)}')
+        self.assertEqual(self.client.get('/api/catalog/discounts/moderation/').status_code, 403)
+
+    def test_invalid_and_refresh_tokens_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get('/api/user').status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {make_token(self.moderator, type="refresh")}')
+        self.assertEqual(self.client.get('/api/user').status_code, 403)
 
-# Create your tests here.
+    def test_claims_cache_is_bounded_and_drops_expired_tokens(self):
+        lru = ClaimsCache(maxsize=2)
+        lru.set('a', {'exp': 2 ** 40})
+        lru.set('b', {'exp': 2 ** 40})
+        lru.get('a')
+        lru.set('c', {'exp': 2 ** 40})
+        self.assertIsNone(lru.get('b'))
+        self.assertIsNotNone(lru.get('a'))
+        lru.set('old', {'exp': 1})
+        self.assertIsNone(lru.get('old'))
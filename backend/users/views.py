@@ -1,4 +1,3 @@
-import os
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.exceptions import AuthenticationFailed
@@ -17,10 +16,11 @@ from .models import User
 import jwt, datetime
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
+# Sign with the same secret JWTAuthentication verifies with
+from .helpers.JWTAuthentication import SECRET
 
 
 # Create your views here.
-SECRET = os.getenv('JWT_SECRET', 'secret')
 
 @extend_schema(
     tags=["Auth"],
@@ -169,19 +169,8 @@ class RefreshTokenView(APIView):
 class UserView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        token = request.COOKIES.get('jwt')
-
-        if not token:
-            raise AuthenticationFailed('Unauthenticated')
-        
-        try:
-            payload = jwt.decode(token, SECRET, algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            raise AuthenticationFailed('Unauthenticated')
-        
-        user = User.objects.filter(id = payload['id']).first()
-        serializer = UserSerializer(user)
-
+        # the cached request.user carries only the fields authentication needs
+        serializer = UserSerializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data)
     
 @extend_schema(
@@ -4,6 +4,7 @@ export interface Product {
     price: number;
     price_unit: string;
     photo_url: string;
+    photo_display_url?: string;
     weight: number;
     description: string;
     category: number;
@@ -16,7 +16,8 @@ export interface ReportModerationDTO {
   product: number | null;
   discount: number | null;
   product_reason: 'name' | 'photo' | 'price' | null;
-  discount_image_base64: string;
+  image_url: string | null;
+  thumbnail_url: string | null;
   description: string;
   status: 'REPORTED' | 'ACCEPTED' | 'DENIED';
   created_at: string;